@@ -2,4 +2,17 @@ from django.apps import AppConfig
 
 class HotelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'hotel'
\ No newline at end of file
+    name = 'hotel'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals  # noqa: F401
+
+        if getattr(settings, 'HOTEL_PERFORMANCE_ENABLED', True):
+            from .middleware import install_query_counter
+
+            # до первого запроса: иначе соединения, открытые раньше загрузки
+            # middleware, не попадут в замеры async-view
+            connection_created.connect(install_query_counter, dispatch_uid='hotel_performance_query_counter')
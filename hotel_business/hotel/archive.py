@@ -0,0 +1,130 @@
+"""Перенос прошедших проживаний из Booking и ServiceProvision в архив.
+
+В горячих таблицах остаются текущие и будущие брони, поэтому поиск
+свободных номеров, проверка пересечений и списки счетов работают
+с небольшими таблицами и индексами. Брони, выехавшие раньше горизонта
+(HOTEL_ARCHIVE_AFTER_DAYS), переезжают вместе с услугами в ArchivedBooking
+и ArchivedServiceProvision с теми же id. Роллапы и счётчики при этом не
+меняются: данные не удаляются, а переезжают. Отчёты строятся по роллапам,
+rollups.backfill и выгрузки читают обе таблицы, счёт архивной брони
+открывается по прежнему адресу.
+
+На PostgreSQL архивные таблицы секционированы по месяцам (check_in_date
+и service_date), секции создаются перед переносом.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import portal
+from .models import ArchivedBooking, ArchivedServiceProvision, Booking, ServiceProvision
+
+ARCHIVE_AFTER_DAYS = getattr(settings, 'HOTEL_ARCHIVE_AFTER_DAYS', 365)
+CHUNK_SIZE = 1000
+BOOKING_FIELDS = ['id', 'guest_id', 'room_id', 'check_in_date', 'check_out_date', 'total_cost', 'paid_amount']
+PROVISION_FIELDS = ['id', 'booking_id', 'service_id', 'quantity', 'service_date']
+TABLES = [Booking, ServiceProvision, ArchivedBooking, ArchivedServiceProvision]
+
+
+def horizon(today=None, days=ARCHIVE_AFTER_DAYS):
+    """Брони с выездом раньше этой даты переносятся в архив."""
+    return (today or timezone.now().date()) - timedelta(days=days)
+
+
+def _months(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        following = (month + timedelta(days=32)).replace(day=1)
+        yield month, following
+        month = following
+
+
+def ensure_partitions(model, start, end):
+    """PostgreSQL: создать помесячные секции архивной таблицы на [start, end]."""
+    if connection.vendor != 'postgresql' or start is None:
+        return
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        for month, following in _months(start, end):
+            # в DDL нельзя передавать параметры; даты здесь свои, не из запроса
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+
+
+def _delete(model, column, ids):
+    # QuerySet.delete() отправил бы post_delete; услуги брони удаляются раньше неё
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE {connection.ops.quote_name(column)} IN ({placeholders})',
+            ids,
+        )
+
+
+def archive(before, chunk_size=CHUNK_SIZE):
+    """Переносит брони с выездом раньше before вместе с услугами.
+
+    Каждая пачка — отдельная транзакция, поэтому перенос большой истории
+    не держит блокировки подолгу. Возвращает (броней, услуг).
+    """
+    due = Booking.objects.filter(check_out_date__lt=before)
+    dates = due.aggregate(start=Min('check_in_date'), end=Max('check_in_date'))
+    ensure_partitions(ArchivedBooking, dates['start'], dates['end'])
+    dates = ServiceProvision.objects.filter(booking__check_out_date__lt=before).aggregate(
+        start=Min('service_date'), end=Max('service_date'),
+    )
+    ensure_partitions(ArchivedServiceProvision, dates['start'], dates['end'])
+
+    moved_bookings = moved_provisions = 0
+    while True:
+        with transaction.atomic():
+            bookings = list(due.select_for_update().order_by('id').values(*BOOKING_FIELDS)[:chunk_size])
+            if not bookings:
+                break
+            booking_ids = [booking['id'] for booking in bookings]
+            provisions = ServiceProvision.objects.filter(booking_id__in=booking_ids)
+            ArchivedBooking.objects.bulk_create([ArchivedBooking(**booking) for booking in bookings])
+            moved_provisions += len(ArchivedServiceProvision.objects.bulk_create(
+                [ArchivedServiceProvision(**provision) for provision in provisions.values(*PROVISION_FIELDS)]
+            ))
+            # без сигналов post_delete: роллапы и счётчики должны остаться как есть
+            _delete(ServiceProvision, 'booking_id', booking_ids)
+            _delete(Booking, 'id', booking_ids)
+            portal.invalidate(booking['guest_id'] for booking in bookings)
+            moved_bookings += len(bookings)
+    return moved_bookings, moved_provisions
+
+
+def table_size(model):
+    """Байт, которые занимает таблица с индексами (и секциями), или None."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT SUM(pg_total_relation_size(relid)) FROM pg_partition_tree(%s)', [table])
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [table],
+                )
+            except OperationalError:
+                # SQLite собран без dbstat
+                return None
+        else:
+            return None
+        size = cursor.fetchone()[0]
+    return int(size) if size is not None else None
+
+
+def table_sizes():
+    return {
+        model._meta.db_table: {'rows': model.objects.count(), 'bytes': table_size(model)}
+        for model in TABLES
+    }
@@ -0,0 +1,74 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router
+
+from .models import User
+
+# Поля, которые читают middleware, view и шаблоны; остальные поля экземпляра
+# отложены и догружаются из базы при обращении. password нужен для проверки
+# хеша сессии в django.contrib.auth.get_user. Порядок — как в модели:
+# этого ждёт Model.from_db.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'password', 'email', 'first_name', 'last_name', 'role', 'discount',
+                         'is_active', 'is_staff', 'is_superuser'}
+)
+USER_TIMEOUT = 60 * 60
+
+
+def _keys(user_id):
+    return f'auth:user:{user_id}:version', f'auth:user:{user_id}'
+
+
+def invalidate_user(user_id):
+    version_key, _ = _keys(user_id)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # время не повторит версию, даже если ключ вытеснили из кеша
+        cache.set(version_key, time.time_ns(), None)
+
+
+def cached_user(user_id):
+    """Пользователь из кеша или одним запросом к основной базе; None, если его нет.
+
+    Запись хранится вместе с версией, прочитанной до запроса к базе: если
+    пользователя сохранили, пока шёл запрос, версия уже другая и запись
+    не будет использована.
+    """
+    user_id = User._meta.pk.to_python(user_id)
+    version_key, key = _keys(user_id)
+    found = cache.get_many([version_key, key])
+    version = found.get(version_key)
+    entry = found.get(key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    elif entry is not None and entry[0] == version:
+        return _build(entry[1])
+
+    # реплика может отставать, а запись живёт в кеше до следующего сохранения
+    db = router.db_for_write(User)
+    values = User._default_manager.db_manager(db).filter(pk=user_id).values_list(*USER_FIELDS).first()
+    if values is None:
+        return None
+    cache.set(key, (version, values), USER_TIMEOUT)
+    return _build(values)
+
+
+def _build(values):
+    return User.from_db(router.db_for_write(User), USER_FIELDS, values)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша."""
+
+    def get_user(self, user_id):
+        user = cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
@@ -0,0 +1,83 @@
+import hashlib
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .catalog import active_services, catalog_version
+from .models import Booking, User, UserRole
+
+SUGGESTIONS_LIMIT = 10
+SUGGESTIONS_TIMEOUT = 30
+PREFIX_FIELDS = ('first_name', 'email')
+# больше любого символа: верхняя граница диапазона строк с префиксом
+MAX_CHAR = chr(0x10FFFF)
+
+
+def _normalize(query):
+    return ' '.join(query.split()).lower()
+
+
+def _prefix_filter(queryset, query):
+    if connection.vendor == 'postgresql':
+        # UPPER(field::text) LIKE 'Q%' обслуживают GIN-индексы gin_trgm_ops из миграции 0010
+        return queryset.filter(Q(first_name__istartswith=query) | Q(email__istartswith=query))
+    # SQLite не использует индекс для LIKE ... ESCAPE, поэтому префикс — это
+    # диапазон [query, query + MAX_CHAR) по индексам на LOWER(field) из User.Meta.
+    # lower() в SQLite меняет регистр только у латиницы, как и LIKE.
+    return queryset.annotate(**{f'{field}_lower': Lower(field) for field in PREFIX_FIELDS}).filter(reduce(or_, (
+        Q(**{f'{field}_lower__gte': query, f'{field}_lower__lt': query + MAX_CHAR}) for field in PREFIX_FIELDS
+    )))
+
+
+def client_suggestions(query, limit=SUGGESTIONS_LIMIT, today=None):
+    today = today or timezone.now().date()
+    query = _normalize(query)
+    # запрос приходит от пользователя: в ключ идёт его хеш
+    digest = hashlib.md5(query.encode()).hexdigest()
+    key = f'autocomplete:clients:{today.isoformat()}:{limit}:{digest}'
+    suggestions = cache.get(key)
+    if suggestions is not None:
+        return suggestions
+
+    # гостей в номерах не больше, чем номеров, поэтому выборка начинается с них
+    # (индекс по датам броней), а не с префикса, которому отвечают тысячи клиентов
+    in_house = Booking.objects.filter(check_in_date__lte=today, check_out_date__gte=today).values('guest_id')
+    clients = User.objects.filter(pk__in=in_house, role=UserRole.CLIENT)
+    if query:
+        clients = _prefix_filter(clients, query)
+    clients = clients.only('id', 'first_name', 'last_name', 'email', 'phone_number', 'discount')
+
+    suggestions = [
+        {
+            'id': client.id,
+            'label': f'{client.get_full_name() or client.email} ({client.email})',
+            'phone_number': client.phone_number,
+            'discount': str(client.discount),
+        }
+        for client in clients.order_by('first_name', 'id')[:limit]
+    ]
+    cache.set(key, suggestions, SUGGESTIONS_TIMEOUT)
+    return suggestions
+
+
+def service_suggestions(query, limit=SUGGESTIONS_LIMIT):
+    # Каталог уже лежит в кеше, поэтому подсказки по услугам не ходят в базу
+    query = _normalize(query)
+    version = catalog_version()
+    suggestions = []
+    for service in active_services(version):
+        name = service['name'].lower()
+        if query and not (name.startswith(query) or f' {query}' in name):
+            continue
+        suggestions.append({
+            'id': service['id'],
+            'label': f'{service["name"]} - {service["cost"]} руб.',
+        })
+        if len(suggestions) >= limit:
+            break
+    return suggestions
@@ -0,0 +1,23 @@
+from django.db.models import Exists, OuterRef
+
+from .models import Booking, Room
+
+
+def overlapping_bookings(check_in, check_out):
+    # Дата выезда не занимает номер: полуинтервал [check_in, check_out)
+    return Booking.objects.filter(check_in_date__lt=check_out, check_out_date__gt=check_in)
+
+
+def find_available_rooms(check_in, check_out, bed_count=None, category_id=None):
+    if check_in >= check_out:
+        raise ValueError('Дата выезда должна быть позже даты заезда')
+
+    busy = overlapping_bookings(check_in, check_out).filter(room=OuterRef('pk'))
+    rooms = Room.objects.select_related('category').filter(~Exists(busy))
+
+    if bed_count:
+        rooms = rooms.filter(bed_count__gte=bed_count)
+    if category_id:
+        rooms = rooms.filter(category_id=category_id)
+
+    return rooms.order_by('id')
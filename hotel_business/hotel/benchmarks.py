@@ -0,0 +1,48 @@
+import statistics
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        'runs': len(samples_ms),
+        'mean_ms': round(statistics.fmean(samples_ms), 3) if samples_ms else 0.0,
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+def time_call(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+# (путь, роль) — страницы, которые прогоняет benchmark_views
+BENCHMARK_VIEWS = [
+    ('/services/', 'anonymous'),
+    ('/services/', 'client'),
+    ('/users/client/', 'client'),
+    ('/manager/', 'manager'),
+    ('/manager/clients/', 'manager'),
+    ('/manager/clients/?sort=-first_name', 'manager'),
+    ('/manager/services/', 'manager'),
+    ('/manager/services/?search=спа', 'manager'),
+    ('/manager/rooms/', 'manager'),
+    ('/manager/availability/?check_in={today}&check_out={week}', 'manager'),
+    ('/manager/reports/', 'manager'),
+    ('/manager/folios/?in_house=1&debtors=1', 'manager'),
+    ('/manager/api/folios/', 'manager'),
+    ('/manager/add-service/', 'manager'),
+    ('/manager/api/clients/?q=и', 'manager'),
+    ('/manager/api/services/?q=с', 'manager'),
+]
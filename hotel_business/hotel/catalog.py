@@ -0,0 +1,65 @@
+import time
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Service, User
+
+VERSION_KEY = 'catalog:version'
+CATALOG_TIMEOUT = 60 * 60
+PRICE_LISTS_SIZE = 32
+
+
+def _new_version():
+    # Версия из времени не повторится, даже если ключ вытеснят из кеша
+    return time.time_ns()
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), None)
+
+
+def invalidate():
+    """Новая версия сейчас и ещё раз после коммита: запрос, успевший прочитать
+    старые строки под новой версией, не оставит их в кеше на CATALOG_TIMEOUT."""
+    bump_version()
+    transaction.on_commit(bump_version)
+
+
+def active_services(version=None):
+    version = version or catalog_version()
+    key = f'catalog:{version}:services'
+    services = cache.get(key)
+    if services is None:
+        services = tuple(
+            Service.objects.filter(is_active=True)
+            .order_by('id')
+            .values('id', 'name', 'cost', 'description', 'is_active')
+        )
+        cache.set(key, services, CATALOG_TIMEOUT)
+    return services
+
+
+@lru_cache(maxsize=PRICE_LISTS_SIZE)
+def _price_list(version, discount):
+    pricing = User(discount=discount)
+    return tuple(
+        dict(service, discounted_price=pricing.calculate_price_with_discount(service['cost']))
+        for service in active_services(version)
+    )
+
+
+def price_list(discount=0):
+    return _price_list(catalog_version(), discount)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# кеши, которые видит только свой процесс
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Каталог, отметки watermarks, кабинет клиента, сессии и пользователи
+    сбрасываются через кеш: у каждого процесса со своим кешем они устаревают."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Кеш по умолчанию ({backend}) у каждого процесса свой.',
+        hint='Изменения цен, номеров, броней и выход пользователя в одном процессе не видны другим '
+             '(воркеры gunicorn, run_jobs). Задайте общий кеш: DJANGO_REDIS_URL=redis://...',
+        id='hotel.E001',
+    )]
@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Count, Exists, OuterRef
+
+from .models import Category, Equipment, Item
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def refresh_summaries(category_ids=None):
+    """Пересчитать Category.equipment_summary (всех категорий или указанных)."""
+    equipment = Equipment.objects.order_by('category_id', 'id').values_list('category_id', 'item__name')
+    categories = Category.objects.only('id')
+    if category_ids is not None:
+        equipment = equipment.filter(category_id__in=category_ids)
+        categories = categories.filter(pk__in=category_ids)
+    names = defaultdict(list)
+    for category_id, name in equipment:
+        names[category_id].append(name)
+    categories = list(categories)
+    for category in categories:
+        category.equipment_summary = names[category.id]
+    Category.objects.bulk_update(categories, ['equipment_summary'], batch_size=500)
+
+
+def parse_items(values):
+    # id вне диапазона первичного ключа не найдётся, а база ответила бы OverflowError
+    _, max_id = connection.ops.integer_field_range(Item._meta.pk.get_internal_type())
+    return sorted({int(value) for value in values if value.isdecimal() and int(value) <= max_id})
+
+
+def filter_by_equipment(rooms, item_ids, match=MATCH_ANY):
+    """Номера, в категории которых есть хотя бы один (any) или все (all) предметы.
+
+    Оба варианта — подзапрос к Equipment по индексу (item, category), без
+    JOIN и DISTINCT в основном запросе.
+    """
+    if not item_ids:
+        return rooms
+    equipment = Equipment.objects.filter(item_id__in=item_ids)
+    if match == MATCH_ALL:
+        categories = (
+            equipment.values('category_id')
+            .annotate(items=Count('item_id', distinct=True))
+            .filter(items=len(item_ids))
+            .values('category_id')
+        )
+        return rooms.filter(category_id__in=categories)
+    return rooms.filter(Exists(equipment.filter(category_id=OuterRef('category_id'))))
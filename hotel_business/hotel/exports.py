@@ -0,0 +1,160 @@
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils.dateparse import parse_date
+
+from .models import ArchivedBooking, ArchivedServiceProvision, Booking, ServiceProvision, User, UserRole
+
+CHUNK_SIZE = 2000
+LINES_PER_WRITE = 500
+
+
+class Export:
+    def __init__(self, queryset, columns, date_field, role_field, archive=None):
+        self.queryset = queryset
+        self.columns = columns
+        self.date_field = date_field
+        self.role_field = role_field
+        # те же строки из архивной таблицы (hotel.archive), выгружаются первыми
+        self.archive = archive
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+    def rows(self, start=None, end=None, role=None, chunk_size=CHUNK_SIZE):
+        sources = [self.archive, self.queryset] if self.archive else [self.queryset]
+        return itertools.chain.from_iterable(
+            self._rows(source(), start, end, role, chunk_size) for source in sources
+        )
+
+    def _rows(self, queryset, start, end, role, chunk_size):
+        if start:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{self.date_field}__lte': end})
+        if role:
+            queryset = queryset.filter(**{self.role_field: role})
+        # values_list + iterator: без экземпляров моделей и без кеша
+        # результатов, на PostgreSQL — серверный курсор
+        return queryset.order_by('id').values_list(*(field for _, field in self.columns)).iterator(
+            chunk_size=chunk_size,
+        )
+
+
+EXPORTS = {
+    'clients': Export(
+        lambda: User.objects.all(),
+        [('id', 'id'), ('email', 'email'), ('name', 'first_name'), ('phone', 'phone_number'), ('role', 'role'),
+         ('discount', 'discount'), ('date_joined', 'date_joined')],
+        date_field='date_joined__date',
+        role_field='role',
+    ),
+    'bookings': Export(
+        lambda: Booking.objects.all(),
+        [('id', 'id'), ('guest_id', 'guest_id'), ('guest_email', 'guest__email'), ('room_id', 'room_id'),
+         ('category', 'room__category__name'), ('check_in_date', 'check_in_date'),
+         ('check_out_date', 'check_out_date'), ('total_cost', 'total_cost'), ('paid_amount', 'paid_amount')],
+        date_field='check_in_date',
+        role_field='guest__role',
+        archive=lambda: ArchivedBooking.objects.all(),
+    ),
+    'provisions': Export(
+        lambda: ServiceProvision.objects.all(),
+        [('id', 'id'), ('booking_id', 'booking_id'), ('guest_id', 'booking__guest_id'), ('service_id', 'service_id'),
+         ('service', 'service__name'), ('service_date', 'service_date'), ('quantity', 'quantity'),
+         ('cost', 'service__cost')],
+        date_field='service_date',
+        role_field='booking__guest__role',
+        archive=lambda: ArchivedServiceProvision.objects.all(),
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+ROLES = {role.value for role in UserRole}
+
+
+def parse_filters(start=None, end=None, role=None):
+    filters = {}
+    for name, value in (('start', start), ('end', end)):
+        if not value:
+            continue
+        try:
+            filters[name] = parse_date(value)
+        except ValueError:
+            filters[name] = None
+        if filters[name] is None:
+            raise ValueError(f'Некорректная дата {name}: {value}')
+    if role:
+        if role not in ROLES:
+            raise ValueError(f'Неизвестная роль: {role}')
+        filters['role'] = role
+    return filters
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= LINES_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _json_default(value):
+    # вызывается только для того, что json не умеет сам: даты и Decimal
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+_encode = json.JSONEncoder(ensure_ascii=False, default=_json_default).encode
+
+
+def ndjson_lines(header, rows):
+    for row in rows:
+        yield _encode(dict(zip(header, row))) + '\n'
+
+
+def stream(name, export_format, start=None, end=None, role=None, chunk_size=CHUNK_SIZE):
+    """Генератор строк выгрузки; память не зависит от числа строк."""
+    export = EXPORTS[name]
+    rows = export.rows(start, end, role, chunk_size)
+    lines = csv_lines(export.header, rows) if export_format == 'csv' else ndjson_lines(export.header, rows)
+    return _batched(lines)
+
+
+async def astream(name, export_format, start=None, end=None, role=None, chunk_size=CHUNK_SIZE):
+    """stream для ASGI. Синхронный итератор StreamingHttpResponse под ASGI
+    читает целиком (sync_to_async(list)), а здесь каждая пачка строк берётся
+    отдельным вызовом в одном и том же потоке: курсор базы остаётся на своём
+    соединении, а в памяти — одна пачка."""
+    lines = stream(name, export_format, start, end, role, chunk_size)
+    try:
+        while True:
+            batch = await sync_to_async(next)(lines, None)
+            if batch is None:
+                return
+            yield batch
+    finally:
+        await sync_to_async(lines.close)()
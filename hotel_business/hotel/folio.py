@@ -0,0 +1,88 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+CENT = Decimal('0.01')
+ZERO = Value(Decimal(0), output_field=MONEY)
+PERCENT = Value(Decimal('0.01'), output_field=MONEY)
+
+
+def _money(expression):
+    return ExpressionWrapper(expression, output_field=MONEY)
+
+
+def with_balances(queryset=None):
+    """Аннотирует брони суммами счёта одним SQL-запросом.
+
+    services_total — услуги по прайсу, services_due — они же со скидкой
+    гостя, amount_due = total_cost + services_due, balance = amount_due -
+    paid_amount. Скидка применяется только к услугам: стоимость номера
+    в total_cost фиксируется при бронировании.
+
+    Услуги суммируются через JOIN и GROUP BY, а не коррелированным
+    подзапросом: производные поля повторяют выражение services_total,
+    и подзапрос выполнялся бы для каждой строки несколько раз.
+    """
+    if queryset is None:
+        queryset = Booking.objects.all()
+    return queryset.annotate(
+        services_total=Coalesce(
+            Sum(_money(F('service_provisions__quantity') * F('service_provisions__service__cost'))),
+            ZERO,
+        ),
+    ).annotate(
+        # множитель 0.01, а не деление на 100: в SQLite целые суммы хранятся
+        # как INTEGER, и деление было бы целочисленным
+        services_due=Round(_money(F('services_total') * (Value(100) - F('guest__discount')) * PERCENT), 2,
+                           output_field=MONEY),
+    ).annotate(
+        amount_due=_money(F('total_cost') + F('services_due')),
+    ).annotate(
+        balance=_money(F('amount_due') - F('paid_amount')),
+    )
+
+
+def in_house(queryset, today=None):
+    today = today or timezone.now().date()
+    return queryset.filter(check_in_date__lte=today, check_out_date__gte=today)
+
+
+def folios(in_house_only=False, debtors_only=False, booking_ids=None, today=None, archived=False):
+    # у ArchivedBooking те же поля и связи, что у Booking
+    queryset = (ArchivedBooking if archived else Booking).objects.select_related('guest', 'room')
+    if booking_ids is not None:
+        queryset = queryset.filter(id__in=booking_ids)
+    if in_house_only:
+        queryset = in_house(queryset, today)
+    queryset = with_balances(queryset)
+    if debtors_only:
+        queryset = queryset.filter(balance__gt=0)
+    return queryset
+
+
+def folio_lines(booking):
+    return (
+        booking.service_provisions.select_related('service')
+        .annotate(amount=_money(F('quantity') * F('service__cost')))
+        .order_by('service_date', 'id')
+    )
+
+
+def discounted(services_total, discount):
+    """Услуги со скидкой гостя, с тем же округлением, что services_due в with_balances."""
+    return (services_total * (100 - discount) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def compute_balance(booking):
+    """То же, что with_balances, но на Python — для проверки и сравнения."""
+    services_total = sum(
+        (provision.quantity * provision.service.cost for provision in booking.service_provisions.all()),
+        Decimal(0),
+    )
+    services_due = discounted(services_total, booking.guest.discount)
+    return booking.total_cost + services_due - booking.paid_amount
@@ -0,0 +1,338 @@
+import csv
+import secrets
+import time
+from bisect import bisect_left
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+from django.utils.dateparse import parse_date
+
+from . import portal, rollups, stats
+from .models import Booking, Document, Room, User, UserRole
+from .reservations import OVERLAP_CONSTRAINT, lock_for_write
+
+CHUNK_SIZE = 5000
+
+GUEST_COLUMNS = ['email', 'first_name', 'phone_number', 'birth_date', 'discount', 'role', 'password',
+                 'document_series', 'document_number', 'document_issue_date', 'document_issued_by']
+BOOKING_COLUMNS = ['guest_email', 'room_id', 'check_in_date', 'check_out_date', 'total_cost', 'paid_amount']
+DOCUMENT_FIELDS = ['series', 'number', 'issue_date', 'issued_by']
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        # (первая, последняя) дата импортированных броней — для пересчёта роллапов
+        self.period = None
+
+    def error(self, number, message):
+        self.errors.append((number, message))
+
+
+def _text(row, name, max_length=None, required=False):
+    value = (row.get(name) or '').strip()
+    if required and not value:
+        raise ValueError(f'Поле {name} обязательно')
+    if max_length and len(value) > max_length:
+        raise ValueError(f'Поле {name} длиннее {max_length} символов')
+    return value
+
+
+def _date(row, name, required=False):
+    value = _text(row, name, required=required)
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError(f'Некорректная дата в поле {name}: {value}')
+    return date
+
+
+def _decimal(row, name, default=None):
+    value = _text(row, name, required=default is None) or default
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Некорректное число в поле {name}: {value}')
+    if not number.is_finite() or number < 0:
+        raise ValueError(f'Некорректное число в поле {name}: {value}')
+    return number
+
+
+def parse_guest(row, roles=None):
+    """Строка CSV гостя -> (User, Document или None). Пароль не хешируется.
+
+    roles — роли, которые можно назначить (по умолчанию любые).
+    """
+    email = BaseUserManager.normalize_email(_text(row, 'email', 254, required=True))
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError(f'Некорректный email: {email}')
+    role = _text(row, 'role') or UserRole.CLIENT
+    if role not in UserRole.values:
+        raise ValueError(f'Неизвестная роль: {role}')
+    if roles is not None and role not in roles:
+        raise ValueError(f'Роль {role} нельзя назначить этим импортом')
+    discount = _decimal(row, 'discount', default='0')
+    if discount > 100:
+        raise ValueError('Скидка не может быть больше 100%')
+
+    user = User(
+        email=email,
+        first_name=_text(row, 'first_name', 150),
+        phone_number=_text(row, 'phone_number', 20),
+        birth_date=_date(row, 'birth_date'),
+        discount=discount,
+        role=role,
+    )
+
+    values = {field: _text(row, f'document_{field}') for field in DOCUMENT_FIELDS}
+    document = None
+    if any(values.values()):
+        missing = [field for field, value in values.items() if not value]
+        if missing:
+            raise ValueError('Не заполнены поля документа: ' + ', '.join(f'document_{field}' for field in missing))
+        document = Document(
+            series=_text(row, 'document_series', 50),
+            number=_text(row, 'document_number', 50),
+            issue_date=_date(row, 'document_issue_date'),
+            issued_by=_text(row, 'document_issued_by', 255),
+        )
+    return user, document
+
+
+def parse_booking(row):
+    """Строка CSV брони -> (email гостя, Booking без guest_id)."""
+    email = BaseUserManager.normalize_email(_text(row, 'guest_email', required=True))
+    room_id = _text(row, 'room_id', required=True)
+    if not room_id.isdigit():
+        raise ValueError(f'Некорректный номер комнаты: {room_id}')
+    check_in = _date(row, 'check_in_date', required=True)
+    check_out = _date(row, 'check_out_date', required=True)
+    if check_out <= check_in:
+        raise ValueError('Дата выезда должна быть позже даты заезда')
+    return email, Booking(
+        room_id=int(room_id),
+        check_in_date=check_in,
+        check_out_date=check_out,
+        total_cost=_decimal(row, 'total_cost'),
+        paid_amount=_decimal(row, 'paid_amount', default='0'),
+    )
+
+
+def unusable_password():
+    # то же, что make_password(None), но без посимвольного get_random_string,
+    # который заметен на сотнях тысяч строк
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for number, row in rows:
+        chunk.append((number, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_guests(rows, chunk_size=CHUNK_SIZE, result=None, roles=None):
+    """Первый проход: документы и гости.
+
+    rows — итерируемое из (номер строки, dict). Каждая пачка пишется в
+    своей транзакции двумя bulk_create: сначала документы, затем гости со
+    ссылками на созданные документы. Ошибочные строки пропускаются.
+    Без пароля в CSV гостю ставится непригодный пароль (без хеширования).
+    Строки с ролью не из roles (если задан) отклоняются.
+    """
+    result = result or ImportResult()
+    seen = set()
+    for chunk in _chunks(rows, chunk_size):
+        parsed = []
+        for number, row in chunk:
+            try:
+                user, document = parse_guest(row, roles)
+            except ValueError as e:
+                result.error(number, str(e))
+                continue
+            if user.email in seen:
+                result.error(number, f'Email {user.email} повторяется в файле')
+                continue
+            seen.add(user.email)
+            password = (row.get('password') or '').strip()
+            user.password = make_password(password) if password else unusable_password()
+            parsed.append((number, user, document))
+
+        existing = set(
+            User.objects.filter(email__in=[user.email for _, user, _ in parsed]).values_list('email', flat=True)
+        )
+        valid = []
+        for number, user, document in parsed:
+            if user.email in existing:
+                result.error(number, f'Пользователь {user.email} уже существует')
+            else:
+                valid.append((user, document))
+
+        with transaction.atomic():
+            Document.objects.bulk_create([document for _, document in valid if document])
+            for user, document in valid:
+                if document:
+                    user.document_id = document.id
+            User.objects.bulk_create([user for user, _ in valid])
+        result.created += len(valid)
+    return result
+
+
+class RoomCalendar:
+    """Непересекающиеся брони одного номера, отсортированные по заезду."""
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals)
+
+    def fits(self, check_in, check_out):
+        index = bisect_left(self.intervals, (check_out,))
+        return index == 0 or self.intervals[index - 1][1] <= check_in
+
+    def add(self, check_in, check_out):
+        index = bisect_left(self.intervals, (check_in,))
+        self.intervals.insert(index, (check_in, check_out))
+
+
+def _calendars(bookings):
+    room_ids = {booking.room_id for booking in bookings}
+    start = min(booking.check_in_date for booking in bookings)
+    end = max(booking.check_out_date for booking in bookings)
+    calendars = {room_id: RoomCalendar() for room_id in room_ids}
+    existing = Booking.objects.filter(
+        room_id__in=room_ids, check_in_date__lt=end, check_out_date__gt=start,
+    ).values_list('room_id', 'check_in_date', 'check_out_date')
+    for room_id, check_in, check_out in existing:
+        calendars[room_id].intervals.append((check_in, check_out))
+    for calendar in calendars.values():
+        calendar.intervals.sort()
+    return calendars
+
+
+def _create_each(numbered, result):
+    created = []
+    for number, booking in numbered:
+        try:
+            with transaction.atomic():
+                Booking.objects.bulk_create([booking])
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT in str(e):
+                result.error(number, f'Номер {booking.room_id} уже занят на эти даты')
+            else:
+                result.error(number, f'Бронь не сохранена: {e}')
+            continue
+        created.append(booking)
+    return created
+
+
+def import_bookings(rows, chunk_size=CHUNK_SIZE, result=None):
+    """Второй проход: брони. Гость ищется по email, номер — по id.
+
+    Бронь, пересекающаяся с уже существующей (в базе или ранее в файле)
+    на тот же номер, отклоняется. Календари номеров читаются в транзакции
+    пачки; на SQLite — под блокировкой записи, как в reservations.reserve.
+    """
+    result = result or ImportResult()
+    for chunk in _chunks(rows, chunk_size):
+        parsed = []
+        for number, row in chunk:
+            try:
+                email, booking = parse_booking(row)
+            except ValueError as e:
+                result.error(number, str(e))
+                continue
+            parsed.append((number, email, booking))
+        if not parsed:
+            continue
+
+        guests = dict(
+            User.objects.filter(email__in={email for _, email, _ in parsed}).values_list('email', 'id')
+        )
+        rooms = set(Room.objects.filter(id__in={booking.room_id for _, _, booking in parsed})
+                    .values_list('id', flat=True))
+        resolved = []
+        for number, email, booking in parsed:
+            booking.guest_id = guests.get(email)
+            if booking.guest_id is None:
+                result.error(number, f'Гость {email} не найден')
+            elif booking.room_id not in rooms:
+                result.error(number, f'Номер {booking.room_id} не найден')
+            else:
+                resolved.append((number, booking))
+
+        valid = []
+        numbers = []
+        with transaction.atomic():
+            if resolved and not connection.features.has_select_for_update:
+                # SQLite: ограничения на пересечение нет, поэтому календари читаются под той же
+                # блокировкой записи, что берёт reservations.reserve, и бронь через API не вклинится
+                lock_for_write({booking.room_id for _, booking in resolved})
+            calendars = _calendars([booking for _, booking in resolved]) if resolved else {}
+            for number, booking in resolved:
+                calendar = calendars[booking.room_id]
+                if not calendar.fits(booking.check_in_date, booking.check_out_date):
+                    result.error(number, f'Номер {booking.room_id} уже занят на эти даты')
+                    continue
+                calendar.add(booking.check_in_date, booking.check_out_date)
+                valid.append(booking)
+                numbers.append(number)
+
+            try:
+                with transaction.atomic():
+                    Booking.objects.bulk_create(valid)
+            except IntegrityError:
+                # PostgreSQL: номер успели забронировать через API после чтения календарей
+                valid = _create_each(zip(numbers, valid), result)
+        result.created += len(valid)
+        portal.invalidate(booking.guest_id for booking in valid)
+        if valid:
+            start = min(booking.check_in_date for booking in valid)
+            end = max(booking.check_out_date for booking in valid)
+            if result.period:
+                start, end = min(start, result.period[0]), max(end, result.period[1])
+            result.period = (start, end)
+    return result
+
+
+def import_csv(sources, delimiter=',', chunk_size=CHUNK_SIZE, roles=None):
+    """Импорт из открытых CSV: sources — {'guests': (подпись, файл), 'bookings': (подпись, файл)}.
+
+    Гости раньше броней: брони ссылаются на гостей по email. После броней
+    пересчитываются роллапы за их период, в конце — счётчики панели
+    (bulk_create не вызывает сигналы). Возвращает [(подпись, ImportResult,
+    секунды)]; если в файле нет обязательных столбцов — ValueError.
+    roles ограничивает роли импортируемых гостей.
+    """
+    reports = []
+    for name, required, run in [('guests', {'email'}, partial(import_guests, roles=roles)),
+                                ('bookings', set(BOOKING_COLUMNS) - {'paid_amount'}, import_bookings)]:
+        if name not in sources:
+            continue
+        label, source = sources[name]
+        started = time.perf_counter()
+        reader = csv.DictReader(source, delimiter=delimiter)
+        missing = required - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f'{label}: нет столбцов {", ".join(sorted(missing))}')
+        # номер строки в файле с учётом заголовка
+        result = run(((reader.line_num, row) for row in reader), chunk_size, ImportResult())
+        reports.append((label, result, time.perf_counter() - started))
+        if name == 'bookings' and result.period:
+            rollups.backfill(*result.period)
+    stats.rebuild()
+    return reports
@@ -0,0 +1,287 @@
+"""Очередь фоновых задач в базе, без внешнего брокера.
+
+enqueue() ставит задачу, manage.py run_jobs выполняет их пулом потоков или
+процессов. Задачу забирает условный UPDATE (на PostgreSQL — после SELECT
+... FOR UPDATE SKIP LOCKED), поэтому она достаётся одному воркеру. Пока
+задача выполняется, воркер продлевает locked_until; если воркер пропал,
+после HOTEL_JOB_VISIBILITY_TIMEOUT задачу заберёт другой. Упавшая задача
+повторяется с удваивающейся паузой, пока не исчерпает max_attempts.
+Результат и ошибку пишет только тот, кто держит задачу (worker + attempts).
+"""
+import csv
+import io
+import logging
+import os
+import socket
+import tempfile
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import exports, imports, rollups
+from .models import Job, JobStatus
+
+logger = logging.getLogger('hotel.jobs')
+
+VISIBILITY_TIMEOUT = getattr(settings, 'HOTEL_JOB_VISIBILITY_TIMEOUT', 300)
+RETRY_DELAY = getattr(settings, 'HOTEL_JOB_RETRY_DELAY', 30)
+POLL_INTERVAL = getattr(settings, 'HOTEL_JOB_POLL_INTERVAL', 1.0)
+CLAIM_BATCH = 10
+FINISHED = (JobStatus.DONE, JobStatus.FAILED)
+
+# вид задачи -> (название для менеджера, функция job -> результат в JSON)
+HANDLERS = {}
+
+
+def handler(kind, title):
+    def register(func):
+        HANDLERS[kind] = (title, func)
+        return func
+    return register
+
+
+def enqueue(kind, params=None, user=None, max_attempts=3):
+    if kind not in HANDLERS:
+        raise ValueError(f'Неизвестная задача: {kind}')
+    return Job.objects.create(kind=kind, params=params or {}, created_by=user, max_attempts=max_attempts,
+                              run_after=timezone.now())
+
+
+def _claimable(now):
+    return Q(status=JobStatus.QUEUED, run_after__lte=now) | Q(status=JobStatus.RUNNING, locked_until__lt=now)
+
+
+def _held(job):
+    return Job.objects.filter(pk=job.pk, status=JobStatus.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def claim(worker, kinds=None):
+    """Забрать следующую готовую задачу или None."""
+    now = timezone.now()
+    candidates = Job.objects.filter(_claimable(now)).order_by('run_after', 'id')
+    if kinds:
+        candidates = candidates.filter(kind__in=kinds)
+    taken = {'status': JobStatus.RUNNING, 'worker': worker, 'started_at': now,
+             'locked_until': now + timedelta(seconds=VISIBILITY_TIMEOUT)}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = candidates.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.attempts += 1
+            for field, value in taken.items():
+                setattr(job, field, value)
+            job.save(update_fields=[*taken, 'attempts'])
+            return job
+
+    # SQLite: кто первым обновил строку, тот и взял; остальные пробуют следующую
+    for job_id in list(candidates.values_list('id', flat=True)[:CLAIM_BATCH]):
+        if Job.objects.filter(_claimable(now), pk=job_id).update(attempts=F('attempts') + 1, **taken):
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def extend(jobs):
+    """Продлить видимость задач, которые воркер ещё выполняет."""
+    locked_until = timezone.now() + timedelta(seconds=VISIBILITY_TIMEOUT)
+    for job in jobs:
+        _held(job).update(locked_until=locked_until)
+
+
+def complete(job, result):
+    now = timezone.now()
+    if not _held(job).update(status=JobStatus.DONE, result=result, error='', locked_until=None, finished_at=now):
+        logger.warning('Задачу %s уже забрал другой воркер, результат попытки %s отброшен', job.pk, job.attempts)
+
+
+def fail(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        changes = {'status': JobStatus.FAILED, 'finished_at': now}
+    else:
+        delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+        changes = {'status': JobStatus.QUEUED, 'run_after': now + timedelta(seconds=delay)}
+    _held(job).update(error=error, locked_until=None, **changes)
+
+
+def execute(job):
+    _, func = HANDLERS[job.kind]
+    try:
+        result = func(job)
+    except Exception:
+        logger.exception('Задача %s (%s), попытка %s', job.pk, job.kind, job.attempts)
+        fail(job, traceback.format_exc(limit=5))
+    else:
+        complete(job, result)
+
+
+class Worker:
+    """Несколько потоков, выбирающих задачи, и поток продления видимости."""
+
+    def __init__(self, threads=1, kinds=None, poll=POLL_INTERVAL, once=False, stop=None):
+        self.threads = threads
+        self.kinds = kinds
+        self.poll = poll
+        self.once = once
+        self.stop = stop or threading.Event()
+        self.prefix = f'{socket.gethostname()}:{os.getpid()}'
+        self.running = {}
+        self.lock = threading.Lock()
+        self.processed = 0
+
+    def run(self):
+        threads = [threading.Thread(target=self.loop, args=(f'{self.prefix}:{index}',), daemon=True)
+                   for index in range(self.threads)]
+        heartbeat = threading.Thread(target=self.heartbeat, daemon=True)
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stop.set()
+        heartbeat.join()
+        return self.processed
+
+    def loop(self, name):
+        try:
+            while not self.stop.is_set():
+                job = claim(name, self.kinds)
+                if job is None:
+                    if self.once:
+                        break
+                    self.stop.wait(self.poll)
+                    continue
+                with self.lock:
+                    self.running[name] = job
+                try:
+                    execute(job)
+                finally:
+                    with self.lock:
+                        del self.running[name]
+                        self.processed += 1
+        finally:
+            connections.close_all()
+
+    def heartbeat(self):
+        try:
+            while not self.stop.wait(VISIBILITY_TIMEOUT / 3):
+                with self.lock:
+                    jobs = list(self.running.values())
+                extend(jobs)
+        finally:
+            connections.close_all()
+
+
+def output_name(job, filename):
+    return f'jobs/{job.pk}/{filename}'
+
+
+def save_upload(upload):
+    """Сохранить загруженный файл для задачи, вернуть имя в хранилище."""
+    return default_storage.save(f'jobs/uploads/{uuid.uuid4().hex}-{os.path.basename(upload.name)}', upload)
+
+
+def _save_text(name, chunks):
+    # через временный файл: выгрузка не собирается в памяти целиком
+    with tempfile.TemporaryFile() as buffer:
+        for chunk in chunks:
+            buffer.write(chunk.encode('utf-8'))
+        size = buffer.tell()
+        buffer.seek(0)
+        return default_storage.save(name, File(buffer, name=os.path.basename(name))), size
+
+
+def parse_period(params):
+    start, end = parse_date(params.get('start') or ''), parse_date(params.get('end') or '')
+    if start is None or end is None or end < start:
+        raise ValueError('Нужен период: start и end (ГГГГ-ММ-ДД), end не раньше start')
+    return start, end
+
+
+@handler('export', 'Выгрузка')
+def run_export(job):
+    params = job.params
+    filters = exports.parse_filters(params.get('start'), params.get('end'), params.get('role'))
+    export_format = params.get('format', 'csv')
+    if params.get('name') not in exports.EXPORTS or export_format not in exports.FORMATS:
+        raise ValueError('Неизвестная выгрузка или формат')
+    name, size = _save_text(output_name(job, f'{params["name"]}.{export_format}'),
+                            exports.stream(params['name'], export_format, **filters))
+    return {'file': name, 'size': size}
+
+
+@handler('backfill_rollups', 'Пересчёт роллапов')
+def run_backfill(job):
+    start, end = parse_period(job.params)
+    result = {'days': 0, 'services': 0}
+    # порциями по кварталу, как manage.py backfill_rollups
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=93 - 1))
+        days, services = rollups.backfill(start, chunk_end)
+        result['days'] += days
+        result['services'] += services
+        start = chunk_end + timedelta(days=1)
+    return result
+
+
+@handler('report', 'Отчёт по загрузке')
+def run_report(job):
+    start, end = parse_period(job.params)
+
+    def lines():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['month', 'category', 'room_nights', 'occupancy', 'adr', 'room_revenue', 'service_revenue'])
+        for row in rollups.monthly_report(start, end):
+            writer.writerow([row['month'].strftime('%Y-%m'), row['category'].name, row['room_nights'],
+                             row['occupancy'], row['adr'], row['room_revenue'], row['service_revenue']])
+        writer.writerow([])
+        writer.writerow(['service', 'quantity', 'revenue'])
+        for service in rollups.top_services(start, end):
+            writer.writerow([service['service__name'], service['quantity_total'], service['revenue_total']])
+        yield output.getvalue()
+
+    name, size = _save_text(output_name(job, f'report-{start:%Y%m%d}-{end:%Y%m%d}.csv'), lines())
+    return {'file': name, 'size': size}
+
+
+@handler('import', 'Импорт из CSV')
+def run_import(job):
+    params = job.params
+    sources = {}
+    try:
+        for kind in ('guests', 'bookings'):
+            if params.get(kind):
+                source = io.TextIOWrapper(default_storage.open(params[kind], 'rb'), encoding='utf-8-sig', newline='')
+                sources[kind] = (kind, source)
+        reports = imports.import_csv(sources, params.get('delimiter', ','), roles=params.get('roles'))
+    finally:
+        for _, source in sources.values():
+            source.close()
+
+    result = {'created': {}, 'errors': 0}
+    errors = []
+    for label, report, _ in reports:
+        result['created'][label] = report.created
+        errors += [(label, number, message) for number, message in report.errors]
+    if errors:
+        def lines():
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(['file', 'line', 'error'])
+            writer.writerows(errors)
+            yield output.getvalue()
+
+        result['errors'] = len(errors)
+        result['file'], result['size'] = _save_text(output_name(job, 'import_errors.csv'), lines())
+    return result
@@ -0,0 +1,72 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from hotel import archive
+from hotel.benchmarks import percentile, time_call
+from hotel.folio import folios
+from hotel.models import Booking, Room, ServiceProvision
+
+
+def hot_queries(today):
+    """Типичные запросы к горячим таблицам: (название, queryset)."""
+    room_id = Room.objects.order_by('id').values_list('id', flat=True).first() or 0
+    month = today.replace(day=1)
+    return [
+        ('пересечение броней номера', Booking.objects.filter(
+            room_id=room_id, check_in_date__lt=today + timedelta(days=3), check_out_date__gt=today,
+        )),
+        ('счета, первая страница', folios().order_by('-check_in_date', '-id')[:30]),
+        ('брони за месяц', Booking.objects.filter(check_in_date__lte=today, check_out_date__gt=month)),
+        ('услуги за месяц', ServiceProvision.objects.filter(service_date__range=(month, today))),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Переносит проживания с выездом раньше горизонта из Booking и ServiceProvision в архивные таблицы; '
+            'выводит размеры таблиц и планы запросов до и после')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.ARCHIVE_AFTER_DAYS,
+                            help='Горизонт: выезд больше стольких дней назад')
+        parser.add_argument('--before', help='Вместо --days: выезд раньше даты ГГГГ-ММ-ДД')
+        parser.add_argument('--chunk-size', type=int, default=archive.CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет перенесено')
+        parser.add_argument('--explain', action='store_true', help='Планы и время типичных запросов до и после')
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        if options['before']:
+            before = parse_date(options['before'])
+            if before is None:
+                raise CommandError(f'Некорректная дата: {options["before"]}')
+        else:
+            before = archive.horizon(today, options['days'])
+        # текущие и будущие проживания в архив не попадают
+        if before > today:
+            raise CommandError('Горизонт архивации не может быть позже сегодняшнего дня')
+
+        due = Booking.objects.filter(check_out_date__lt=before).count()
+        self.stdout.write(f'Выезд раньше {before}: броней к переносу {due}')
+        self.report('до', today, options)
+        if options['dry_run']:
+            return
+        bookings, provisions = archive.archive(before, options['chunk_size'])
+        self.stdout.write(f'Перенесено в архив: броней {bookings}, услуг {provisions}')
+        self.report('после', today, options)
+
+    def report(self, label, today, options):
+        self.stdout.write(f'\nТаблицы {label} переноса:')
+        self.stdout.write(json.dumps(archive.table_sizes(), indent=2))
+        if not options['explain']:
+            return
+        analyze = {'analyze': True} if connection.vendor == 'postgresql' else {}
+        for name, queryset in hot_queries(today):
+            samples = [time_call(list, queryset.all())[1] for _ in range(options['runs'])]
+            self.stdout.write(f'\n{name} ({label}): p50 {percentile(samples, 50):.2f} мс')
+            self.stdout.write(queryset.explain(**analyze))
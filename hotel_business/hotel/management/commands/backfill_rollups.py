@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+
+from hotel import rollups
+from hotel.models import ArchivedBooking, ArchivedServiceProvision, Booking, ServiceProvision
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные роллапы загрузки и выручки за период (по умолчанию за всю историю)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='ГГГГ-ММ-ДД')
+        parser.add_argument('--end', help='ГГГГ-ММ-ДД')
+        parser.add_argument('--months', type=int, default=3, help='Пересчитывать порциями по столько месяцев')
+
+    def handle(self, *args, **options):
+        start = self.parse(options['start'])
+        end = self.parse(options['end'])
+        if start is None or end is None:
+            # rollups.backfill читает и архив (hotel.archive), поэтому границы тоже по обеим таблицам
+            bounds = [
+                model.objects.aggregate(first=Min(first), last=Max(last))
+                for model, first, last in [(Booking, 'check_in_date', 'check_out_date'),
+                                           (ArchivedBooking, 'check_in_date', 'check_out_date'),
+                                           (ServiceProvision, 'service_date', 'service_date'),
+                                           (ArchivedServiceProvision, 'service_date', 'service_date')]
+            ]
+            firsts = [bound['first'] for bound in bounds if bound['first']]
+            lasts = [bound['last'] for bound in bounds if bound['last']]
+            if not firsts:
+                self.stdout.write('Нет данных для пересчёта')
+                return
+            start = start or min(firsts)
+            end = end or max(lasts)
+
+        step = timedelta(days=31 * options['months'])
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + step - timedelta(days=1))
+            days, services = rollups.backfill(chunk_start, chunk_end)
+            self.stdout.write(f'{chunk_start} — {chunk_end}: строк загрузки {days}, строк по услугам {services}')
+            chunk_start = chunk_end + timedelta(days=1)
+
+    def parse(self, value):
+        if not value:
+            return None
+        try:
+            date = parse_date(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise CommandError(f'Некорректная дата: {value}')
+        return date
@@ -0,0 +1,72 @@
+import json
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hotel.availability import find_available_rooms
+from hotel.benchmarks import summarize, time_call
+from hotel.models import Booking, Category, Room, User, UserRole
+
+
+class Command(BaseCommand):
+    help = 'Заполняет временные данные и замеряет время поиска свободных номеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=500)
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--runs', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Не откатывать сгенерированные данные')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            today = self.seed(rnd, options['rooms'], options['years'])
+            samples = []
+            for _ in range(options['runs']):
+                check_in = today + timedelta(days=rnd.randint(0, 60))
+                check_out = check_in + timedelta(days=rnd.randint(1, 14))
+                _, elapsed = time_call(
+                    lambda: list(find_available_rooms(check_in, check_out, bed_count=rnd.randint(1, 4)))
+                )
+                samples.append(elapsed)
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        report = summarize(samples)
+        report.update(rooms=options['rooms'], years=options['years'])
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, rnd, room_total, years):
+        categories = Category.objects.bulk_create(
+            Category(name=f'Категория {i}', price=Decimal(2000 + i * 1500)) for i in range(4)
+        )
+        rooms = Room.objects.bulk_create(
+            Room(category=rnd.choice(categories), floor=i // 20 + 1, room_count=rnd.randint(1, 3),
+                 bed_count=rnd.randint(1, 4))
+            for i in range(room_total)
+        )
+        guests = User.objects.bulk_create(
+            User(email=f'bench-availability-{i}@example.com', role=UserRole.CLIENT, password='!')
+            for i in range(50)
+        )
+
+        today = date.today()
+        start = today - timedelta(days=365 * years - 90)
+        bookings = []
+        for room in rooms:
+            day = start
+            while day < today + timedelta(days=90):
+                day += timedelta(days=rnd.randint(0, 3))
+                nights = rnd.randint(1, 7)
+                bookings.append(Booking(
+                    guest=rnd.choice(guests), room=room, check_in_date=day,
+                    check_out_date=day + timedelta(days=nights), total_cost=Decimal(3000 * nights),
+                ))
+                day += timedelta(days=nights)
+        Booking.objects.bulk_create(bookings, batch_size=5000)
+        self.stderr.write(f'Сгенерировано номеров: {len(rooms)}, бронирований: {len(bookings)}')
+        return today
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from hotel.benchmarks import summarize, time_call
+from hotel.folio import compute_balance, folios
+from hotel.models import Booking
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает расчёт балансов одним запросом с наивным расчётом по каждой брони (на текущих данных)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=5000, help='Сколько броней брать в расчёт')
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--naive-runs', type=int, default=1)
+
+    def handle(self, *args, **options):
+        ids = list(Booking.objects.order_by('-id').values_list('id', flat=True)[:options['bookings']])
+        report = {'bookings': len(ids)}
+
+        def annotated():
+            return {booking.id: booking.balance for booking in folios(booking_ids=ids)}
+
+        def naive():
+            bookings = Booking.objects.filter(id__in=ids).select_related('guest')
+            return {booking.id: compute_balance(booking) for booking in bookings}
+
+        for name, func, runs in [('annotated', annotated, options['runs']),
+                                 ('naive', naive, options['naive_runs'])]:
+            samples = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(runs):
+                    result, elapsed = time_call(func)
+                    samples.append(elapsed)
+            report[name] = summarize(samples)
+            report[name]['queries_per_run'] = len(queries) // max(1, runs)
+            report[f'{name}_total'] = str(sum(result.values()))
+
+        self.stdout.write(json.dumps(report, indent=2))
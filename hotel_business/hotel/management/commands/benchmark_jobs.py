@@ -0,0 +1,60 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hotel import jobs
+from hotel.models import Job, JobStatus
+
+
+@jobs.handler('benchmark_wait', 'Ожидание (бенчмарк)')
+def wait(job):
+    # задача, которая в основном ждёт ввода-вывода (почта, внешний API, хранилище)
+    time.sleep(job.params['seconds'])
+    return {}
+
+
+class Command(BaseCommand):
+    help = ('Ставит в очередь N одинаковых задач и выполняет их run_jobs --once с разным числом воркеров, '
+            'выводит задачи в секунду')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=40)
+        parser.add_argument('--kind', choices=['export', 'report', 'wait'], default='export',
+                            help='wait — задача, которая только ждёт --wait секунд')
+        parser.add_argument('--wait', type=float, default=0.2)
+        parser.add_argument('--workers', default='1,2,4,8', help='Числа воркеров через запятую')
+        parser.add_argument('--processes', action='store_true')
+
+    def handle(self, *args, **options):
+        end = timezone.now().date()
+        kind = 'benchmark_wait' if options['kind'] == 'wait' else options['kind']
+        params = {
+            'export': {'name': 'bookings', 'format': 'csv'},
+            'report': {'start': (end - timedelta(days=365)).isoformat(), 'end': end.isoformat()},
+            'wait': {'seconds': options['wait']},
+        }[options['kind']]
+        report = {'kind': options['kind'], 'jobs': options['jobs'], 'processes': options['processes'], 'runs': []}
+        for workers in [int(value) for value in options['workers'].split(',')]:
+            batch = [jobs.enqueue(kind, params) for _ in range(options['jobs'])]
+            started = time.perf_counter()
+            call_command('run_jobs', workers=workers, processes=options['processes'], once=True,
+                         kinds=[kind], stderr=self.stderr)
+            elapsed = time.perf_counter() - started
+
+            finished = Job.objects.filter(id__in=[job.id for job in batch])
+            report['runs'].append({
+                'workers': workers,
+                'seconds': round(elapsed, 2),
+                'done': finished.filter(status=JobStatus.DONE).count(),
+                'jobs_per_s': round(len(batch) / elapsed, 1),
+            })
+            for job in finished:
+                if job.result and job.result.get('file'):
+                    default_storage.delete(job.result['file'])
+            finished.delete()
+        self.stdout.write(json.dumps(report, indent=2))
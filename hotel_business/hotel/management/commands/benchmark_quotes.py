@@ -0,0 +1,71 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hotel import quotes
+from hotel.benchmarks import summarize, time_call
+from hotel.models import Category, RateRule
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает расчёт стоимости проживания в Decimal по каждому номеру и ночи '
+            'с пакетным расчётом в копейках (NumPy и чистый Python)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=500)
+        parser.add_argument('--nights', type=int, default=30)
+        parser.add_argument('--discount', default='12.5')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--decimal-runs', type=int, default=3)
+        parser.add_argument('--distinct-prices', action='store_true',
+                            help='Своя цена у каждого номера (например, тарифы каналов продаж)')
+
+    def handle(self, *args, **options):
+        check_in = timezone.now().date()
+        check_out = check_in + timedelta(days=options['nights'])
+        discount = Decimal(options['discount'])
+
+        categories = list(Category.objects.values_list('id', 'price')) or [
+            (index, Decimal(2000 + 750 * index) + Decimal('0.99')) for index in range(1, 6)
+        ]
+        rooms = [(number, *categories[number % len(categories)]) for number in range(1, options['rooms'] + 1)]
+        if options['distinct_prices']:
+            rooms = [(number, category_id, price + Decimal(number) / 100) for number, category_id, price in rooms]
+        rules = list(RateRule.objects.all()) or [
+            RateRule(id=1, name='Выходные', weekdays='45', percent=Decimal('120.00')),
+            RateRule(id=2, name='Сезон', start_date=check_in + timedelta(days=10),
+                     end_date=check_in + timedelta(days=20), percent=Decimal('115.50')),
+            RateRule(id=3, name='Акция', category_id=categories[0][0], percent=Decimal('93.33'), priority=1),
+        ]
+
+        report = {'rooms': len(rooms), 'nights': options['nights'], 'rules': len(rules),
+                  'prices': len({price for _, _, price in rooms})}
+        def decimal_totals():
+            return [(row['total'], row['due']) for row in quotes.quote_decimal(rooms, rules, check_in, check_out,
+                                                                                discount)]
+
+        def batched_totals(engine):
+            # в замер входит и перевод итогов обратно в Decimal
+            calendar = quotes.RateCalendar(rules, check_in, check_out)
+            result = quotes.quote_rooms(rooms, calendar, discount, engine=engine)
+            return [(quotes.from_cents(total), quotes.from_cents(due)) for total, due in zip(result.totals, result.due)]
+
+        expected = None
+        runs = [('decimal', decimal_totals, options['decimal_runs'])] + [
+            (engine, lambda engine=engine: batched_totals(engine), options['runs']) for engine in quotes.ENGINES
+        ]
+        for name, func, count in runs:
+            samples = []
+            for _ in range(count):
+                totals, elapsed = time_call(func)
+                samples.append(elapsed)
+            expected = expected or totals
+            report[name] = summarize(samples)
+            report[name]['matches_decimal'] = totals == expected
+        for engine in quotes.ENGINES:
+            report[f'{engine}_speedup'] = round(report['decimal']['p50_ms'] / report[engine]['p50_ms'], 1)
+
+        self.stdout.write(json.dumps(report, indent=2))
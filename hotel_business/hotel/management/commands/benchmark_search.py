@@ -0,0 +1,56 @@
+import json
+import random
+import string
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from hotel.benchmarks import summarize, time_call
+from hotel.models import Service, User, UserRole
+from hotel.search import search_clients, search_services
+
+WORDS = ['спа', 'массаж', 'трансфер', 'завтрак', 'ужин', 'сауна', 'бассейн', 'прачечная',
+         'minibar', 'taxi', 'laundry', 'breakfast', 'spa', 'gym', 'parking', 'tour']
+
+
+class Command(BaseCommand):
+    help = 'Заполняет временные данные и замеряет время поиска услуг и клиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--runs', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            self.seed(rnd, options['rows'])
+            report = {'vendor': connection.vendor, 'rows': options['rows']}
+            for name, search in [('services', search_services), ('clients', search_clients)]:
+                samples = []
+                for _ in range(options['runs']):
+                    word = rnd.choice(WORDS)
+                    query = word[:rnd.randint(3, len(word))]
+                    _, elapsed = time_call(lambda: list(search(query, limit=options['limit'])))
+                    samples.append(elapsed)
+                report[name] = summarize(samples)
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, rnd, rows):
+        def phrase(count):
+            return ' '.join(rnd.choice(WORDS) for _ in range(count))
+
+        Service.objects.bulk_create(
+            (Service(name=f'{phrase(2)} {i}', cost=rnd.randint(100, 5000), description=phrase(8),
+                     is_active=True) for i in range(rows)),
+            batch_size=5000,
+        )
+        User.objects.bulk_create(
+            (User(email=f'{rnd.choice(WORDS)}.{i}@example.com', first_name=phrase(2), role=UserRole.CLIENT,
+                  phone_number=''.join(rnd.choice(string.digits) for _ in range(11)), password='!')
+             for i in range(rows)),
+            batch_size=5000,
+        )
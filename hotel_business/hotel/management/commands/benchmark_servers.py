@@ -0,0 +1,90 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from hotel.benchmarks import summarize
+from hotel.models import User, UserRole
+
+PATHS = ['/services/', '/manager/', '/manager/rooms/', '/manager/services/']
+
+
+class Command(BaseCommand):
+    help = ('Нагружает уже запущенный сервер (gunicorn/WSGI или uvicorn/ASGI) N параллельными клиентами '
+            'и выводит пропускную способность и задержки по страницам')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес сервера, например http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на каждую страницу')
+        parser.add_argument('--path', action='append', dest='paths', help='Страница (можно несколько раз)')
+        parser.add_argument('--label', default='', help='Подпись в отчёте, например wsgi или asgi')
+        parser.add_argument('--output', help='Дописать отчёт в JSON-файл')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Ожидается адрес вида http://host:port')
+        # сессия менеджера создаётся прямо в базе, которую использует сервер
+        manager, _ = User.objects.get_or_create(email='bench-manager@example.com',
+                                                defaults={'role': UserRole.MANAGER, 'password': '!'})
+        client = Client()
+        client.force_login(manager)
+        cookie = f'sessionid={client.cookies["sessionid"].value}'
+
+        report = {'label': options['label'], 'url': options['url'], 'concurrency': options['concurrency'],
+                  'paths': {}}
+        for path in options['paths'] or PATHS:
+            report['paths'][path] = self.load(url, path, cookie, options['concurrency'], options['requests'])
+            stats = report['paths'][path]
+            self.stderr.write(f'{path}: {stats["rps"]} req/s, p50 {stats["p50_ms"]} ms, '
+                              f'p99 {stats["p99_ms"]} ms, ошибок {stats["errors"]}')
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options['output']:
+            with open(options['output'], 'a', encoding='utf-8') as output:
+                output.write(json.dumps(report) + '\n')
+
+    def load(self, url, path, cookie, concurrency, total):
+        counter = iter(range(total))
+        lock = threading.Lock()
+        samples = []
+        errors = []
+
+        def worker():
+            # у каждого клиента своё keep-alive соединение
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+            headers = {'Cookie': cookie, 'Host': url.netloc}
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        break
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    ok = False
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    (samples if ok else errors).append(elapsed)
+            connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(worker)
+        duration = time.perf_counter() - started
+
+        stats = summarize(samples)
+        stats['errors'] = len(errors)
+        stats['rps'] = round(len(samples) / duration, 1) if duration else 0.0
+        return stats
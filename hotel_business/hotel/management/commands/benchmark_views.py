@@ -0,0 +1,82 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from hotel.benchmarks import BENCHMARK_VIEWS, summarize, time_call
+from hotel.models import Booking, User, UserRole
+
+
+class Command(BaseCommand):
+    help = 'Прогоняет страницы через тестовый клиент и выводит p50/p95/p99 и число запросов в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на страницу')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--host', default='localhost', help='Должен входить в ALLOWED_HOSTS')
+        parser.add_argument('--path', action='append', help='Прогнать только указанные пути')
+        parser.add_argument('--output', help='Записать отчёт в файл вместо stdout')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        clients = {
+            'anonymous': Client(HTTP_HOST=options['host']),
+            'client': self.client_for(self.in_house_client(today), options['host']),
+            'manager': self.client_for(self.benchmark_user(UserRole.MANAGER), options['host']),
+        }
+
+        report = {'vendor': connection.vendor, 'requests': options['requests'], 'views': []}
+        for path, role in BENCHMARK_VIEWS:
+            path = path.format(today=today, week=today + timedelta(days=7))
+            if options['path'] and path.split('?')[0] not in options['path']:
+                continue
+            report['views'].append(self.run(clients[role], path, role, options))
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def run(self, client, path, role, options):
+        for _ in range(options['warmup']):
+            client.get(path)
+
+        samples = []
+        queries = []
+        status = None
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as captured:
+                response, elapsed = time_call(client.get, path)
+            samples.append(elapsed)
+            queries.append(len(captured))
+            status = response.status_code
+
+        result = {'path': path, 'role': role, 'status': status}
+        result.update(summarize(samples))
+        result['queries_per_request'] = round(sum(queries) / len(queries), 2)
+        result['max_queries'] = max(queries)
+        return result
+
+    def client_for(self, user, host):
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+        return client
+
+    def in_house_client(self, today):
+        booking = Booking.objects.filter(
+            check_in_date__lte=today, check_out_date__gte=today, guest__role=UserRole.CLIENT,
+        ).select_related('guest').first()
+        if booking is None:
+            raise CommandError('Нет клиентов с активной бронью — сначала запустите generate_hotel')
+        return booking.guest
+
+    def benchmark_user(self, role):
+        user, _ = User.objects.get_or_create(email=f'benchmark-{role}@generated.hotel',
+                                             defaults={'role': role, 'password': '!'})
+        return user
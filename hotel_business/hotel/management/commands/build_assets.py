@@ -0,0 +1,69 @@
+import shutil
+import subprocess
+
+try:
+    import sass as libsass
+except ImportError:
+    libsass = None
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+STATIC_DIR = settings.BASE_DIR / 'hotel' / 'static'
+NODE_MODULES = settings.BASE_DIR / 'node_modules'
+# (файл из node_modules/uikit/dist, путь в hotel/static)
+UIKIT_FILES = [
+    ('css/uikit.min.css', 'vendor/uikit/css/uikit.min.css'),
+    ('js/uikit.min.js', 'vendor/uikit/js/uikit.min.js'),
+    ('js/uikit-icons.min.js', 'vendor/uikit/js/uikit-icons.min.js'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Собирает статику: компилирует styles.scss в сжатый CSS, копирует UIkit из node_modules '
+            'в hotel/static/vendor и запускает collectstatic (имена с хешем, .gz и .br)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-sass', action='store_true', help='Не компилировать styles.scss')
+        parser.add_argument('--no-collect', action='store_true', help='Только обновить hotel/static')
+
+    def handle(self, *args, **options):
+        if not options['no_sass']:
+            self.compile_sass()
+        self.vendor_uikit()
+        if not options['no_collect']:
+            call_command('collectstatic', interactive=False, ignore_patterns=['*.scss'],
+                         verbosity=options['verbosity'])
+
+    def compile_sass(self):
+        source = STATIC_DIR / 'css' / 'styles.scss'
+        target = STATIC_DIR / 'css' / 'styles.css'
+        error = 'не найден sass: выполните npm install или pip install libsass'
+        # пакет sass из node_modules запускается через node: ярлыки в .bin есть не везде
+        script = NODE_MODULES / 'sass' / 'sass.js'
+        if script.is_file() and shutil.which('node'):
+            result = subprocess.run([shutil.which('node'), str(script), '--style=compressed', '--no-source-map',
+                                     str(source), str(target)], capture_output=True, text=True)
+            if not result.returncode:
+                return self.report(target)
+            lines = result.stderr.strip().splitlines() or [f'код {result.returncode}']
+            error = next((line.strip() for line in lines if 'Error' in line), lines[-1])
+        if libsass is None:
+            raise CommandError(f'sass: {error}')
+        self.stderr.write(f'sass из node_modules не запустился ({error}), компилирует libsass')
+        target.write_text(libsass.compile(filename=str(source), output_style='compressed'), encoding='utf-8')
+        self.report(target)
+
+    def report(self, target):
+        self.stderr.write(f'{target.relative_to(settings.BASE_DIR)}: {target.stat().st_size} байт')
+
+    def vendor_uikit(self):
+        dist = NODE_MODULES / 'uikit' / 'dist'
+        if not dist.is_dir():
+            raise CommandError('Не найден node_modules/uikit: выполните npm install')
+        for source, target in UIKIT_FILES:
+            target = STATIC_DIR / target
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(dist / source, target)
+        shutil.copyfile(NODE_MODULES / 'uikit' / 'LICENSE.md', STATIC_DIR / 'vendor' / 'uikit' / 'LICENSE.md')
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel.exports import CHUNK_SIZE, EXPORTS, FORMATS, parse_filters, stream
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает клиентов, бронирования или оказанные услуги в CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--start', help='Начальная дата (ГГГГ-ММ-ДД) включительно')
+        parser.add_argument('--end', help='Конечная дата (ГГГГ-ММ-ДД) включительно')
+        parser.add_argument('--role', help='Роль пользователя (для броней и услуг — роль гостя)')
+        parser.add_argument('--output', help='Файл для записи, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options['start'], options['end'], options['role'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = stream(options['name'], options['format'], chunk_size=options['chunk_size'], **filters)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
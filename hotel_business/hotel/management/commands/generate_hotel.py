@@ -0,0 +1,159 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from hotel import equipment, rollups, stats, watermarks
+from hotel.models import (Booking, Category, Document, Equipment, Item, Room, Service, ServiceProvision, User,
+                          UserRole)
+
+ITEM_NAMES = ['Балкон', 'Чайник', 'Сейф', 'Кондиционер', 'Телевизор', 'Мини-бар', 'Фен', 'Ванна', 'Халат',
+              'Кофемашина', 'Утюг', 'Холодильник', 'Микроволновка', 'Рабочий стол', 'Диван', 'Джакузи']
+SERVICE_NAMES = ['Завтрак', 'Ужин', 'Спа', 'Массаж', 'Трансфер', 'Прачечная', 'Сауна', 'Бассейн', 'Экскурсия',
+                 'Парковка', 'Мини-бар', 'Поздний выезд', 'Ранний заезд', 'Фитнес', 'Аренда велосипеда']
+FIRST_NAMES = ['Анна', 'Иван', 'Мария', 'Пётр', 'Елена', 'Сергей', 'Ольга', 'Дмитрий', 'Наталья', 'Алексей']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов', 'Михайлов']
+
+
+class Command(BaseCommand):
+    help = 'Генерирует отель заданного размера: номера, гостей, брони и услуги (детерминированно по --seed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=200)
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--items', type=int, default=12)
+        parser.add_argument('--services', type=int, default=30)
+        parser.add_argument('--guests', type=int, default=5000)
+        parser.add_argument('--years', type=int, default=2, help='Сколько лет истории бронирований')
+        parser.add_argument('--provisions', type=float, default=1.5, help='Среднее число услуг на бронь')
+        parser.add_argument('--until', help='Последняя дата бронирований (ГГГГ-ММ-ДД), по умолчанию сегодня +90 дней; '
+                                            'все даты отсчитываются от неё, поэтому с --until и --seed данные '
+                                            'воспроизводятся')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        try:
+            until = parse_date(options['until']) if options['until'] else timezone.now().date() + timedelta(days=90)
+        except ValueError:
+            until = None
+        if until is None:
+            raise CommandError('Некорректная дата --until')
+        start = until - timedelta(days=365 * options['years'])
+        self.email_suffix = f's{options["seed"]}@generated.hotel'
+        if User.objects.filter(email__endswith=self.email_suffix).exists():
+            raise CommandError(f'Данные с --seed {options["seed"]} уже сгенерированы')
+
+        with transaction.atomic():
+            categories = self.create_categories(rnd, options['categories'], options['items'])
+            rooms = self.create_rooms(rnd, categories, options['rooms'])
+            services = self.create_services(rnd, options['services'])
+            guests = self.create_guests(rnd, options['guests'], start)
+            bookings, provisions = self.create_bookings(rnd, rooms, guests, services, start, until,
+                                                        options['provisions'])
+            stats.rebuild()
+            equipment.refresh_summaries()
+            watermarks.touch(Item, Category, Equipment, Room, Service)
+            rollups.backfill(start, until + timedelta(days=10))
+
+        self.stdout.write(
+            f'Категорий: {len(categories)}, номеров: {len(rooms)}, услуг: {len(services)}, '
+            f'гостей: {len(guests)}, бронирований: {bookings}, услуг оказано: {provisions}'
+        )
+
+    def create_categories(self, rnd, count, item_count):
+        items = Item.objects.bulk_create(
+            Item(name=ITEM_NAMES[i % len(ITEM_NAMES)] + (f' {i // len(ITEM_NAMES) + 1}' if i >= len(ITEM_NAMES) else ''))
+            for i in range(item_count)
+        )
+        categories = Category.objects.bulk_create(
+            Category(name=f'Категория {i + 1}', price=Decimal(2500 + 1500 * i), description='Сгенерированная категория')
+            for i in range(count)
+        )
+        Equipment.objects.bulk_create(
+            Equipment(category=category, item=item)
+            for category in categories
+            for item in rnd.sample(items, rnd.randint(1, len(items)))
+        )
+        return categories
+
+    def create_rooms(self, rnd, categories, count):
+        return Room.objects.bulk_create(
+            (Room(category=rnd.choice(categories), floor=i // 20 + 1, room_count=rnd.randint(1, 3),
+                  bed_count=rnd.randint(1, 4)) for i in range(count)),
+            batch_size=self.batch_size,
+        )
+
+    def create_services(self, rnd, count):
+        return Service.objects.bulk_create(
+            Service(name=SERVICE_NAMES[i % len(SERVICE_NAMES)] + (f' {i // len(SERVICE_NAMES) + 1}' if i >= len(SERVICE_NAMES) else ''),
+                    cost=Decimal(rnd.randrange(100, 5000, 50)), description='Сгенерированная услуга',
+                    is_active=rnd.random() > 0.1)
+            for i in range(count)
+        )
+
+    def create_guests(self, rnd, count, start):
+        guests = []
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            documents = Document.objects.bulk_create(
+                Document(series=f'{rnd.randint(1000, 9999)}', number=f'{rnd.randint(100000, 999999)}',
+                         issue_date=start - timedelta(days=rnd.randint(0, 7300)),
+                         issued_by='Отделом УФМС')
+                for _ in range(size)
+            )
+            guests += User.objects.bulk_create(
+                User(email=f'guest{offset + i}.{self.email_suffix}', password='!', role=UserRole.CLIENT,
+                     first_name=f'{rnd.choice(LAST_NAMES)} {rnd.choice(FIRST_NAMES)}',
+                     phone_number=f'+79{rnd.randint(100000000, 999999999)}', document=document,
+                     discount=Decimal(rnd.choice([0, 0, 0, 5, 10, 15])))
+                for i, document in enumerate(documents)
+            )
+        return guests
+
+    def create_bookings(self, rnd, rooms, guests, services, start, until, provisions_per_booking):
+        booking_total = 0
+        provision_total = 0
+        pending = []
+
+        def flush():
+            nonlocal booking_total, provision_total
+            created = Booking.objects.bulk_create(pending, batch_size=self.batch_size)
+            provisions = []
+            for booking in created:
+                nights = (booking.check_out_date - booking.check_in_date).days
+                count = min(rnd.randint(0, round(provisions_per_booking * 2)), len(services) * nights)
+                keys = set()
+                while len(keys) < count:
+                    keys.add((rnd.choice(services), booking.check_in_date + timedelta(days=rnd.randrange(nights))))
+                provisions += [
+                    ServiceProvision(booking=booking, service=service, service_date=date, quantity=rnd.randint(1, 3))
+                    for service, date in keys
+                ]
+            ServiceProvision.objects.bulk_create(provisions, batch_size=self.batch_size)
+            booking_total += len(created)
+            provision_total += len(provisions)
+            pending.clear()
+
+        for room in rooms:
+            price = room.category.price
+            day = start + timedelta(days=rnd.randint(0, 5))
+            while day < until:
+                nights = rnd.randint(1, 10)
+                check_out = day + timedelta(days=nights)
+                pending.append(Booking(
+                    guest=rnd.choice(guests), room=room, check_in_date=day, check_out_date=check_out,
+                    total_cost=price * nights, paid_amount=price * rnd.randint(0, nights),
+                ))
+                day = check_out + timedelta(days=rnd.choice([0, 0, 1, 2, 3, 7]))
+            if len(pending) >= self.batch_size:
+                flush()
+        if pending:
+            flush()
+        return booking_total, provision_total
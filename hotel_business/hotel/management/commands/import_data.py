@@ -0,0 +1,55 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hotel.imports import BOOKING_COLUMNS, CHUNK_SIZE, GUEST_COLUMNS, import_csv
+
+
+class Command(BaseCommand):
+    help = ('Импортирует гостей с документами и бронирования из CSV пачками. '
+            'Ошибочные строки пропускаются и перечисляются в отчёте. '
+            'Пароли из столбца password хешируются (медленно), без него ставится непригодный пароль.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guests', help='CSV со столбцами: ' + ', '.join(GUEST_COLUMNS))
+        parser.add_argument('--bookings', help='CSV со столбцами: ' + ', '.join(BOOKING_COLUMNS))
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--errors', help='Куда записать ошибки (CSV), по умолчанию stderr')
+        parser.add_argument('--delimiter', default=',')
+
+    def handle(self, *args, **options):
+        if not options['guests'] and not options['bookings']:
+            raise CommandError('Укажите --guests и/или --bookings')
+
+        sources = {}
+        try:
+            for name in ('guests', 'bookings'):
+                if options[name]:
+                    sources[name] = (options[name], open(options[name], encoding='utf-8-sig', newline=''))
+            reports = import_csv(sources, options['delimiter'], options['chunk_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            for _, source in sources.values():
+                source.close()
+
+        errors = []
+        for path, result, elapsed in reports:
+            errors += [(path, number, message) for number, message in result.errors]
+            rate = (result.created + len(result.errors)) / elapsed * 60 if elapsed else 0
+            self.stdout.write(f'{path}: создано {result.created}, ошибок {len(result.errors)}, '
+                              f'{elapsed:.1f} с ({rate:.0f} строк/мин)')
+        self.write_errors(errors, options['errors'])
+
+    def write_errors(self, errors, path):
+        if not errors:
+            return
+        if path:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['file', 'line', 'error'])
+                writer.writerows(errors)
+            self.stderr.write(f'Ошибок: {len(errors)}, подробности в {path}')
+        else:
+            for source, number, message in errors:
+                self.stderr.write(f'{source}:{number}: {message}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from hotel import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики панели менеджера по данным в базе'
+
+    def handle(self, *args, **options):
+        counts = stats.rebuild()
+        for name, value in counts.items():
+            self.stdout.write(f'{name}: {value}')
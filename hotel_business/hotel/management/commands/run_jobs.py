@@ -0,0 +1,65 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from hotel import jobs
+
+
+def serve(threads, kinds, poll, once):
+    worker = jobs.Worker(threads=threads, kinds=kinds, poll=poll, once=once)
+    # SIGTERM и Ctrl+C: доделать текущие задачи и выйти
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop.set())
+    signal.signal(signal.SIGINT, lambda *args: worker.stop.set())
+    return worker.run()
+
+
+def child(kinds, poll, once, processed):
+    count = serve(1, kinds, poll, once)
+    with processed.get_lock():
+        processed.value += count
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из hotel.Job (выгрузки, импорт, отчёты, пересчёт роллапов) '
+            'пулом потоков или процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--processes', action='store_true',
+                            help='Каждый воркер в своём процессе (задачи, нагружающие CPU); по умолчанию потоки')
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(jobs.HANDLERS),
+                            help='Брать только задачи этого вида (можно несколько раз)')
+        parser.add_argument('--poll', type=float, default=jobs.POLL_INTERVAL, help='Пауза, когда очередь пуста, с')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        workers, kinds, poll, once = options['workers'], options['kinds'], options['poll'], options['once']
+        started = time.perf_counter()
+        if options['processes']:
+            processed = self.fork(workers, kinds, poll, once)
+        else:
+            processed = serve(workers, kinds, poll, once)
+        self.stderr.write(f'Выполнено задач: {processed} за {time.perf_counter() - started:.1f} с')
+
+    def fork(self, workers, kinds, poll, once):
+        # соединения не должны достаться дочерним процессам
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processed = context.Value('i', 0)
+        children = [context.Process(target=child, args=(kinds, poll, once, processed)) for _ in range(workers)]
+        for process in children:
+            process.start()
+
+        def forward(*args):
+            for process in children:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for process in children:
+            process.join()
+        return processed.value
@@ -0,0 +1,96 @@
+import json
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.utils import timezone
+
+from hotel.benchmarks import summarize
+from hotel.models import Category, Room, User, UserRole
+from hotel.reservations import BookingConflict, ReservationRequest, overbooked, reserve
+
+CATEGORY_NAME = 'Нагрузочный тест броней'
+
+
+def writer(index, room_ids, guest_id, start, days, seconds):
+    """Процесс-писатель: бронирует случайные номера и даты до истечения времени."""
+    rnd = random.Random(index)
+    created = conflicts = errors = 0
+    samples = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        check_in = start + timedelta(days=rnd.randrange(days))
+        reservation = ReservationRequest(guest_id, rnd.choice(room_ids), check_in,
+                                         check_in + timedelta(days=rnd.randint(1, 5)))
+        started = time.perf_counter()
+        try:
+            reserve(reservation)
+            created += 1
+        except BookingConflict:
+            conflicts += 1
+        except OperationalError:
+            # SQLite: блокировка записи не дождалась своей очереди
+            errors += 1
+        samples.append((time.perf_counter() - started) * 1000)
+    connections.close_all()
+    return created, conflicts, errors, samples
+
+
+class Command(BaseCommand):
+    help = ('Создаёт брони из N параллельных процессов на небольшое число номеров, '
+            'проверяет отсутствие пересечений и выводит пропускную способность')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=50)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--rooms', type=int, default=20)
+        parser.add_argument('--days', type=int, default=60, help='Окно дат заезда')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовые номера и брони')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name=CATEGORY_NAME, price=4000)
+        rooms = Room.objects.bulk_create(
+            Room(category=category, floor=1, room_count=1, bed_count=2) for _ in range(options['rooms'])
+        )
+        room_ids = [room.id for room in rooms]
+        guest, _ = User.objects.get_or_create(email='soak-guest@example.com',
+                                              defaults={'role': UserRole.CLIENT, 'password': '!'})
+        start = timezone.now().date()
+
+        # соединения не должны достаться дочерним процессам
+        connections.close_all()
+        jobs = [(index, room_ids, guest.id, start, options['days'], options['seconds'])
+                for index in range(options['writers'])]
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(options['writers']) as pool:
+            results = pool.starmap(writer, jobs)
+        elapsed = time.perf_counter() - started
+
+        created = sum(result[0] for result in results)
+        conflicts = sum(result[1] for result in results)
+        errors = sum(result[2] for result in results)
+        samples = [sample for result in results for sample in result[3]]
+        overlaps = overbooked().filter(room_id__in=room_ids).count()
+        report = {
+            'database': connections['default'].vendor,
+            'writers': options['writers'],
+            'rooms': len(room_ids),
+            'seconds': round(elapsed, 2),
+            'attempts': len(samples),
+            'created': created,
+            'conflicts': conflicts,
+            'errors': errors,
+            'attempts_per_s': round(len(samples) / elapsed, 1),
+            'created_per_s': round(created / elapsed, 1),
+            'latency': summarize(samples),
+            'overbooked': overlaps,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if not options['keep']:
+            category.delete()
+        if overlaps:
+            raise CommandError(f'Пересекающихся броней: {overlaps}')
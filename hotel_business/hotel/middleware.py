@@ -0,0 +1,257 @@
+import json
+import logging
+import mimetypes
+import os
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.template.backends.django import Template as DjangoTemplate
+
+from .benchmarks import summarize
+
+logger = logging.getLogger('hotel.performance')
+
+_current_timings = ContextVar('hotel_request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'db_ms', 'template_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+
+
+class UrlHistograms:
+    def __init__(self, window):
+        self.window = window
+        self.lock = Lock()
+        self.samples = {}
+
+    def record(self, url_name, total_ms, db_ms, queries):
+        with self.lock:
+            samples = self.samples.get(url_name)
+            if samples is None:
+                samples = self.samples[url_name] = deque(maxlen=self.window)
+            samples.append((total_ms, db_ms, queries))
+
+    def snapshot(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        report = {}
+        for name, values in sorted(samples.items()):
+            stats = summarize([total for total, _, _ in values])
+            stats['db_mean_ms'] = round(sum(db for _, db, _ in values) / len(values), 3)
+            stats['queries_mean'] = round(sum(queries for _, _, queries in values) / len(values), 2)
+            report[name] = stats
+        return report
+
+
+histograms = UrlHistograms(getattr(settings, 'HOTEL_PERFORMANCE_WINDOW', 1000))
+
+
+def _count_query(execute, sql, params, many, context):
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_ms += (time.perf_counter() - started) * 1000
+
+
+def install_query_counter(connection, **kwargs):
+    # Обёртка ставится на соединение один раз и работает только внутри
+    # запроса, когда _current_timings установлен
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+_template_render = DjangoTemplate.render
+
+
+def _timed_render(self, context=None, request=None):
+    timings = _current_timings.get()
+    if timings is None:
+        return _template_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        timings.template_ms += (time.perf_counter() - started) * 1000
+
+
+def _install_template_timer(enabled):
+    # подмена Template.render живёт, только пока middleware включён
+    DjangoTemplate.render = _timed_render if enabled else _template_render
+
+
+class PerformanceMiddleware:
+    """Замеряет SQL, шаблоны и общее время запроса.
+
+    Результат уходит в заголовок Server-Timing, в лог hotel.performance
+    и в скользящие гистограммы по имени URL (см. view performance_metrics).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        enabled = getattr(settings, 'HOTEL_PERFORMANCE_ENABLED', True)
+        _install_template_timer(enabled)
+        if not enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        # Запросы async ORM выполняются в потоке sync_to_async со своими
+        # соединениями; ContextVar копируется туда вместе с контекстом
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def finish(self, request, response, timings, started):
+        total_ms = (time.perf_counter() - started) * 1000
+
+        app_ms = max(0.0, total_ms - timings.db_ms - timings.template_ms)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings.db_ms:.2f};desc="{timings.queries} queries"',
+            f'tpl;dur={timings.template_ms:.2f}',
+            f'app;dur={app_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match and match.url_name else 'unresolved'
+        histograms.record(url_name, total_ms, timings.db_ms, timings.queries)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'url_name': url_name,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(timings.db_ms, 2),
+                'queries': timings.queries,
+                'template_ms': round(timings.template_ms, 2),
+            }))
+        return response
+
+
+# имя, которое ManifestStaticFilesStorage дал по содержимому: styles.3f2a9c1b7e4d.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+# предпочтительное сжатие первым
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            weight = float(params[2:]) if params.startswith('q=') else 1
+        except ValueError:
+            weight = 1
+        if weight > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAssetsMiddleware:
+    """Отдаёт собранную collectstatic статику из STATIC_ROOT.
+
+    Стоит первым, поэтому не трогает сессию, пользователя и базу. Файлы с
+    хешем в имени кешируются браузером на год без перепроверки (повторный
+    заход на страницу не делает ни одного запроса за статикой), остальные
+    перепроверяются по Last-Modified. Готовые .br/.gz выбираются по
+    Accept-Encoding. Файлы, которых нет в STATIC_ROOT, идут дальше по цепочке
+    (runserver отдаёт их сам).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT or not getattr(settings, 'HOTEL_SERVE_STATIC', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.strip('/') + '/'
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        name = request.path_info[len(self.prefix):]
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        content_type, _ = mimetypes.guess_type(name)
+        response = get_conditional_response(request, last_modified=int(stat.st_mtime))
+        if response is None:
+            encoding = None
+            accepted = _accepted_encodings(request)
+            for coding, suffix in ENCODINGS:
+                if coding in accepted and os.path.isfile(path + suffix):
+                    encoding, path = coding, path + suffix
+                    break
+            with open(path, 'rb') as asset:
+                response = HttpResponse(asset.read(), content_type=content_type or 'application/octet-stream')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.headers['Content-Length'] = str(len(response.content))
+            response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        response.headers['Cache-Control'] = IMMUTABLE if HASHED_NAME.search(name) else REVALIDATE
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
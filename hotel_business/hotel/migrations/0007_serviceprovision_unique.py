@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 17:41
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_provisions(apps, schema_editor):
+    ServiceProvision = apps.get_model('hotel', 'ServiceProvision')
+    duplicates = (
+        ServiceProvision.objects.values('booking_id', 'service_id', 'service_date')
+        .annotate(rows=Count('id'), keep_id=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        ServiceProvision.objects.filter(pk=group['keep_id']).update(quantity=group['total'])
+        ServiceProvision.objects.filter(
+            booking_id=group['booking_id'],
+            service_id=group['service_id'],
+            service_date=group['service_date'],
+        ).exclude(pk=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0006_booking_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_provisions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='serviceprovision',
+            constraint=models.UniqueConstraint(fields=('booking', 'service', 'service_date'), name='unique_service_provision'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('hotel', '0008_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'first_name', 'id'], name='user_role_name_idx'),
+        ),
+    ]
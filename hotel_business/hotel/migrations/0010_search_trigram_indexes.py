@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 18:45
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ('service_name_trgm_idx', 'hotel_service', 'name'),
+    ('service_description_trgm_idx', 'hotel_service', 'description'),
+    ('user_first_name_trgm_idx', 'hotel_user', 'first_name'),
+    ('user_email_trgm_idx', 'hotel_user', 'email'),
+    ('user_phone_trgm_idx', 'hotel_user', 'phone_number'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Только PostgreSQL: на SQLite поиск работает через обычный LIKE
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0009_user_role_name_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 19:05
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_equipment_summary(apps, schema_editor):
+    Category = apps.get_model('hotel', 'Category')
+    Equipment = apps.get_model('hotel', 'Equipment')
+    names = defaultdict(list)
+    for category_id, name in Equipment.objects.order_by('category_id', 'id').values_list('category_id', 'item__name'):
+        names[category_id].append(name)
+    categories = list(Category.objects.only('id'))
+    for category in categories:
+        category.equipment_summary = names[category.id]
+    Category.objects.bulk_update(categories, ['equipment_summary'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0011_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='equipment_summary',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['item', 'category'], name='equipment_item_category_idx'),
+        ),
+        migrations.RunPython(fill_equipment_summary, migrations.RunPython.noop),
+    ]
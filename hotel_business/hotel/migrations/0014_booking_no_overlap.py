@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 20:25
+
+from django.db import migrations, models
+from django.db.models import Exists, F, OuterRef
+
+SHOWN_IDS = 50
+
+
+def _ids(queryset):
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    shown = ', '.join(map(str, ids[:SHOWN_IDS]))
+    return shown + (f' и ещё {len(ids) - SHOWN_IDS}' if len(ids) > SHOWN_IDS else '')
+
+
+def check_existing_bookings(apps, schema_editor):
+    # иначе ограничения ниже падают голым IntegrityError без указания броней
+    Booking = apps.get_model('hotel', 'Booking')
+    problems = []
+    reversed_dates = Booking.objects.filter(check_out_date__lte=F('check_in_date'))
+    if reversed_dates.exists():
+        problems.append('выезд не позже заезда — ' + _ids(reversed_dates))
+    if schema_editor.connection.vendor == 'postgresql':
+        other = Booking.objects.filter(
+            room_id=OuterRef('room_id'),
+            check_in_date__lt=OuterRef('check_out_date'),
+            check_out_date__gt=OuterRef('check_in_date'),
+        ).exclude(pk=OuterRef('pk'))
+        overlapping = Booking.objects.filter(Exists(other))
+        if overlapping.exists():
+            problems.append('пересечение с другой бронью того же номера — ' + _ids(overlapping))
+    if problems:
+        raise RuntimeError(
+            'Миграция hotel.0014 не применена, исправьте или удалите брони и повторите migrate. '
+            'Брони (id): ' + '; '.join(problems)
+        )
+
+
+def create_overlap_constraint(apps, schema_editor):
+    # Только PostgreSQL: на SQLite пересечения исключает блокировка в hotel.reservations
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE hotel_booking ADD CONSTRAINT booking_no_overlap '
+        "EXCLUDE USING gist (room_id WITH =, daterange(check_in_date, check_out_date, '[)') WITH &&)"
+    )
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE hotel_booking DROP CONSTRAINT IF EXISTS booking_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0013_rate_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.CheckConstraint(condition=models.Q(check_out_date__gt=models.F('check_in_date')),
+                                              name='booking_dates_order'),
+        ),
+        migrations.RunPython(create_overlap_constraint, drop_overlap_constraint),
+    ]
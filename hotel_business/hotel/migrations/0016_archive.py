@@ -0,0 +1,99 @@
+# Generated by Django 6.0 on 2026-10-18 21:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# PostgreSQL: архивные таблицы пересоздаются секционированными по месяцам.
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+# поэтому он (id, дата); секции на конкретные месяцы создаёт hotel.archive.
+PARTITIONED_TABLES = [
+    """
+    CREATE TABLE hotel_archivedbooking (
+        id bigint NOT NULL,
+        check_in_date date NOT NULL,
+        check_out_date date NOT NULL,
+        total_cost numeric(10, 2) NOT NULL,
+        paid_amount numeric(10, 2) NOT NULL,
+        archived_at timestamp with time zone NOT NULL,
+        guest_id bigint NOT NULL REFERENCES hotel_user (id) DEFERRABLE INITIALLY DEFERRED,
+        room_id bigint NOT NULL REFERENCES hotel_room (id) DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (id, check_in_date)
+    ) PARTITION BY RANGE (check_in_date)
+    """,
+    'CREATE INDEX archived_booking_check_in_idx ON hotel_archivedbooking (check_in_date, id)',
+    'CREATE INDEX archived_booking_guest_idx ON hotel_archivedbooking (guest_id, check_in_date)',
+    'CREATE INDEX hotel_archivedbooking_room_id_idx ON hotel_archivedbooking (room_id)',
+    """
+    CREATE TABLE hotel_archivedserviceprovision (
+        id bigint NOT NULL,
+        quantity integer NOT NULL,
+        service_date date NOT NULL,
+        booking_id bigint NOT NULL,
+        service_id bigint NOT NULL REFERENCES hotel_service (id) DEFERRABLE INITIALLY DEFERRED,
+        PRIMARY KEY (id, service_date)
+    ) PARTITION BY RANGE (service_date)
+    """,
+    'CREATE INDEX archived_provision_date_idx ON hotel_archivedserviceprovision (service_date)',
+    'CREATE INDEX hotel_archivedserviceprovision_booking_id_idx ON hotel_archivedserviceprovision (booking_id)',
+    'CREATE INDEX hotel_archivedserviceprovision_service_id_idx ON hotel_archivedserviceprovision (service_id)',
+]
+
+
+def partition_archive(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TABLE hotel_archivedserviceprovision, hotel_archivedbooking')
+    for statement in PARTITIONED_TABLES:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel', '0015_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('check_in_date', models.DateField()),
+                ('check_out_date', models.DateField()),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('guest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='hotel.room')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedServiceProvision',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField(default=1)),
+                ('service_date', models.DateField()),
+                ('booking', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='service_provisions', to='hotel.archivedbooking')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_provisions', to='hotel.service')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['check_in_date', 'id'], name='archived_booking_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['guest', 'check_in_date'], name='archived_booking_guest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceprovision',
+            index=models.Index(fields=['service_date'], name='provision_service_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedserviceprovision',
+            index=models.Index(fields=['service_date'], name='archived_provision_date_idx'),
+        ),
+        # обратно ничего делать не нужно: откат CreateModel удалит таблицы
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
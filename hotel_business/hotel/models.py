@@ -1,5 +1,6 @@
 from django.contrib.auth.decorators import login_required
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser, User
 from .managers import CustomUserManager
 from django.utils.translation import gettext_lazy as _
@@ -14,6 +15,26 @@ class Category(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True)
+    # названия предметов оборудования по порядку; пересчитывает hotel.equipment
+    equipment_summary = models.JSONField(default=list, blank=True)
+
+class RateRule(models.Model):
+    """Наценка или скидка к цене категории за ночь (календарь тарифов).
+
+    Правило действует на ночи с start_date по end_date включительно (пусто —
+    без ограничения) и на дни недели из weekdays ('56' — суббота и
+    воскресенье, пусто — все дни). percent — множитель в процентах: 120.00 —
+    +20%, 90.00 — −10%. Подходящие правила применяются по очереди (priority,
+    id), цена каждый раз округляется до копеек.
+    """
+    name = models.CharField(max_length=255)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name="rate_rules")
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    weekdays = models.CharField(max_length=7, blank=True)
+    percent = models.DecimalField(max_digits=6, decimal_places=2)
+    priority = models.IntegerField(default=0)
 
 class Room(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="rooms")
@@ -41,6 +62,13 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['role', 'first_name', 'id'], name='user_role_name_idx'),
+            models.Index(Lower('first_name'), name='user_first_name_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
     def calculate_price_with_discount(self, price):
         if self.discount <= 0:
             return price
@@ -55,6 +83,17 @@ class Booking(models.Model):
     total_cost = models.DecimalField(max_digits=10, decimal_places=2)
     paid_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'check_out_date', 'check_in_date'], name='booking_room_dates_idx'),
+            models.Index(fields=['check_out_date', 'check_in_date'], name='booking_dates_idx'),
+        ]
+        # пересечение броней одного номера на PostgreSQL запрещает EXCLUDE из миграции 0014
+        constraints = [
+            models.CheckConstraint(condition=models.Q(check_out_date__gt=models.F('check_in_date')),
+                                   name='booking_dates_order'),
+        ]
+
 class Service(models.Model):
     name = models.CharField(max_length=255)
     cost = models.DecimalField(max_digits=10, decimal_places=2)
@@ -67,9 +106,128 @@ class ServiceProvision(models.Model):
     quantity = models.IntegerField(default=1)
     service_date = models.DateField()
 
+    class Meta:
+        indexes = [
+            # роллапы и выгрузки выбирают услуги по диапазону дат
+            models.Index(fields=['service_date'], name='provision_service_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'service', 'service_date'], name='unique_service_provision'),
+        ]
+
+class ArchivedBooking(models.Model):
+    """Прошедшее проживание, перенесённое из Booking командой archive_stays.
+
+    id тот же, что был у брони. Поля и связи называются так же, как
+    у Booking, поэтому hotel.folio и выгрузки работают с обеими моделями.
+    На PostgreSQL таблица секционирована по месяцам check_in_date
+    (миграция 0016).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_bookings")
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="archived_bookings")
+    check_in_date = models.DateField()
+    check_out_date = models.DateField()
+    total_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    paid_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['check_in_date', 'id'], name='archived_booking_check_in_idx'),
+            models.Index(fields=['guest', 'check_in_date'], name='archived_booking_guest_idx'),
+        ]
+
+class ArchivedServiceProvision(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    # без ограничения в базе: на PostgreSQL у секционированной таблицы броней
+    # ключ (id, check_in_date), и внешний ключ только на id невозможен
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, db_constraint=False,
+                                related_name="service_provisions")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="archived_provisions")
+    quantity = models.IntegerField(default=1)
+    service_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service_date'], name='archived_provision_date_idx'),
+        ]
+
 class Item(models.Model):
     name = models.CharField(max_length=255)
 
 class Equipment(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="equipment")
-    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="equipment")
\ No newline at end of file
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="equipment")
+
+    class Meta:
+        indexes = [
+            # фильтр номеров по оборудованию: item_id IN (...) -> category_id без чтения таблицы
+            models.Index(fields=['item', 'category'], name='equipment_item_category_idx'),
+        ]
+
+class DashboardCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+    as_of = models.DateField(null=True, blank=True)
+
+
+class DailyOccupancy(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="daily_occupancy")
+    rooms_occupied = models.IntegerField(default=0)
+    room_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    service_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_occupancy'),
+        ]
+
+
+class DailyServiceRevenue(models.Model):
+    date = models.DateField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="daily_revenue")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'service'], name='unique_daily_service_revenue'),
+        ]
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class Job(models.Model):
+    """Фоновая задача для manage.py run_jobs (см. hotel.jobs).
+
+    Взятая задача видна другим воркерам снова, когда истекает locked_until
+    (воркер упал или завис); каждая попытка увеличивает attempts.
+    """
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField()
+    locked_until = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # выбор следующей задачи: queued по run_after, running по locked_until
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_status_locked_idx'),
+        ]
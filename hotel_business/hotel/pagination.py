@@ -0,0 +1,110 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 30
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, fields):
+    """Значения курсора, приведённые к типам полей fields, или None для чужого курсора."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields) or None in values:
+        return None
+    try:
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+        # диапазон id и т.п.: иначе OverflowError в базе
+        for field, value in zip(fields, values):
+            field.run_validators(value)
+    except (ValueError, TypeError, ValidationError):
+        return None
+    return values
+
+
+def _model_field(model, path):
+    for name in path.split('__')[:-1]:
+        model = model._meta.get_field(name).related_model
+    return model._meta.get_field(path.split('__')[-1])
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _seek(fields, values, lookup):
+    # (a, b) > (x, y)  =>  a > x OR (a = x AND b > y)
+    conditions = []
+    for index, field in enumerate(fields):
+        equal = {name: value for name, value in zip(fields[:index], values[:index])}
+        conditions.append(Q(**equal, **{f'{field}__{lookup}': values[index]}))
+    return reduce(or_, conditions)
+
+
+def keyset_paginate(queryset, fields, after=None, before=None, descending=False, size=PAGE_SIZE):
+    """Постраничная выборка по ключу (fields), без OFFSET.
+
+    Последнее поле в fields должно быть уникальным (обычно id), а для
+    fields нужен индекс в том же порядке — тогда любая страница стоит
+    столько же, сколько первая.
+    """
+    fields = list(fields)
+    model_fields = [_model_field(queryset.model, field) for field in fields]
+    after = decode_cursor(after, model_fields) if after else None
+    before = decode_cursor(before, model_fields) if before else None
+
+    forward = before is None
+    ascending = forward != descending
+    ordering = [field if ascending else f'-{field}' for field in fields]
+    queryset = queryset.order_by(*ordering)
+
+    cursor = after if forward else before
+    if cursor is not None:
+        queryset = queryset.filter(_seek(fields, cursor, 'gt' if ascending else 'lt'))
+
+    items = list(queryset[:size + 1])
+    has_more = len(items) > size
+    items = items[:size]
+    if not forward:
+        items.reverse()
+
+    def key(item):
+        return encode_cursor([_json_value(getattr(item, field)) for field in fields])
+
+    if not items:
+        return KeysetPage(items)
+    if forward:
+        return KeysetPage(
+            items,
+            next_cursor=key(items[-1]) if has_more else None,
+            previous_cursor=key(items[0]) if after is not None else None,
+        )
+    return KeysetPage(
+        items,
+        next_cursor=key(items[-1]),
+        previous_cursor=key(items[0]) if has_more else None,
+    )
+
+
+def _json_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
@@ -0,0 +1,140 @@
+"""Личный кабинет клиента: его проживания с номером, категорией и услугами.
+
+Страница проживаний строится двумя запросами при любом их числе: брони
+с номером и категорией (select_related, only) и услуги всех броней
+страницы (Prefetch). Готовая страница кешируется для пользователя под его
+версией. Версия меняется при сохранении и удалении его броней и услуг
+(сигналы), при пакетной записи услуг, импорте броней и переносе в архив.
+Смена цены услуги, номера или категории меняет отметку watermarks и тоже
+даёт новый ключ.
+"""
+import hashlib
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import watermarks
+from .folio import discounted
+from .models import ArchivedBooking, ArchivedServiceProvision, Booking, Category, Room, Service, ServiceProvision
+from .pagination import keyset_paginate
+
+PAGE_SIZE = 10
+PORTAL_TIMEOUT = getattr(settings, 'HOTEL_PORTAL_TIMEOUT', 60 * 10)
+MODELS = (Room, Category, Service)
+
+BOOKING_FIELDS = ('id', 'room', 'check_in_date', 'check_out_date', 'total_cost', 'paid_amount',
+                  'room__floor', 'room__room_count', 'room__bed_count', 'room__category__name')
+PROVISION_FIELDS = ('id', 'booking', 'service', 'quantity', 'service_date', 'service__name', 'service__cost')
+
+
+def _version_key(user_id):
+    return f'portal:user:{user_id}:version'
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def invalidate(user_ids):
+    """Сбросить страницы проживаний гостей; повторяется после коммита, как watermarks.touch."""
+    for user_id in set(user_ids) - {None}:
+        _bump(user_id)
+        transaction.on_commit(lambda user_id=user_id: _bump(user_id))
+
+
+def version(user):
+    """Версия данных кабинета: меняется вместе с бронями и услугами гостя,
+    ценами услуг, номерами и категориями, а также скидкой гостя."""
+    key = _version_key(user.pk)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key, time.time_ns())
+    return f'{value}-{watermarks.watermark(*MODELS)}-{user.discount}'
+
+
+def stays_queryset(user, archived=False):
+    booking_model, provision_model = (
+        (ArchivedBooking, ArchivedServiceProvision) if archived else (Booking, ServiceProvision)
+    )
+    provisions = (
+        provision_model.objects.select_related('service').only(*PROVISION_FIELDS).order_by('service_date', 'id')
+    )
+    return (
+        booking_model.objects.filter(guest_id=user.pk)
+        .select_related('room__category')
+        .only(*BOOKING_FIELDS)
+        .prefetch_related(Prefetch('service_provisions', queryset=provisions))
+    )
+
+
+def _stay(booking, discount, today):
+    services = [
+        {
+            'service': provision.service.name,
+            'service_date': provision.service_date,
+            'quantity': provision.quantity,
+            'price': provision.service.cost,
+            'amount': provision.quantity * provision.service.cost,
+        }
+        for provision in booking.service_provisions.all()
+    ]
+    services_total = sum((service['amount'] for service in services), Decimal(0))
+    services_due = discounted(services_total, discount)
+    if booking.check_out_date < today:
+        status = 'past'
+    elif booking.check_in_date > today:
+        status = 'upcoming'
+    else:
+        status = 'in_house'
+    return {
+        'booking_id': booking.id,
+        'status': status,
+        'check_in_date': booking.check_in_date,
+        'check_out_date': booking.check_out_date,
+        'nights': (booking.check_out_date - booking.check_in_date).days,
+        'room': {
+            'id': booking.room_id,
+            'floor': booking.room.floor,
+            'room_count': booking.room.room_count,
+            'bed_count': booking.room.bed_count,
+            'category': booking.room.category.name,
+        },
+        'services': services,
+        'total_cost': booking.total_cost,
+        'services_total': services_total,
+        'services_due': services_due,
+        'amount_due': booking.total_cost + services_due,
+        'paid_amount': booking.paid_amount,
+        'balance': booking.total_cost + services_due - booking.paid_amount,
+    }
+
+
+def stays(user, after=None, before=None, archived=False, today=None):
+    """Страница проживаний гостя, новые сначала: {'results', 'next', 'previous'}.
+
+    Из кеша — без запросов к базе, иначе ровно два запроса.
+    """
+    today = today or timezone.now().date()
+    # курсор приходит из запроса: в ключ идёт его хеш
+    cursor = hashlib.md5(f'{after or ""}:{before or ""}'.encode()).hexdigest()
+    key = f'portal:stays:{user.pk}:{version(user)}:{today}:{int(archived)}:{cursor}'
+    page = cache.get(key)
+    if page is None:
+        bookings = keyset_paginate(stays_queryset(user, archived), ['check_in_date', 'id'],
+                                   after=after, before=before, descending=True, size=PAGE_SIZE)
+        page = {
+            'results': [_stay(booking, user.discount, today) for booking in bookings],
+            'next': bookings.next_cursor,
+            'previous': bookings.previous_cursor,
+        }
+        cache.set(key, page, PORTAL_TIMEOUT)
+    return page
@@ -0,0 +1,133 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import portal, rollups
+from .models import Booking, Service, ServiceProvision, UserRole
+
+UPDATE_CHUNK_SIZE = 500
+
+
+class ProvisionLine:
+    def __init__(self, client_id, service_id, service_date, quantity=1, number=None):
+        self.client_id = client_id
+        self.service_id = service_id
+        self.service_date = service_date
+        self.quantity = quantity
+        # номер строки во вводе; по нему provide_services сообщает об ошибках
+        self.number = number
+
+
+def parse_line(data, number=None):
+    client_id = str(data.get('client_id') or '').strip()
+    service_id = str(data.get('service_id') or '').strip()
+    service_date = str(data.get('service_date') or '').strip()
+    quantity = data.get('quantity') or 1
+
+    if not client_id or not service_id or not service_date:
+        raise ValueError('Все поля обязательны для заполнения')
+    if not client_id.isdigit() or not service_id.isdigit():
+        raise ValueError('Некорректный идентификатор клиента или услуги')
+    try:
+        date = parse_date(service_date)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError(f'Некорректная дата: {service_date}')
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f'Некорректное количество: {quantity}')
+    if quantity < 1:
+        raise ValueError('Количество должно быть больше нуля')
+
+    return ProvisionLine(int(client_id), int(service_id), date, quantity, number)
+
+
+def active_bookings_for(client_ids, today=None):
+    today = today or timezone.now().date()
+    bookings = {}
+    queryset = Booking.objects.filter(
+        guest_id__in=client_ids,
+        guest__role=UserRole.CLIENT,
+        check_in_date__lte=today,
+        check_out_date__gte=today,
+    ).select_related('guest', 'room').order_by('id')
+    for booking in queryset:
+        bookings.setdefault(booking.guest_id, booking)
+    return bookings
+
+
+def provide_services(lines, today=None):
+    """Записывает пачку услуг на активные бронирования клиентов.
+
+    Возвращает (saved, errors): список сохранённых строк в виде
+    (line, booking, service) и список (номер строки, текст ошибки). Номер
+    строки — line.number, а если он не задан — позиция в lines с единицы.
+    Количество по одинаковым (booking, service, service_date) суммируется.
+    """
+    bookings = active_bookings_for({line.client_id for line in lines}, today)
+    services = Service.objects.in_bulk({line.service_id for line in lines})
+
+    saved = []
+    errors = []
+    quantities = {}
+    for index, line in enumerate(lines, start=1):
+        number = index if line.number is None else line.number
+        booking = bookings.get(line.client_id)
+        service = services.get(line.service_id)
+        if service is None:
+            errors.append((number, f'Услуга {line.service_id} не найдена'))
+            continue
+        if booking is None:
+            errors.append((number, 'У клиента нет активного бронирования на текущую дату'))
+            continue
+        key = (booking.id, service.id, line.service_date)
+        quantities[key] = quantities.get(key, 0) + line.quantity
+        saved.append((line, booking, service))
+
+    if quantities:
+        with transaction.atomic():
+            _upsert_quantities(quantities)
+            # bulk_create и update() не вызывают сигналы, поэтому роллапы
+            # обновляются здесь явно
+            rollups.record_provisions(
+                (line.service_date, booking.room.category_id, service.id, line.quantity, service.cost)
+                for line, booking, service in saved
+            )
+            portal.invalidate(booking.guest_id for _, booking, _ in saved)
+
+    return saved, errors
+
+
+def _upsert_quantities(quantities):
+    # Строки с нулевым количеством создаются без конфликтов, а затем одним
+    # UPDATE quantity = quantity + N увеличиваются атомарно в базе данных,
+    # поэтому параллельные записи не теряют друг друга.
+    ServiceProvision.objects.bulk_create(
+        [
+            ServiceProvision(booking_id=booking_id, service_id=service_id, service_date=date, quantity=0)
+            for booking_id, service_id, date in quantities
+        ],
+        ignore_conflicts=True,
+        batch_size=UPDATE_CHUNK_SIZE,
+    )
+
+    items = list(quantities.items())
+    for start in range(0, len(items), UPDATE_CHUNK_SIZE):
+        chunk = items[start:start + UPDATE_CHUNK_SIZE]
+        conditions = [
+            (Q(booking_id=booking_id, service_id=service_id, service_date=date), quantity)
+            for (booking_id, service_id, date), quantity in chunk
+        ]
+        ServiceProvision.objects.filter(reduce(or_, (condition for condition, _ in conditions))).update(
+            quantity=F('quantity') + Case(
+                *(When(condition, then=Value(quantity)) for condition, quantity in conditions),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
@@ -0,0 +1,177 @@
+"""Расчёт стоимости проживания сразу для многих номеров и ночей.
+
+Все суммы — целые копейки, множители тарифов и скидка — целые сотые доли
+процента (120.00% = 12000), округление половины вверх после каждого шага.
+Так расчёт совпадает копейка в копейку с Decimal-расчётом (quote_decimal),
+но выполняется одним проходом по массиву номера × ночи. С NumPy массивы
+считаются векторно, без него — тем же целочисленным способом на Python.
+"""
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from django.db.models import Q
+
+from .models import RateRule, Room, User
+
+CENT = Decimal('0.01')
+SCALE = 10000
+HALF = SCALE // 2
+MAX_NIGHTS = 366
+
+
+def to_scaled(value):
+    """Decimal с двумя знаками -> целое в сотых (копейки, сотые процента)."""
+    return int((Decimal(value) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def rule_applies(rule, night):
+    return ((rule.start_date is None or rule.start_date <= night)
+            and (rule.end_date is None or night <= rule.end_date)
+            and (not rule.weekdays or str(night.weekday()) in rule.weekdays))
+
+
+def ordered_rules(rules):
+    return sorted(rules, key=lambda rule: (rule.priority, rule.id or 0))
+
+
+class RateCalendar:
+    """Правила тарифов, разложенные по ночам [check_in, check_out)."""
+
+    def __init__(self, rules, check_in, check_out):
+        self.nights = [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+        # (категория или None для всех, маска ночей, множитель в сотых процента)
+        self.rules = []
+        for rule in ordered_rules(rules):
+            mask = [rule_applies(rule, night) for night in self.nights]
+            if any(mask):
+                self.rules.append((rule.category_id, mask, to_scaled(rule.percent)))
+
+    @classmethod
+    def load(cls, check_in, check_out, category_ids=None):
+        rules = RateRule.objects.filter(
+            Q(start_date__isnull=True) | Q(start_date__lt=check_out),
+            Q(end_date__isnull=True) | Q(end_date__gte=check_in),
+        )
+        if category_ids is not None:
+            rules = rules.filter(Q(category__isnull=True) | Q(category_id__in=category_ids))
+        return cls(rules, check_in, check_out)
+
+
+class Quote:
+    def __init__(self, room_ids, nights, nightly, totals, due):
+        self.room_ids = room_ids
+        self.nights = nights
+        # копейки: nightly[i][j] — номер i, ночь j (список списков или массив NumPy)
+        self.nightly = nightly
+        self.totals = totals
+        self.due = due
+
+    def rows(self):
+        for index, room_id in enumerate(self.room_ids):
+            yield {
+                'room_id': room_id,
+                'nightly': [from_cents(cents) for cents in self.nightly[index]],
+                'total': from_cents(self.totals[index]),
+                'due': from_cents(self.due[index]),
+            }
+
+
+def _nightly_numpy(categories, prices, calendar):
+    rates = np.repeat(np.asarray(prices, dtype=np.int64)[:, None], len(calendar.nights), axis=1)
+    categories = np.asarray(categories, dtype=np.int64)
+    for category_id, mask, factor in calendar.rules:
+        applies = np.asarray(mask)[None, :]
+        if category_id is not None:
+            applies = applies & (categories == category_id)[:, None]
+        rates = np.where(applies, (rates * factor + HALF) // SCALE, rates)
+    return rates
+
+
+def _quote_numpy(room_ids, categories, prices, calendar, discount):
+    # поиск одинаковых номеров (np.unique) дороже, чем сам расчёт по всем
+    nightly = _nightly_numpy(categories, prices, calendar)
+    totals = nightly.sum(axis=1)
+    due = (totals * (SCALE - discount) + HALF) // SCALE if discount else totals
+    return Quote(room_ids, calendar.nights, nightly, totals.tolist(), due.tolist())
+
+
+def _quote_python(room_ids, categories, prices, calendar, discount):
+    # у номеров одной категории ночи считаются один раз
+    by_category = {}
+    nightly, totals, due = [], [], []
+    for category_id, price in zip(categories, prices):
+        key = (category_id, price)
+        if key not in by_category:
+            row = [price] * len(calendar.nights)
+            for rule_category, mask, factor in calendar.rules:
+                if rule_category is None or rule_category == category_id:
+                    row = [(cents * factor + HALF) // SCALE if applies else cents for cents, applies in zip(row, mask)]
+            total = sum(row)
+            by_category[key] = (row, total, (total * (SCALE - discount) + HALF) // SCALE if discount else total)
+        row, total, room_due = by_category[key]
+        nightly.append(row)
+        totals.append(total)
+        due.append(room_due)
+    return Quote(room_ids, calendar.nights, nightly, totals, due)
+
+
+ENGINES = {'python': _quote_python}
+if np is not None:
+    ENGINES['numpy'] = _quote_numpy
+DEFAULT_ENGINE = 'numpy' if np is not None else 'python'
+
+
+def quote_rooms(rooms, calendar, discount=0, engine=DEFAULT_ENGINE):
+    """rooms — последовательность (id номера, id категории, цена категории).
+
+    discount — скидка гостя в процентах, как у User.calculate_price_with_discount:
+    применяется к сумме за всё проживание.
+    """
+    room_ids, categories, prices = [], [], []
+    for room_id, category_id, price in rooms:
+        room_ids.append(room_id)
+        categories.append(category_id)
+        prices.append(to_scaled(price))
+    discount = to_scaled(discount) if discount and discount > 0 else 0
+    return ENGINES[engine](room_ids, categories, prices, calendar, discount)
+
+
+def quote(check_in, check_out, room_ids=None, category_id=None, discount=0, engine=DEFAULT_ENGINE):
+    """Два запроса: номера с ценами категорий и правила тарифов на эти даты."""
+    rooms = Room.objects.order_by('id').values_list('id', 'category_id', 'category__price')
+    if room_ids is not None:
+        rooms = rooms.filter(id__in=room_ids)
+    if category_id is not None:
+        rooms = rooms.filter(category_id=category_id)
+    rooms = list(rooms)
+    calendar = RateCalendar.load(check_in, check_out, {category for _, category, _ in rooms})
+    return quote_rooms(rooms, calendar, discount, engine)
+
+
+def quote_decimal(rooms, rules, check_in, check_out, discount=0):
+    """Эталон: тот же расчёт в Decimal отдельно по каждому номеру и ночи."""
+    rules = ordered_rules(rules)
+    pricing = User(discount=Decimal(discount))
+    nights = [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+    result = []
+    for room_id, category_id, price in rooms:
+        nightly = []
+        for night in nights:
+            amount = Decimal(price)
+            for rule in rules:
+                if rule.category_id in (None, category_id) and rule_applies(rule, night):
+                    amount = (amount * rule.percent / 100).quantize(CENT, ROUND_HALF_UP)
+            nightly.append(amount)
+        total = sum(nightly, Decimal('0.00'))
+        due = Decimal(pricing.calculate_price_with_discount(total)).quantize(CENT, ROUND_HALF_UP)
+        result.append({'room_id': room_id, 'nightly': nightly, 'total': total, 'due': due})
+    return result
@@ -0,0 +1,123 @@
+"""Создание бронирований без двойного заселения номера.
+
+Пересечение броней одного номера запрещает база: на PostgreSQL —
+ограничение EXCLUDE по (номер, период проживания). Перед вставкой
+транзакция блокирует только строку своего номера (SELECT ... FOR UPDATE),
+поэтому брони разных номеров идут параллельно, а конкурент за тот же номер
+ждёт коммита первого и сразу получает конфликт. На SQLite строковых
+блокировок нет: пустой UPDATE номера первым же оператором берёт блокировку
+записи, и проверка пересечений видит все закоммиченные брони.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils.dateparse import parse_date
+
+from . import quotes
+from .availability import overlapping_bookings
+from .models import Booking, Room, User
+
+OVERLAP_CONSTRAINT = 'booking_no_overlap'
+
+
+class BookingConflict(Exception):
+    def __init__(self, room_id, check_in, check_out):
+        self.room_id = room_id
+        self.check_in = check_in
+        self.check_out = check_out
+        super().__init__(f'Номер {room_id} уже занят на даты {check_in:%d.%m.%Y} — {check_out:%d.%m.%Y}')
+
+
+class ReservationRequest:
+    def __init__(self, guest_id, room_id, check_in, check_out, paid_amount=Decimal('0')):
+        self.guest_id = guest_id
+        self.room_id = room_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.paid_amount = paid_amount
+
+
+def _date(value, label):
+    try:
+        date = parse_date(str(value or '').strip())
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError(f'Некорректная дата {label}: {value}')
+    return date
+
+
+def parse_request(data):
+    guest_id = str(data.get('guest_id') or '').strip()
+    room_id = str(data.get('room_id') or '').strip()
+    if not guest_id.isdigit() or not room_id.isdigit():
+        raise ValueError('Укажите гостя и номер')
+    check_in = _date(data.get('check_in'), 'заезда')
+    check_out = _date(data.get('check_out'), 'выезда')
+    if check_out <= check_in:
+        raise ValueError('Дата выезда должна быть позже даты заезда')
+    if (check_out - check_in).days > quotes.MAX_NIGHTS:
+        raise ValueError(f'Не больше {quotes.MAX_NIGHTS} ночей')
+    try:
+        paid_amount = Decimal(str(data.get('paid_amount') or '0'))
+    except InvalidOperation:
+        raise ValueError('Некорректная сумма оплаты')
+    if paid_amount < 0:
+        raise ValueError('Некорректная сумма оплаты')
+    return ReservationRequest(int(guest_id), int(room_id), check_in, check_out, paid_amount)
+
+
+def lock_for_write(room_ids):
+    """SQLite: пустой UPDATE номеров берёт блокировку записи до конца транзакции."""
+    return Room.objects.filter(pk__in=room_ids).update(floor=F('floor'))
+
+
+def _lock_room(room_id):
+    if connection.features.has_select_for_update:
+        return bool(list(Room.objects.filter(pk=room_id).select_for_update().values_list('id', flat=True)))
+    return bool(lock_for_write([room_id]))
+
+
+def reserve(reservation):
+    """Создать бронь или выбросить BookingConflict.
+
+    Стоимость считается до транзакции (тарифы и скидка гостя, как в
+    quotes), под блокировкой номера — только проверка и вставка.
+    """
+    discount = User.objects.filter(pk=reservation.guest_id).values_list('discount', flat=True).first()
+    if discount is None:
+        raise ValueError(f'Гость {reservation.guest_id} не найден')
+    check_in, check_out, room_id = reservation.check_in, reservation.check_out, reservation.room_id
+    # уже закоммиченный конфликт отсекается без блокировки
+    if overlapping_bookings(check_in, check_out).filter(room_id=room_id).exists():
+        raise BookingConflict(room_id, check_in, check_out)
+    quote = quotes.quote(check_in, check_out, room_ids=[room_id], discount=discount)
+    if not quote.room_ids:
+        raise ValueError(f'Номер {room_id} не найден')
+
+    try:
+        with transaction.atomic():
+            if not _lock_room(room_id):
+                raise ValueError(f'Номер {room_id} не найден')
+            if overlapping_bookings(check_in, check_out).filter(room_id=room_id).exists():
+                raise BookingConflict(room_id, check_in, check_out)
+            return Booking.objects.create(
+                guest_id=reservation.guest_id, room_id=room_id, check_in_date=check_in, check_out_date=check_out,
+                total_cost=quotes.from_cents(quote.due[0]), paid_amount=reservation.paid_amount,
+            )
+    except IntegrityError as e:
+        # бронь, вставленная в обход блокировки (админка, импорт, SQL)
+        if OVERLAP_CONSTRAINT in str(e):
+            raise BookingConflict(room_id, check_in, check_out) from e
+        raise
+
+
+def overbooked(bookings=None):
+    """Брони, пересекающиеся с другой бронью того же номера (должно быть пусто)."""
+    bookings = Booking.objects.all() if bookings is None else bookings
+    other = Booking.objects.filter(
+        room_id=OuterRef('room_id'), check_in_date__lt=OuterRef('check_out_date'),
+        check_out_date__gt=OuterRef('check_in_date'),
+    ).exclude(pk=OuterRef('pk'))
+    return bookings.filter(Exists(other))
@@ -0,0 +1,204 @@
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import ROUND_DOWN, Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from .models import (ArchivedBooking, ArchivedServiceProvision, Booking, Category, DailyOccupancy, DailyServiceRevenue,
+                     ServiceProvision)
+
+CHUNK_SIZE = 500
+CENT = Decimal('0.01')
+
+
+def nightly_revenue(check_in, check_out, total_cost):
+    """Раскладывает стоимость брони по ночам [check_in, check_out).
+
+    Копейки, оставшиеся после деления, достаются первой ночи, так что
+    сумма по ночам всегда равна total_cost.
+    """
+    nights = max(1, (check_out - check_in).days)
+    total_cost = Decimal(total_cost)
+    rate = (total_cost / nights).quantize(CENT, rounding=ROUND_DOWN)
+    first = total_cost - rate * (nights - 1)
+    return [(check_in + timedelta(days=night), first if night == 0 else rate) for night in range(nights)]
+
+
+def accumulate(model, key_fields, deltas, create=True):
+    # deltas: {(значения key_fields): {поле: прирост}}; строки, которых ещё
+    # нет, создаются с нулями, затем всё прибавляется одним UPDATE на пачку
+    items = [(key, values) for key, values in deltas.items() if any(values.values())]
+    for start in range(0, len(items), CHUNK_SIZE):
+        chunk = items[start:start + CHUNK_SIZE]
+        if create:
+            model.objects.bulk_create(
+                [model(**dict(zip(key_fields, key))) for key, _ in chunk],
+                ignore_conflicts=True,
+            )
+        conditions = [(Q(**dict(zip(key_fields, key))), values) for key, values in chunk]
+        updates = {}
+        for field in {field for _, values in chunk for field in values}:
+            output_field = model._meta.get_field(field)
+            updates[field] = F(field) + Case(
+                *(When(condition, then=Value(values[field], output_field=output_field))
+                  for condition, values in conditions if values.get(field)),
+                default=Value(0, output_field=output_field),
+                output_field=output_field,
+            )
+        model.objects.filter(reduce(or_, (condition for condition, _ in conditions))).update(**updates)
+
+
+def booking_deltas(category_id, check_in, check_out, total_cost, sign=1):
+    return {
+        (date, category_id): {'rooms_occupied': sign, 'room_revenue': sign * revenue}
+        for date, revenue in nightly_revenue(check_in, check_out, total_cost)
+    }
+
+
+def record_booking(category_id, check_in, check_out, total_cost, sign=1):
+    # При вычитании строки уже существуют; не создаём их, чтобы не ссылаться
+    # на категорию, которая, возможно, удаляется вместе с бронью
+    accumulate(DailyOccupancy, ('date', 'category_id'),
+               booking_deltas(category_id, check_in, check_out, total_cost, sign), create=sign > 0)
+
+
+def record_provisions(provisions, sign=1):
+    """provisions: итерируемое из (date, category_id, service_id, quantity, cost)."""
+    occupancy = defaultdict(lambda: {'service_revenue': Decimal(0)})
+    services = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal(0)})
+    for date, category_id, service_id, quantity, cost in provisions:
+        revenue = sign * quantity * Decimal(cost)
+        occupancy[date, category_id]['service_revenue'] += revenue
+        services[date, service_id]['quantity'] += sign * quantity
+        services[date, service_id]['revenue'] += revenue
+    accumulate(DailyOccupancy, ('date', 'category_id'), occupancy, create=sign > 0)
+    accumulate(DailyServiceRevenue, ('date', 'service_id'), services, create=sign > 0)
+
+
+def reprice_service(service_id, old_cost, new_cost):
+    """Услуги в роллапах, как в backfill и счетах, считаются по текущей цене.
+
+    При смене цены выручка услуги за все дни её оказания (включая архив)
+    сдвигается на quantity * (new_cost - old_cost), поэтому последующее
+    удаление услуги вычитает ровно то, что к этому моменту учтено.
+    """
+    difference = Decimal(new_cost) - Decimal(old_cost)
+    if not difference:
+        return
+    occupancy = defaultdict(lambda: {'service_revenue': Decimal(0)})
+    services = defaultdict(lambda: {'revenue': Decimal(0)})
+    for model in (ServiceProvision, ArchivedServiceProvision):
+        rows = (
+            model.objects.filter(service_id=service_id)
+            .values('service_date', 'booking__room__category_id')
+            .annotate(quantity_total=Sum('quantity'))
+            .order_by()
+        )
+        for row in rows:
+            revenue = row['quantity_total'] * difference
+            occupancy[row['service_date'], row['booking__room__category_id']]['service_revenue'] += revenue
+            services[row['service_date'], service_id]['revenue'] += revenue
+    # строки роллапов уже есть, если услуги были учтены
+    accumulate(DailyOccupancy, ('date', 'category_id'), occupancy, create=False)
+    accumulate(DailyServiceRevenue, ('date', 'service_id'), services, create=False)
+
+
+def backfill(start, end, chunk_size=2000):
+    """Пересчитывает роллапы за [start, end] по броням и услугам, включая архив."""
+    occupancy = defaultdict(lambda: {'rooms_occupied': 0, 'room_revenue': Decimal(0),
+                                     'service_revenue': Decimal(0)})
+    services = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal(0)})
+
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.filter(check_in_date__lte=end, check_out_date__gt=start).values_list(
+            'room__category_id', 'check_in_date', 'check_out_date', 'total_cost',
+        )
+        for category_id, check_in, check_out, total_cost in bookings.iterator(chunk_size=chunk_size):
+            for date, revenue in nightly_revenue(check_in, check_out, total_cost):
+                if start <= date <= end:
+                    occupancy[date, category_id]['rooms_occupied'] += 1
+                    occupancy[date, category_id]['room_revenue'] += revenue
+
+    for model in (ServiceProvision, ArchivedServiceProvision):
+        provisions = (
+            model.objects.filter(service_date__range=(start, end))
+            .values('service_date', 'service_id', 'booking__room__category_id')
+            .annotate(quantity_total=Sum('quantity'), revenue=Sum(F('quantity') * F('service__cost')))
+            .order_by()
+        )
+        for row in provisions.iterator(chunk_size=chunk_size):
+            date = row['service_date']
+            occupancy[date, row['booking__room__category_id']]['service_revenue'] += row['revenue']
+            services[date, row['service_id']]['quantity'] += row['quantity_total']
+            services[date, row['service_id']]['revenue'] += row['revenue']
+
+    with transaction.atomic():
+        DailyOccupancy.objects.filter(date__range=(start, end)).delete()
+        DailyServiceRevenue.objects.filter(date__range=(start, end)).delete()
+        DailyOccupancy.objects.bulk_create(
+            (DailyOccupancy(date=date, category_id=category_id, **values)
+             for (date, category_id), values in occupancy.items()),
+            batch_size=chunk_size,
+        )
+        DailyServiceRevenue.objects.bulk_create(
+            (DailyServiceRevenue(date=date, service_id=service_id, **values)
+             for (date, service_id), values in services.items()),
+            batch_size=chunk_size,
+        )
+    return len(occupancy), len(services)
+
+
+def months_start(end, months):
+    """Первое число месяца, с которого months календарных месяцев заканчиваются месяцем end."""
+    index = end.year * 12 + end.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def monthly_report(start, end):
+    """Загрузка, ADR и выручка по месяцам и категориям — только по роллапам."""
+    categories = {
+        category.id: category
+        for category in Category.objects.annotate(room_total=Count('rooms'))
+    }
+    rows = (
+        DailyOccupancy.objects.filter(date__range=(start, end))
+        .annotate(month=TruncMonth('date'))
+        .values('month', 'category_id')
+        .annotate(room_nights=Sum('rooms_occupied'), room_revenue=Sum('room_revenue'),
+                  service_revenue=Sum('service_revenue'))
+        .order_by('month', 'category_id')
+    )
+    report = []
+    for row in rows:
+        category = categories.get(row['category_id'])
+        if category is None:
+            continue
+        month = row['month']
+        first_day = max(start, month)
+        last_day = min(end, month.replace(day=monthrange(month.year, month.month)[1]))
+        capacity = category.room_total * ((last_day - first_day).days + 1)
+        room_nights = row['room_nights'] or 0
+        report.append({
+            'month': month,
+            'category': category,
+            'room_nights': room_nights,
+            'occupancy': round(100 * room_nights / capacity, 1) if capacity else None,
+            'adr': (row['room_revenue'] / room_nights).quantize(CENT) if room_nights else None,
+            'room_revenue': row['room_revenue'],
+            'service_revenue': row['service_revenue'],
+        })
+    return report
+
+
+def top_services(start, end, limit=10):
+    return (
+        DailyServiceRevenue.objects.filter(date__range=(start, end))
+        .values('service__name')
+        .annotate(quantity_total=Sum('quantity'), revenue_total=Sum('revenue'))
+        .order_by('-revenue_total')[:limit]
+    )
@@ -0,0 +1,54 @@
+from functools import reduce
+from operator import add, or_
+
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .models import Service, User, UserRole
+
+SEARCH_LIMIT = 50
+
+SERVICE_FIELDS = ('name', 'description')
+CLIENT_FIELDS = ('first_name', 'email', 'phone_number')
+
+
+def matches(query, fields):
+    # На PostgreSQL icontains превращается в UPPER(field::text) LIKE UPPER('%q%'),
+    # что обслуживают GIN-индексы gin_trgm_ops из миграции 0010
+    return reduce(or_, (Q(**{f'{field}__icontains': query}) for field in fields))
+
+
+def rank(query, fields):
+    primary, *secondary = fields
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return reduce(add, [TrigramSimilarity(primary, query)] + [
+            TrigramSimilarity(field, query) * Value(0.5) for field in secondary
+        ])
+    return Case(
+        When(**{f'{primary}__iexact': query}, then=Value(3.0)),
+        When(**{f'{primary}__istartswith': query}, then=Value(2.0)),
+        When(**{f'{primary}__icontains': query}, then=Value(1.0)),
+        default=Value(0.5),
+        output_field=FloatField(),
+    )
+
+
+def ranked_search(queryset, query, fields, limit=SEARCH_LIMIT):
+    query = query.strip()
+    if not query:
+        return queryset.none()
+    results = queryset.filter(matches(query, fields)).annotate(rank=rank(query, fields))
+    results = results.order_by('-rank', fields[0], 'id')
+    return results[:limit] if limit else results
+
+
+def search_services(query, limit=SEARCH_LIMIT, queryset=None):
+    queryset = Service.objects.all() if queryset is None else queryset
+    return ranked_search(queryset, query, SERVICE_FIELDS, limit)
+
+
+def search_clients(query, limit=SEARCH_LIMIT, queryset=None):
+    queryset = User.objects.filter(role=UserRole.CLIENT) if queryset is None else queryset
+    return ranked_search(queryset, query, CLIENT_FIELDS, limit)
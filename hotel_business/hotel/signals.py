@@ -0,0 +1,230 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import catalog, equipment, portal, rollups, stats, watermarks
+from .auth import invalidate_user
+from .models import Booking, Category, Equipment, Item, Room, Service, ServiceProvision, User, UserRole
+
+
+# Исходные значения берутся из __dict__, чтобы не загружать отложенные поля
+@receiver(post_init, sender=User)
+def remember_user_role(sender, instance, **kwargs):
+    instance._stats_role = instance.__dict__.get('role')
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, **kwargs):
+    old_role = None if created else instance._stats_role
+    new_role = instance.__dict__.get('role')
+    if created or old_role is not None:
+        delta = (new_role == UserRole.CLIENT) - (old_role == UserRole.CLIENT)
+        stats.increment(stats.TOTAL_CLIENTS, delta)
+    instance._stats_role = new_role
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    if instance.__dict__.get('role') == UserRole.CLIENT:
+        stats.increment(stats.TOTAL_CLIENTS, -1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # второй раз после коммита: иначе параллельный запрос успеет закешировать
+    # ещё не закоммиченную старую строку под новой версией
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_save, sender=Service)
+def count_service(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(stats.TOTAL_SERVICES, 1)
+    catalog.invalidate()
+
+
+@receiver(post_delete, sender=Service)
+def uncount_service(sender, instance, **kwargs):
+    stats.increment(stats.TOTAL_SERVICES, -1)
+    catalog.invalidate()
+
+
+@receiver(post_init, sender=Service)
+def remember_service_cost(sender, instance, **kwargs):
+    instance._original_cost = instance.__dict__.get('cost')
+
+
+@receiver(post_save, sender=Service)
+def reprice_service(sender, instance, created, **kwargs):
+    if not created and instance._original_cost is not None and 'cost' in instance.__dict__:
+        rollups.reprice_service(instance.pk, instance._original_cost, instance.cost)
+    instance._original_cost = instance.__dict__.get('cost')
+
+
+@receiver(post_save, sender=Room)
+def count_room(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(stats.TOTAL_ROOMS, 1)
+
+
+@receiver(post_delete, sender=Room)
+def uncount_room(sender, instance, **kwargs):
+    stats.increment(stats.TOTAL_ROOMS, -1)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def touch_watermark(sender, instance, **kwargs):
+    watermarks.touch(sender)
+
+
+@receiver(post_init, sender=Equipment)
+def remember_equipment_category(sender, instance, **kwargs):
+    instance._original_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(post_save, sender=Equipment)
+def summarize_equipment(sender, instance, created, **kwargs):
+    equipment.refresh_summaries({instance._original_category_id, instance.category_id} - {None})
+    instance._original_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Equipment)
+def unsummarize_equipment(sender, instance, **kwargs):
+    equipment.refresh_summaries([instance.category_id])
+
+
+@receiver(post_save, sender=Item)
+def rename_equipment_item(sender, instance, created, **kwargs):
+    if not created:
+        equipment.refresh_summaries(Equipment.objects.filter(item=instance).values('category_id'))
+
+
+BOOKING_TRACKED_FIELDS = ('room_id', 'check_in_date', 'check_out_date', 'total_cost')
+PROVISION_TRACKED_FIELDS = ('booking_id', 'service_id', 'service_date', 'quantity')
+
+
+def _snapshot(instance, fields):
+    return {field: instance.__dict__.get(field) for field in fields}
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking(sender, instance, **kwargs):
+    instance._original = _snapshot(instance, BOOKING_TRACKED_FIELDS)
+
+
+@receiver(post_save, sender=Booking)
+def count_booking(sender, instance, created, **kwargs):
+    today = timezone.now().date()
+    original = instance._original
+    was_active = not created and stats.is_active_booking(original['check_in_date'], original['check_out_date'], today)
+    delta = stats.is_active_booking(instance.check_in_date, instance.check_out_date, today) - was_active
+    stats.increment(stats.ACTIVE_BOOKINGS, delta, as_of=today)
+
+
+@receiver(post_save, sender=Booking)
+def roll_up_booking(sender, instance, created, **kwargs):
+    original = instance._original
+    current = _snapshot(instance, BOOKING_TRACKED_FIELDS)
+    if not created and current == original:
+        return
+    room_ids = {current['room_id']} if created else {current['room_id'], original['room_id']}
+    categories = dict(Room.objects.filter(pk__in=room_ids).values_list('id', 'category_id'))
+    if not created and None not in original.values():
+        rollups.record_booking(categories[original['room_id']], original['check_in_date'],
+                               original['check_out_date'], original['total_cost'], sign=-1)
+    rollups.record_booking(categories[current['room_id']], instance.check_in_date, instance.check_out_date,
+                           instance.total_cost)
+
+
+@receiver(post_save, sender=Booking)
+def remember_saved_booking(sender, instance, **kwargs):
+    instance._original = _snapshot(instance, BOOKING_TRACKED_FIELDS)
+
+
+@receiver(post_delete, sender=Booking)
+def uncount_booking(sender, instance, **kwargs):
+    today = timezone.now().date()
+    original = instance._original
+    if stats.is_active_booking(original['check_in_date'], original['check_out_date'], today):
+        stats.increment(stats.ACTIVE_BOOKINGS, -1, as_of=today)
+    category_id = Room.objects.filter(pk=original['room_id']).values_list('category_id', flat=True).first()
+    if category_id is not None:
+        rollups.record_booking(category_id, original['check_in_date'], original['check_out_date'],
+                               original['total_cost'], sign=-1)
+
+
+@receiver(post_init, sender=ServiceProvision)
+def remember_provision(sender, instance, **kwargs):
+    instance._original = _snapshot(instance, PROVISION_TRACKED_FIELDS)
+
+
+def _provision_rows(*snapshots):
+    booking_ids = {snapshot['booking_id'] for snapshot in snapshots}
+    service_ids = {snapshot['service_id'] for snapshot in snapshots}
+    categories = dict(Booking.objects.filter(pk__in=booking_ids).values_list('id', 'room__category_id'))
+    costs = dict(Service.objects.filter(pk__in=service_ids).values_list('id', 'cost'))
+    return [
+        (snapshot['service_date'], categories.get(snapshot['booking_id']), snapshot['service_id'],
+         snapshot['quantity'], costs.get(snapshot['service_id']))
+        for snapshot in snapshots
+    ]
+
+
+@receiver(post_save, sender=ServiceProvision)
+def roll_up_provision(sender, instance, created, **kwargs):
+    original = instance._original
+    current = _snapshot(instance, PROVISION_TRACKED_FIELDS)
+    if not created and current == original:
+        return
+    if created or None in original.values():
+        [new_row] = _provision_rows(current)
+        rollups.record_provisions([new_row])
+    else:
+        old_row, new_row = _provision_rows(original, current)
+        rollups.record_provisions([old_row], sign=-1)
+        rollups.record_provisions([new_row])
+    instance._original = current
+
+
+@receiver(post_delete, sender=ServiceProvision)
+def unroll_provision(sender, instance, **kwargs):
+    [row] = _provision_rows(instance._original)
+    if row[1] is not None and row[4] is not None:
+        rollups.record_provisions([row], sign=-1)
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_guest(sender, instance, **kwargs):
+    instance._portal_guest_id = instance.__dict__.get('guest_id')
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def forget_guest_stays(sender, instance, **kwargs):
+    portal.invalidate({instance._portal_guest_id, instance.guest_id})
+    instance._portal_guest_id = instance.guest_id
+
+
+@receiver(post_init, sender=ServiceProvision)
+def remember_provision_booking(sender, instance, **kwargs):
+    instance._portal_booking_id = instance.__dict__.get('booking_id')
+
+
+@receiver(post_save, sender=ServiceProvision)
+@receiver(post_delete, sender=ServiceProvision)
+def forget_provision_stays(sender, instance, **kwargs):
+    booking_ids = {instance._portal_booking_id, instance.booking_id} - {None}
+    portal.invalidate(Booking.objects.filter(pk__in=booking_ids).values_list('guest_id', flat=True))
+    instance._portal_booking_id = instance.booking_id
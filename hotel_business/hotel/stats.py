@@ -0,0 +1,105 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Booking, DashboardCounter, Room, Service, User, UserRole
+
+TOTAL_CLIENTS = 'total_clients'
+TOTAL_SERVICES = 'total_services'
+TOTAL_ROOMS = 'total_rooms'
+ACTIVE_BOOKINGS = 'active_bookings'
+
+COUNTERS = (TOTAL_CLIENTS, TOTAL_SERVICES, TOTAL_ROOMS, ACTIVE_BOOKINGS)
+
+
+def is_active_booking(check_in_date, check_out_date, today):
+    if check_in_date is None or check_out_date is None:
+        return False
+    return check_in_date <= today <= check_out_date
+
+
+def count_active_bookings(today):
+    return Booking.objects.filter(check_in_date__lte=today, check_out_date__gte=today).count()
+
+
+def live_counts(today=None):
+    today = today or timezone.now().date()
+    return {
+        TOTAL_CLIENTS: User.objects.filter(role=UserRole.CLIENT).count(),
+        TOTAL_SERVICES: Service.objects.count(),
+        TOTAL_ROOMS: Room.objects.count(),
+        ACTIVE_BOOKINGS: count_active_bookings(today),
+    }
+
+
+async def alive_counts(today=None):
+    """То же, что live_counts, но четыре COUNT отправляются одновременно."""
+    today = today or timezone.now().date()
+    values = await asyncio.gather(
+        User.objects.filter(role=UserRole.CLIENT).acount(),
+        Service.objects.acount(),
+        Room.objects.acount(),
+        Booking.objects.filter(check_in_date__lte=today, check_out_date__gte=today).acount(),
+    )
+    return dict(zip(COUNTERS, values))
+
+
+def rebuild(today=None):
+    today = today or timezone.now().date()
+    return store(live_counts(today), today)
+
+
+def store(counts, today):
+    with transaction.atomic():
+        for name, value in counts.items():
+            DashboardCounter.objects.update_or_create(
+                name=name,
+                defaults={'value': value, 'as_of': today if name == ACTIVE_BOOKINGS else None},
+            )
+    return counts
+
+
+def get_dashboard_stats(today=None):
+    today = today or timezone.now().date()
+    counters = {counter.name: counter for counter in DashboardCounter.objects.all()}
+    if any(name not in counters for name in COUNTERS):
+        return rebuild(today)
+
+    active = counters[ACTIVE_BOOKINGS]
+    if active.as_of != today:
+        # Наступил новый день: активные брони пересчитываются один раз
+        active.value = count_active_bookings(today)
+        active.as_of = today
+        active.save(update_fields=['value', 'as_of'])
+
+    return {name: counters[name].value for name in COUNTERS}
+
+
+async def aget_dashboard_stats(today=None):
+    today = today or timezone.now().date()
+    counters = {counter.name: counter async for counter in DashboardCounter.objects.all()}
+    if any(name not in counters for name in COUNTERS):
+        return await sync_to_async(store)(await alive_counts(today), today)
+
+    active = counters[ACTIVE_BOOKINGS]
+    if active.as_of != today:
+        active.value = await Booking.objects.filter(
+            check_in_date__lte=today, check_out_date__gte=today,
+        ).acount()
+        active.as_of = today
+        await active.asave(update_fields=['value', 'as_of'])
+
+    return {name: counters[name].value for name in COUNTERS}
+
+
+def increment(name, delta, as_of=None):
+    if not delta:
+        return
+    counters = DashboardCounter.objects.filter(name=name)
+    if as_of is not None:
+        # Счётчик за прошлый день всё равно будет пересчитан целиком
+        counters = counters.filter(as_of=as_of)
+    counters.update(value=F('value') + delta)
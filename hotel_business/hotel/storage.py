@@ -0,0 +1,59 @@
+"""Хранилище статики: имена с хешем содержимого и сжатые копии рядом.
+
+collectstatic кладёт в STATIC_ROOT, например, css/styles.<md5>.css, а рядом
+css/styles.<md5>.css.gz и .br (brotli — если установлен пакет brotli), чтобы
+StaticAssetsMiddleware или nginx отдавали готовое сжатие, а не сжимали
+каждый ответ. Имя меняется вместе с содержимым, поэтому такие файлы
+кешируются браузером навсегда.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+MIN_COMPRESS_SIZE = 256
+
+
+def compress(data):
+    """(суффикс, сжатые данные) для каждого доступного алгоритма."""
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    return variants
+
+
+class HotelStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # До первого collectstatic (разработка, тесты) манифеста нет:
+        # ссылки ведут на исходные файлы, как у StaticFilesStorage
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        compressed = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and hashed_name not in compressed and not isinstance(processed, Exception):
+                self.compress(hashed_name)
+                compressed.add(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, content in compress(data):
+            if len(content) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(content))
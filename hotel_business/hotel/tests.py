@@ -1,3 +1,1867 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import warnings
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from hotel_business import db_router
+
+from . import (archive, autocomplete, availability, catalog, checks, equipment, exports, folio, imports, jobs, middleware,
+               pagination, portal, provisions, quotes, reservations, rollups, search, stats, storage, watermarks)
+from .benchmarks import BENCHMARK_VIEWS
+from .models import (ArchivedBooking, ArchivedServiceProvision, Booking, Category, DailyOccupancy, DailyServiceRevenue,
+                     DashboardCounter, Equipment, Item, Job, JobStatus, RateRule, Room, Service, ServiceProvision, User,
+                     UserRole)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.standard = Category.objects.create(name='Стандарт', price=3000)
+        self.suite = Category.objects.create(name='Люкс', price=6000)
+        self.twin = Room.objects.create(category=self.standard, floor=1, room_count=1, bed_count=2)
+        self.family = Room.objects.create(category=self.standard, floor=2, room_count=2, bed_count=4)
+        self.large = Room.objects.create(category=self.suite, floor=3, room_count=3, bed_count=5)
+        guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT)
+        Booking.objects.create(guest=guest, room=self.twin, check_in_date=self.today,
+                               check_out_date=self.today + timedelta(days=3), total_cost=9000)
+
+    def available(self, start, nights, **filters):
+        check_in = self.today + timedelta(days=start)
+        rooms = availability.find_available_rooms(check_in, check_in + timedelta(days=nights), **filters)
+        return [room.id for room in rooms]
+
+    def test_check_out_day_is_free(self):
+        everything = [self.twin.id, self.family.id, self.large.id]
+        self.assertEqual(self.available(3, 2), everything)
+        self.assertEqual(self.available(-2, 2), everything)
+        self.assertEqual(self.available(2, 1), [self.family.id, self.large.id])
+        self.assertEqual(self.available(-1, 2), [self.family.id, self.large.id])
+
+    def test_filters(self):
+        self.assertEqual(self.available(5, 1, bed_count=4), [self.family.id, self.large.id])
+        self.assertEqual(self.available(5, 1, category_id=self.standard.id), [self.twin.id, self.family.id])
+        self.assertEqual(self.available(0, 1, bed_count=2, category_id=self.standard.id), [self.family.id])
+        with self.assertRaises(ValueError):
+            self.available(1, 0)
+
+    def test_view_validates_input(self):
+        self.client.force_login(User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER))
+        check_in, check_out = self.today, self.today + timedelta(days=1)
+        response = self.client.get(f'/manager/availability/?check_in={check_out}&check_out={check_in}')
+        self.assertContains(response, 'Дата выезда должна быть позже даты заезда')
+        response = self.client.get('/manager/availability/?check_in=завтра&check_out=2026-13-01')
+        self.assertContains(response, 'Некорректный формат даты')
+        response = self.client.get(f'/manager/availability/?check_in={check_in}&check_out={check_out}&category=люкс')
+        self.assertEqual([room.id for room in response.context['rooms']], [self.family.id, self.large.id])
+        self.assertEqual(self.client.get('/manager/rooms/?category=люкс&bed_count=x').status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        room = Room.objects.create(category=Category.objects.create(name='Стандарт', price=3000),
+                                   floor=1, room_count=1, bed_count=2)
+        self.guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT)
+        self.away = User.objects.create_user('away@example.com', 'pass', role=UserRole.CLIENT)
+        self.booking = Booking.objects.create(guest=self.guest, room=room, check_in_date=self.today,
+                                              check_out_date=self.today + timedelta(days=2), total_cost=6000)
+        self.spa = Service.objects.create(name='Спа', cost=1500, is_active=True)
+        self.client.force_login(User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER))
+
+    def test_form_reports_errors_by_textarea_row(self):
+        rows = [
+            '',
+            f'{self.guest.id};{self.spa.id};{self.today};2',
+            'abc;1;2026-01-01',
+            f'{self.away.id};{self.spa.id};{self.today}',
+            f'{self.guest.id};999;{self.today}',
+        ]
+        response = self.client.post('/manager/add-service/batch/', {'lines': '\n'.join(rows)})
+        self.assertRedirects(response, '/manager/add-service/', fetch_redirect_response=False)
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)], [
+            'Строка 3: Некорректный идентификатор клиента или услуги',
+            'Строка 4: У клиента нет активного бронирования на текущую дату',
+            'Строка 5: Услуга 999 не найдена',
+            'Записано услуг: 1',
+        ])
+        self.assertEqual(ServiceProvision.objects.get(booking=self.booking).quantity, 2)
+
+    def test_api_reports_errors_by_position(self):
+        lines = [
+            {'client_id': self.away.id, 'service_id': self.spa.id, 'service_date': str(self.today)},
+            'строка',
+            {'client_id': self.guest.id, 'service_id': self.spa.id, 'service_date': str(self.today), 'quantity': -1},
+            {'client_id': self.guest.id, 'service_id': self.spa.id, 'service_date': str(self.today)},
+        ]
+        response = self.client.post('/manager/api/service-provisions/', json.dumps({'lines': lines}),
+                                    content_type='application/json')
+        self.assertEqual([error['line'] for error in response.json()['errors']], [1, 2, 3])
+        self.assertEqual([row['booking_id'] for row in response.json()['saved']], [self.booking.id])
+
+        for body in ('не json', json.dumps({'lines': {}}), json.dumps([])):
+            response = self.client.post('/manager/api/service-provisions/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.client.force_login(self.guest)
+        response = self.client.post('/manager/api/service-provisions/', json.dumps({'lines': []}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.category = Category.objects.create(name='Стандарт', price=3000)
+        stats.rebuild()
+
+    def make_booking(self, guest, start, nights):
+        room = Room.objects.create(category=self.category, floor=1, room_count=1, bed_count=2)
+        return Booking.objects.create(
+            guest=guest, room=room, check_in_date=start,
+            check_out_date=start + timedelta(days=nights), total_cost=3000 * nights,
+        )
+
+    def assertMatchesLiveCounts(self, today=None):
+        self.assertEqual(stats.get_dashboard_stats(today), stats.live_counts(today))
+
+    def test_counters_follow_model_changes(self):
+        client = User.objects.create_user('client@example.com', 'pass', role=UserRole.CLIENT)
+        guest = User.objects.create_user('guest@example.com', 'pass')
+        Service.objects.create(name='Спа', cost=1500, is_active=True)
+        service = Service.objects.create(name='Мини-бар', cost=500, is_active=True)
+        active = self.make_booking(client, self.today - timedelta(days=1), 3)
+        self.make_booking(client, self.today + timedelta(days=10), 2)
+        self.assertMatchesLiveCounts()
+
+        guest.role = UserRole.CLIENT
+        guest.save()
+        client.role = UserRole.MANAGER
+        client.save()
+        service.delete()
+        active.check_in_date = self.today + timedelta(days=30)
+        active.check_out_date = self.today + timedelta(days=31)
+        active.save()
+        self.assertMatchesLiveCounts()
+
+        Room.objects.first().delete()
+        guest.delete()
+        self.assertMatchesLiveCounts()
+
+    def test_active_bookings_recomputed_on_new_day(self):
+        client = User.objects.create_user('client@example.com', 'pass', role=UserRole.CLIENT)
+        self.make_booking(client, self.today + timedelta(days=1), 2)
+        self.assertMatchesLiveCounts()
+        self.assertMatchesLiveCounts(self.today + timedelta(days=1))
+
+    def test_rebuild_covers_bulk_writes(self):
+        Service.objects.bulk_create([Service(name='Трансфер', cost=900, is_active=True)])
+        stats.rebuild()
+        self.assertMatchesLiveCounts()
+
+    def test_missing_counters_are_rebuilt(self):
+        Service.objects.create(name='Спа', cost=1500, is_active=True)
+        DashboardCounter.objects.all().delete()
+        self.assertMatchesLiveCounts()
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spa = Service.objects.create(name='Спа', cost=Decimal('1500'), is_active=True)
+
+    def test_saved_price_replaces_cached_catalog(self):
+        self.assertEqual([service['cost'] for service in catalog.price_list()], [Decimal('1500')])
+        self.assertContains(self.client.get('/services/'), '1500')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spa.cost = Decimal('1800')
+            self.spa.save()
+            # параллельный запрос до коммита: новая версия, старые строки
+            cache.set(f'catalog:{catalog.catalog_version()}:services',
+                      ({'id': self.spa.id, 'name': 'Спа', 'cost': Decimal('1500'), 'description': '',
+                        'is_active': True},), catalog.CATALOG_TIMEOUT)
+        self.assertEqual([service['cost'] for service in catalog.price_list(10)], [Decimal('1800')])
+        response = self.client.get('/services/')
+        self.assertContains(response, '1800')
+        self.assertNotContains(response, '1500')
+
+        self.spa.delete()
+        self.assertEqual(catalog.price_list(), ())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PaginationTests(TestCase):
+    NAMES = ['Вера', 'Анна', 'Глеб', 'Анна', 'Борис', 'Вера', 'Анна']
+
+    def setUp(self):
+        self.clients = [
+            User.objects.create_user(f'{"vip" if i % 2 else "user"}{i}@example.com', 'pass', first_name=name,
+                                     role=UserRole.CLIENT)
+            for i, name in enumerate(self.NAMES)
+        ]
+        User.objects.create_user('manager@example.com', 'pass', first_name='Анна', role=UserRole.MANAGER)
+        self.queryset = User.objects.filter(role=UserRole.CLIENT)
+
+    def expected(self, descending=False, clients=None):
+        clients = sorted(clients or self.clients, key=lambda client: (client.first_name, client.id), reverse=descending)
+        return [client.id for client in clients]
+
+    def walk(self, descending, queryset=None, size=3):
+        queryset = queryset if queryset is not None else self.queryset
+        pages = [pagination.keyset_paginate(queryset, ['first_name', 'id'], descending=descending, size=size)]
+        while pages[-1].next_cursor:
+            pages.append(pagination.keyset_paginate(queryset, ['first_name', 'id'], after=pages[-1].next_cursor,
+                                                    descending=descending, size=size))
+        return pages
+
+    def test_cursors_walk_both_ways_in_both_directions(self):
+        for descending in (False, True):
+            with self.subTest(descending=descending):
+                pages = self.walk(descending)
+                self.assertEqual([client.id for page in pages for client in page], self.expected(descending))
+                self.assertEqual([len(page) for page in pages], [3, 3, 1])
+                self.assertIsNone(pages[0].previous_cursor)
+                for earlier, later in zip(pages, pages[1:]):
+                    back = pagination.keyset_paginate(self.queryset, ['first_name', 'id'],
+                                                      before=later.previous_cursor, descending=descending, size=3)
+                    self.assertEqual([client.id for client in back], [client.id for client in earlier])
+                first = pagination.keyset_paginate(self.queryset, ['first_name', 'id'],
+                                                   before=pages[1].previous_cursor, descending=descending, size=3)
+                self.assertIsNone(first.previous_cursor)
+                self.assertEqual(first.next_cursor, pages[0].next_cursor)
+
+    def test_ties_on_first_name_are_ordered_by_id(self):
+        pages = self.walk(False, size=2)
+        anna = [client.id for client in self.clients if client.first_name == 'Анна']
+        self.assertEqual([client.id for client in pages[0]] + [pages[1].items[0].id], anna)
+
+    def test_tampered_cursor_returns_first_page(self):
+        first = [client.id for client in pagination.keyset_paginate(self.queryset, ['first_name', 'id'], size=3)]
+        for cursor in ('не курсор', pagination.encode_cursor(['Анна']), 'eyJhIjogMX0=',
+                       pagination.encode_cursor(['Анна', 'x']), pagination.encode_cursor(['Анна', 10 ** 30])):
+            page = pagination.keyset_paginate(self.queryset, ['first_name', 'id'], after=cursor, size=3)
+            self.assertEqual([client.id for client in page], first)
+        self.client.force_login(User.objects.get(email='manager@example.com'))
+        self.assertEqual(self.client.get('/manager/clients/?after=%%%&before=!!').status_code, 200)
+        wrong_types = [pagination.encode_cursor(values) for values in (['a', 'x'], ['notadate', 1], ['2025-13-01', 1],
+                                                                       [None, 1], [['2025-01-01'], 1])]
+        for cursor in wrong_types:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/manager/clients/', {'after': cursor}).status_code, 200)
+                self.assertEqual(self.client.get('/manager/folios/', {'before': cursor}).status_code, 200)
+                self.assertEqual(self.client.get('/manager/api/folios/', {'after': cursor}).status_code, 200)
+        guest = User.objects.filter(role=UserRole.CLIENT).first()
+        self.client.force_login(guest)
+        for cursor in wrong_types:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/users/client/', {'before': cursor}).status_code, 200)
+                self.assertEqual(self.client.get('/users/client/api/stays/', {'after': cursor}).status_code, 200)
+
+    def test_search_keeps_cursor_ordering(self):
+        vips = [client for client in self.clients if client.email.startswith('vip')]
+        queryset = self.queryset.filter(search.matches('vip', search.CLIENT_FIELDS))
+        for descending in (False, True):
+            pages = self.walk(descending, queryset, size=2)
+            self.assertEqual([client.id for page in pages for client in page],
+                             self.expected(descending, vips))
+
+        self.client.force_login(User.objects.get(email='manager@example.com'))
+        first, *rest = self.expected(clients=vips)
+        cursor = pagination.encode_cursor([User.objects.get(pk=first).first_name, first])
+        response = self.client.get('/manager/clients/', {'search': 'vip', 'after': cursor})
+        self.assertEqual([client.id for client in response.context['clients']], rest)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.services = {
+            name: Service.objects.create(name=name, cost=100, description=description, is_active=True).id
+            for name, description in [('Spa', ''), ('Spa day', ''), ('Day spa', ''), ('Sauna', 'spa zone'),
+                                      ('Taxi', 'airport')]
+        }
+        self.clients = {
+            email: User.objects.create(email=email, first_name=name, phone_number=phone, role=UserRole.CLIENT).id
+            for email, name, phone in [('anna@example.com', 'Anna', '+79990001122'),
+                                       ('petr@example.com', 'Petr Annin', '+79990003344'),
+                                       ('oleg@annex.org', 'Oleg', '+79990005566')]
+        }
+        User.objects.create(email='anna.manager@example.com', first_name='Anna', role=UserRole.MANAGER)
+
+    def found(self, results):
+        return [item.id for item in results]
+
+    def test_matches_names_descriptions_and_contacts(self):
+        self.assertEqual(set(self.found(search.search_services('airport'))), {self.services['Taxi']})
+        self.assertEqual(set(self.found(search.search_services('TAXI'))), {self.services['Taxi']})
+        self.assertEqual(set(self.found(search.search_clients('petr'))), {self.clients['petr@example.com']})
+        self.assertEqual(set(self.found(search.search_clients('annex.org'))), {self.clients['oleg@annex.org']})
+        self.assertEqual(set(self.found(search.search_clients('0005566'))), {self.clients['oleg@annex.org']})
+        self.assertEqual(self.found(search.search_clients('   ')), [])
+        self.assertEqual(len(self.found(search.search_services('a', limit=2))), 2)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Порядок CASE проверяется на SQLite')
+    def test_exact_then_prefix_then_substring_then_secondary_fields(self):
+        self.assertEqual(self.found(search.search_services('spa')), [
+            self.services['Spa'], self.services['Spa day'], self.services['Day spa'], self.services['Sauna'],
+        ])
+        self.assertEqual(self.found(search.search_clients('ann')), [
+            self.clients['anna@example.com'], self.clients['petr@example.com'], self.clients['oleg@annex.org'],
+        ])
+
+    @skipUnless(connection.vendor == 'postgresql', 'TrigramSimilarity есть только в PostgreSQL')
+    def test_trigram_similarity_ranks_closest_names_first(self):
+        found = self.found(search.search_services('spa'))
+        self.assertEqual(found[0], self.services['Spa'])
+        self.assertEqual(found[-1], self.services['Sauna'])
+        self.assertEqual(self.found(search.search_clients('anna'))[0], self.clients['anna@example.com'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        room = Room.objects.create(category=Category.objects.create(name='Стандарт', price=3000),
+                                   floor=1, room_count=1, bed_count=2)
+        self.clients = {}
+        for name, email, staying in [('Alice', 'alice@example.com', True), ('Albert', 'bert@example.com', True),
+                                     ('Bob', 'al_bob@example.com', True), ('Alan', 'alan@example.com', False)]:
+            client = User.objects.create_user(email, 'pass', first_name=name, role=UserRole.CLIENT)
+            if staying:
+                Booking.objects.create(guest=client, room=room, check_in_date=self.today,
+                                       check_out_date=self.today + timedelta(days=2), total_cost=6000)
+            self.clients[name] = client.id
+
+    def suggested(self, query):
+        return [suggestion['id'] for suggestion in autocomplete.client_suggestions(query, today=self.today)]
+
+    def test_prefix_matches_name_or_email_of_in_house_clients(self):
+        self.assertEqual(self.suggested('AL'), [self.clients['Albert'], self.clients['Alice'], self.clients['Bob']])
+        self.assertEqual(self.suggested('bert@'), [self.clients['Albert']])
+        self.assertEqual(self.suggested('  alice '), [self.clients['Alice']])
+        self.assertEqual(self.suggested('lice'), [])
+        self.assertEqual(self.suggested('al_'), [self.clients['Bob']])
+        self.assertEqual(self.suggested('a%'), [])
+        self.assertEqual(len(self.suggested('')), 3)
+
+    def test_query_with_spaces_makes_a_valid_cache_key(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(self.suggested('alice  smith'), [])
+            self.assertEqual(self.suggested('alice  smith'), [])
+
+    def test_prefix_indexes_are_part_of_the_schema(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        self.assertIn('user_first_name_lower_idx', constraints)
+        self.assertIn('user_email_lower_idx', constraints)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RollupTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.start = self.today - timedelta(days=10)
+        self.end = self.today + timedelta(days=10)
+        self.category = Category.objects.create(name='Стандарт', price=3000)
+        self.client_user = User.objects.create_user('client@example.com', 'pass', role=UserRole.CLIENT)
+        self.service = Service.objects.create(name='Спа', cost=1500, is_active=True)
+
+    def make_booking(self, start, nights, total_cost=None):
+        room = Room.objects.create(category=self.category, floor=1, room_count=1, bed_count=2)
+        return Booking.objects.create(
+            guest=self.client_user, room=room, check_in_date=start,
+            check_out_date=start + timedelta(days=nights), total_cost=total_cost or 3000 * nights,
+        )
+
+    def snapshot(self):
+        occupancy = set(DailyOccupancy.objects.filter(date__range=(self.start, self.end)).exclude(
+            rooms_occupied=0, service_revenue=0,
+        ).values_list('date', 'category_id', 'rooms_occupied', 'room_revenue', 'service_revenue'))
+        services = set(DailyServiceRevenue.objects.filter(date__range=(self.start, self.end)).exclude(
+            quantity=0,
+        ).values_list('date', 'service_id', 'quantity', 'revenue'))
+        return occupancy, services
+
+    def assertMatchesBackfill(self):
+        incremental = self.snapshot()
+        rollups.backfill(self.start, self.end)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_nightly_revenue_keeps_total(self):
+        nights = rollups.nightly_revenue(self.today, self.today + timedelta(days=3), 1000)
+        self.assertEqual(sum(revenue for _, revenue in nights), 1000)
+        self.assertEqual(len(nights), 3)
+
+    def test_incremental_updates_match_backfill(self):
+        moved = self.make_booking(self.today - timedelta(days=2), 4, total_cost=10000)
+        cancelled = self.make_booking(self.today, 3)
+        ServiceProvision.objects.create(booking=moved, service=self.service, quantity=2, service_date=self.today)
+        provision = ServiceProvision.objects.create(
+            booking=cancelled, service=self.service, quantity=1, service_date=self.today,
+        )
+        self.assertMatchesBackfill()
+
+        moved.check_in_date = self.today + timedelta(days=1)
+        moved.check_out_date = self.today + timedelta(days=3)
+        moved.total_cost = 7001
+        moved.save()
+        provision.quantity = 3
+        provision.save()
+        self.assertMatchesBackfill()
+
+        cancelled.delete()
+        self.assertMatchesBackfill()
+
+    def test_report_window_spans_calendar_months(self):
+        end = date(2026, 10, 18)
+        self.assertEqual(rollups.months_start(end, 1), date(2026, 10, 1))
+        self.assertEqual(rollups.months_start(end, 2), date(2026, 9, 1))
+        self.assertEqual(rollups.months_start(end, 12), date(2025, 11, 1))
+        self.assertEqual(rollups.months_start(date(2026, 1, 31), 2), date(2025, 12, 1))
+        self.assertEqual(rollups.months_start(date(2026, 3, 1), 120), date(2016, 4, 1))
+
+        self.client.force_login(User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER))
+        with mock.patch('django.utils.timezone.now', return_value=timezone.make_aware(datetime(2026, 10, 18, 12))):
+            response = self.client.get('/manager/reports/?months=12')
+        self.assertEqual((response.context['start'], response.context['end']), (date(2025, 11, 1), date(2026, 10, 18)))
+
+    def test_price_change_keeps_rollups_consistent(self):
+        booking = self.make_booking(self.today - timedelta(days=1), 3)
+        provision = ServiceProvision.objects.create(booking=booking, service=self.service, quantity=2,
+                                                    service_date=self.today)
+        self.service.cost = Decimal('2000')
+        self.service.save()
+        self.assertEqual(DailyServiceRevenue.objects.get(date=self.today).revenue, Decimal('4000'))
+        self.assertMatchesBackfill()
+
+        # цена меняется через свежий экземпляр (как в админке), затем услугу отменяют
+        service = Service.objects.get(pk=self.service.pk)
+        service.cost = '300'
+        service.save()
+        self.assertEqual(DailyOccupancy.objects.get(date=self.today).service_revenue, Decimal('600'))
+        provision.delete()
+        self.assertEqual(DailyServiceRevenue.objects.get(date=self.today).revenue, 0)
+        self.assertEqual(DailyOccupancy.objects.get(date=self.today).service_revenue, 0)
+        self.assertMatchesBackfill()
+
+    def test_batch_provisions_update_rollups(self):
+        booking = self.make_booking(self.today - timedelta(days=1), 3)
+        line = provisions.ProvisionLine(self.client_user.id, self.service.id, self.today, 2)
+        provisions.provide_services([line, line], today=self.today)
+        self.assertEqual(ServiceProvision.objects.get(booking=booking).quantity, 4)
+        self.assertMatchesBackfill()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class FolioTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.category = Category.objects.create(name='Стандарт', price=3000)
+        self.spa = Service.objects.create(name='Спа', cost=Decimal('1499.99'), is_active=True)
+        self.bar = Service.objects.create(name='Мини-бар', cost=Decimal('333.33'), is_active=True)
+
+    def make_booking(self, discount, start, nights, paid):
+        guest = User.objects.create_user(f'guest{User.objects.count()}@example.com', 'pass',
+                                         role=UserRole.CLIENT, discount=discount)
+        room = Room.objects.create(category=self.category, floor=1, room_count=1, bed_count=2)
+        return Booking.objects.create(
+            guest=guest, room=room, check_in_date=start, check_out_date=start + timedelta(days=nights),
+            total_cost=3000 * nights, paid_amount=paid,
+        )
+
+    def test_balances_match_python_computation(self):
+        bookings = [
+            self.make_booking(Decimal('0'), self.today - timedelta(days=1), 2, 6000),
+            self.make_booking(Decimal('12.5'), self.today - timedelta(days=1), 3, 2000),
+            self.make_booking(Decimal('7'), self.today - timedelta(days=20), 2, 0),
+            self.make_booking(Decimal('15'), self.today + timedelta(days=5), 1, 3000),
+            self.make_booking(Decimal('15'), self.today, 1, 0),
+        ]
+        for index, booking in enumerate(bookings[1:], start=1):
+            ServiceProvision.objects.create(booking=booking, service=self.spa, quantity=index,
+                                            service_date=booking.check_in_date)
+            ServiceProvision.objects.create(booking=booking, service=self.bar, quantity=3,
+                                            service_date=booking.check_in_date)
+        # целые суммы со скидкой 15% дают дробные копейки: 1150 * 0.85 = 977.50
+        ServiceProvision.objects.filter(booking=bookings[-1], service=self.bar).delete()
+        ServiceProvision.objects.filter(booking=bookings[-1], service=self.spa).update(quantity=1)
+        Service.objects.filter(id=self.spa.id).update(cost=1150)
+
+        with self.assertNumQueries(1):
+            balances = {booking.id: booking.balance for booking in folio.folios()}
+        for booking in bookings:
+            with self.subTest(booking=booking.id):
+                self.assertEqual(balances[booking.id], folio.compute_balance(booking))
+
+        debtors = folio.folios(in_house_only=True, debtors_only=True)
+        self.assertEqual({booking.id for booking in debtors}, {bookings[1].id, bookings[4].id})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ExportTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        seed_hotel(5, self.today)
+        old = Booking.objects.first()
+        old.check_in_date = self.today - timedelta(days=30)
+        old.save()
+        manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        self.client.force_login(manager)
+
+    def export(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_filters_by_date(self):
+        content = self.export(f'/manager/export/bookings/?start={self.today - timedelta(days=1)}')
+        lines = content.splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'guest_id'])
+        self.assertEqual(len(lines) - 1, 4)
+
+    def test_ndjson_export_filters_by_role(self):
+        content = self.export('/manager/export/clients/?format=ndjson&role=client')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['role'] for row in rows}, {UserRole.CLIENT})
+        self.assertNotIn('password', rows[0])
+
+    def test_export_streams_one_query_per_table(self):
+        rows = list(exports.EXPORTS['provisions'].rows())
+        # архивные услуги и текущие
+        with self.assertNumQueries(2):
+            content = ''.join(exports.stream('provisions', 'csv'))
+        self.assertEqual(len(content.splitlines()), len(rows) + 1)
+
+    async def test_asgi_export_is_streamed_in_batches(self):
+        expected = await sync_to_async(self.export)('/manager/export/provisions/?format=ndjson')
+        await self.async_client.aforce_login(await User.objects.aget(email='manager@example.com'))
+        with mock.patch.object(exports, 'LINES_PER_WRITE', 2):
+            response = await self.async_client.get('/manager/export/provisions/?format=ndjson')
+            # асинхронный итератор Django не собирает в список
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode(), expected)
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get('/manager/export/bookings/?start=31.12.2024').status_code, 400)
+        self.assertEqual(self.client.get('/manager/export/bookings/?role=owner').status_code, 400)
+        self.assertEqual(self.client.get('/manager/export/passwords/').status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        category = Category.objects.create(name='Стандарт', price=3000)
+        self.room = Room.objects.create(category=category, floor=1, room_count=1, bed_count=2)
+        self.guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT, discount=10)
+        self.spa = Service.objects.create(name='Спа', cost=Decimal('1500'), is_active=True)
+        stats.rebuild()
+        self.old = self.make_booking(-400, 3, paid=1000)
+        self.recent = self.make_booking(-30, 2)
+        self.current = self.make_booking(-1, 3)
+        for booking in (self.old, self.recent, self.current):
+            ServiceProvision.objects.create(booking=booking, service=self.spa, quantity=2,
+                                            service_date=booking.check_in_date)
+        self.start, self.end = self.today - timedelta(days=410), self.today + timedelta(days=5)
+
+    def make_booking(self, start, nights, paid=0):
+        check_in = self.today + timedelta(days=start)
+        return Booking.objects.create(guest=self.guest, room=self.room, check_in_date=check_in,
+                                      check_out_date=check_in + timedelta(days=nights), total_cost=3000 * nights,
+                                      paid_amount=paid)
+
+    def rollups(self):
+        return (
+            list(DailyOccupancy.objects.exclude(rooms_occupied=0, service_revenue=0).order_by('date').values_list(
+                'date', 'rooms_occupied', 'room_revenue', 'service_revenue')),
+            list(DailyServiceRevenue.objects.exclude(quantity=0).order_by('date').values_list(
+                'date', 'quantity', 'revenue')),
+        )
+
+    def test_default_backfill_covers_archived_history(self):
+        before = self.rollups()
+        self.assertEqual(archive.archive(self.today + timedelta(days=10)), (3, 3))
+        DailyOccupancy.objects.all().delete()
+        DailyServiceRevenue.objects.all().delete()
+        stdout = io.StringIO()
+        call_command('backfill_rollups', stdout=stdout)
+        self.assertNotIn('Нет данных', stdout.getvalue())
+        self.assertEqual(self.rollups(), before)
+        for value in ('2026-13-01', 'вчера'):
+            with self.subTest(value=value), self.assertRaisesMessage(CommandError, f'Некорректная дата: {value}'):
+                call_command('backfill_rollups', start=value, stdout=stdout)
+
+    def test_archive_moves_past_stays_without_touching_reports(self):
+        balance = folio.folios(booking_ids=[self.old.id]).get().balance
+        report = rollups.monthly_report(self.start, self.end)
+        before = self.rollups()
+
+        self.assertEqual(archive.archive(archive.horizon(self.today)), (1, 1))
+        self.assertEqual(archive.archive(archive.horizon(self.today)), (0, 0))
+        self.assertEqual(set(Booking.objects.values_list('id', flat=True)), {self.recent.id, self.current.id})
+        archived = ArchivedBooking.objects.get()
+        self.assertEqual((archived.id, archived.paid_amount), (self.old.id, Decimal('1000')))
+        self.assertEqual(ArchivedServiceProvision.objects.get().booking_id, self.old.id)
+        self.assertFalse(ServiceProvision.objects.filter(booking_id=self.old.id).exists())
+
+        self.assertEqual(self.rollups(), before)
+        self.assertEqual(rollups.monthly_report(self.start, self.end), report)
+        rollups.backfill(self.start, self.end)
+        self.assertEqual(self.rollups(), before)
+        self.assertEqual(stats.get_dashboard_stats(), stats.live_counts())
+        self.assertEqual(folio.folios(archived=True).get().balance, balance)
+
+    def test_folios_and_exports_see_archived_stays(self):
+        manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        self.client.force_login(manager)
+        stdout = io.StringIO()
+        call_command('archive_stays', days=20, explain=True, runs=1, stdout=stdout)
+        self.assertIn('Перенесено в архив: броней 2, услуг 2', stdout.getvalue())
+        self.assertEqual(Booking.objects.get().id, self.current.id)
+
+        response = self.client.get(f'/manager/folios/{self.old.id}/')
+        self.assertContains(response, 'архив')
+        self.assertContains(response, 'Спа')
+        self.assertContains(self.client.get(f'/manager/folios/{self.current.id}/'), 'Спа')
+        response = self.client.get('/manager/api/folios/?archived=1')
+        self.assertEqual({row['booking_id'] for row in response.json()['results']}, {self.old.id, self.recent.id})
+
+        response = self.client.get('/manager/export/bookings/?format=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.old.id, self.recent.id, self.current.id])
+        with self.assertRaises(CommandError):
+            call_command('archive_stays', days=-1, stdout=io.StringIO())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PortalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        category = Category.objects.create(name='Люкс', price=5000)
+        self.room = Room.objects.create(category=category, floor=3, room_count=2, bed_count=2)
+        self.guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT, discount=10)
+        self.other = User.objects.create_user('other@example.com', 'pass', role=UserRole.CLIENT)
+        self.spa = Service.objects.create(name='Спа', cost=Decimal('1500'), is_active=True)
+        self.current = self.make_booking(self.guest, -1, 3)
+        ServiceProvision.objects.create(booking=self.current, service=self.spa, quantity=2, service_date=self.today)
+        self.make_booking(self.other, 10, 2)
+        self.client.force_login(self.guest)
+
+    def make_booking(self, guest, start, nights, paid=0):
+        check_in = self.today + timedelta(days=start)
+        return Booking.objects.create(guest=guest, room=self.room, check_in_date=check_in,
+                                      check_out_date=check_in + timedelta(days=nights), total_cost=5000 * nights,
+                                      paid_amount=paid)
+
+    def test_api_lists_own_stays_with_room_and_services(self):
+        response = self.client.get('/users/client/api/stays/')
+        [stay] = response.json()['results']
+        self.assertEqual(stay['booking_id'], self.current.id)
+        self.assertEqual(stay['status'], 'in_house')
+        self.assertEqual(stay['room'], {'id': self.room.id, 'floor': 3, 'room_count': 2, 'bed_count': 2,
+                                        'category': 'Люкс'})
+        self.assertEqual([(service['service'], service['quantity']) for service in stay['services']], [('Спа', 2)])
+        balance = folio.folios(booking_ids=[self.current.id]).get()
+        self.assertEqual((Decimal(stay['services_due']), Decimal(stay['balance'])),
+                         (balance.services_due, balance.balance))
+        self.assertContains(self.client.get('/users/client/'), 'Спа')
+
+        self.client.force_login(User.objects.create_user('visitor@example.com', 'pass'))
+        self.assertEqual(self.client.get('/users/client/api/stays/').status_code, 403)
+
+    def test_stays_take_two_queries_regardless_of_count(self):
+        for week in range(1, 30):
+            booking = self.make_booking(self.guest, -7 * week - 1, 3)
+            ServiceProvision.objects.create(booking=booking, service=self.spa, service_date=booking.check_in_date)
+        cache.clear()
+        with self.assertNumQueries(2):
+            page = portal.stays(self.guest)
+        self.assertEqual(len(page['results']), portal.PAGE_SIZE)
+        with self.assertNumQueries(0):
+            portal.stays(self.guest)
+
+        seen = [stay['booking_id'] for stay in page['results']]
+        while page['next']:
+            with self.assertNumQueries(2):
+                page = portal.stays(self.guest, after=page['next'])
+            seen += [stay['booking_id'] for stay in page['results']]
+        self.assertEqual(seen, list(Booking.objects.filter(guest=self.guest)
+                                    .order_by('-check_in_date', '-id').values_list('id', flat=True)))
+
+    def test_changes_invalidate_cached_page(self):
+        etag = self.client.get('/users/client/')['ETag']
+        self.assertEqual(self.client.get('/users/client/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ServiceProvision.objects.filter(booking=self.current).get().delete()
+        response = self.client.get('/users/client/', HTTP_IF_NONE_MATCH=etag)
+        self.assertNotContains(response, 'Спа')
+
+        lines = [provisions.ProvisionLine(self.guest.id, self.spa.id, self.today, 3)]
+        provisions.provide_services(lines, self.today)
+        self.assertEqual(portal.stays(self.guest)['results'][0]['services'][0]['quantity'], 3)
+
+        self.spa.cost = 2000
+        self.spa.save()
+        self.assertEqual(portal.stays(self.guest)['results'][0]['services_total'], Decimal('6000'))
+
+        upcoming = self.make_booking(self.guest, 30, 2)
+        self.assertEqual(portal.stays(self.guest)['results'][0]['status'], 'upcoming')
+        upcoming.guest = self.other
+        upcoming.save()
+        self.assertEqual([stay['booking_id'] for stay in portal.stays(self.guest)['results']], [self.current.id])
+        self.assertEqual(len(portal.stays(self.other)['results']), 2)
+
+    def test_archived_stays(self):
+        old = self.make_booking(self.guest, -400, 2, paid=10000)
+        ServiceProvision.objects.create(booking=old, service=self.spa, service_date=old.check_in_date)
+        self.assertEqual(len(portal.stays(self.guest)['results']), 2)
+        archive.archive(archive.horizon(self.today))
+        self.assertEqual([stay['booking_id'] for stay in portal.stays(self.guest)['results']], [self.current.id])
+
+        response = self.client.get('/users/client/api/stays/?archived=1')
+        [stay] = response.json()['results']
+        self.assertEqual((stay['booking_id'], stay['status'], stay['balance']), (old.id, 'past', '1350.00'))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        category = Category.objects.create(name='Стандарт', price=3000)
+        self.room = Room.objects.create(category=category, floor=1, room_count=1, bed_count=2)
+        User.objects.create_user('taken@example.com', 'pass', role=UserRole.CLIENT)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_import_guests_and_bookings(self):
+        day = self.today.isoformat
+        guests = self.write_csv('guests.csv', [
+            {'email': 'anna@example.com', 'first_name': 'Иванова Анна', 'discount': '10',
+             'document_series': '4510', 'document_number': '123456', 'document_issue_date': '2015-05-01',
+             'document_issued_by': 'ОВД'},
+            {'email': 'petr@example.com', 'first_name': 'Петров Пётр', 'discount': '',
+             'document_series': '', 'document_number': '', 'document_issue_date': '', 'document_issued_by': ''},
+            {'email': 'not-an-email', 'first_name': '', 'discount': '',
+             'document_series': '', 'document_number': '', 'document_issue_date': '', 'document_issued_by': ''},
+            {'email': 'taken@example.com', 'first_name': '', 'discount': '',
+             'document_series': '', 'document_number': '', 'document_issue_date': '', 'document_issued_by': ''},
+            {'email': 'anna@example.com', 'first_name': '', 'discount': '',
+             'document_series': '', 'document_number': '', 'document_issue_date': '', 'document_issued_by': ''},
+            {'email': 'olga@example.com', 'first_name': '', 'discount': '200',
+             'document_series': '1', 'document_number': '', 'document_issue_date': '', 'document_issued_by': ''},
+        ])
+        later = (self.today + timedelta(days=3)).isoformat()
+        bookings = self.write_csv('bookings.csv', [
+            {'guest_email': 'anna@example.com', 'room_id': self.room.id, 'check_in_date': day(),
+             'check_out_date': later, 'total_cost': '9000', 'paid_amount': '1000'},
+            {'guest_email': 'petr@example.com', 'room_id': self.room.id, 'check_in_date': day(),
+             'check_out_date': later, 'total_cost': '9000', 'paid_amount': ''},
+            {'guest_email': 'petr@example.com', 'room_id': self.room.id, 'check_in_date': later,
+             'check_out_date': (self.today + timedelta(days=5)).isoformat(), 'total_cost': '6000', 'paid_amount': ''},
+            {'guest_email': 'nobody@example.com', 'room_id': self.room.id, 'check_in_date': day(),
+             'check_out_date': later, 'total_cost': '9000', 'paid_amount': ''},
+            {'guest_email': 'petr@example.com', 'room_id': '999', 'check_in_date': day(),
+             'check_out_date': later, 'total_cost': '9000', 'paid_amount': ''},
+            {'guest_email': 'petr@example.com', 'room_id': self.room.id, 'check_in_date': later,
+             'check_out_date': day(), 'total_cost': '9000', 'paid_amount': ''},
+        ])
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_data', guests=guests, bookings=bookings, chunk_size=2, stdout=stdout, stderr=stderr)
+
+        anna = User.objects.get(email='anna@example.com')
+        self.assertEqual(anna.document.number, '123456')
+        self.assertEqual(anna.role, UserRole.CLIENT)
+        self.assertFalse(anna.has_usable_password())
+        self.assertFalse(User.objects.filter(email='olga@example.com').exists())
+        self.assertEqual(Booking.objects.filter(guest=anna).count(), 1)
+        self.assertEqual(Booking.objects.filter(guest__email='petr@example.com').count(), 1)
+
+        lines = sorted(stderr.getvalue().splitlines())
+        self.assertEqual([line.split(':')[1] for line in lines if 'guests.csv' in line], ['4', '5', '6', '7'])
+        self.assertEqual([line.split(':')[1] for line in lines if 'bookings.csv' in line], ['3', '5', '6', '7'])
+        self.assertEqual(stats.get_dashboard_stats(), stats.live_counts())
+        self.assertEqual(DailyOccupancy.objects.filter(date=self.today).get().rooms_occupied, 1)
+
+
+    def test_only_overlaps_are_reported_as_taken(self):
+        guest = User.objects.get(email='taken@example.com')
+        booking = Booking(room=self.room, guest=guest, check_in_date=self.today, check_out_date=self.today,
+                          total_cost=0)
+        result = imports.ImportResult()
+        self.assertEqual(imports._create_each([(2, booking)], result), [])
+        with mock.patch.object(Booking.objects, 'bulk_create',
+                               side_effect=IntegrityError('conflicting key value violates exclusion constraint '
+                                                          '"booking_no_overlap"')):
+            imports._create_each([(3, booking)], result)
+        self.assertNotIn('занят', result.errors[0][1])
+        self.assertEqual(result.errors[1], (3, f'Номер {self.room.id} уже занят на эти даты'))
+
+    @skipUnless(connection.vendor == 'sqlite', 'Блокировка пустым UPDATE нужна только на SQLite')
+    def test_bookings_are_checked_under_write_lock(self):
+        row = {'guest_email': 'taken@example.com', 'room_id': str(self.room.id),
+               'check_in_date': self.today.isoformat(), 'check_out_date': (self.today + timedelta(days=2)).isoformat(),
+               'total_cost': '6000', 'paid_amount': ''}
+        with CaptureQueriesContext(connection) as queries:
+            result = imports.import_bookings([(2, row)])
+        self.assertEqual(result.created, 1)
+        statements = [query['sql'] for query in queries.captured_queries]
+        lock = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE "hotel_room"'))
+        calendar = next(i for i, sql in enumerate(statements)
+                        if sql.startswith('SELECT') and 'FROM "hotel_booking"' in sql)
+        self.assertLess(lock, calendar)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Обход CHECK через PRAGMA есть только в SQLite')
+    def test_overlap_migration_lists_bookings_it_cannot_keep(self):
+        migration = importlib.import_module('hotel.migrations.0014_booking_no_overlap')
+        guest = User.objects.get(email='taken@example.com')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA ignore_check_constraints = ON')
+        try:
+            broken = Booking.objects.create(room=self.room, guest=guest, check_in_date=self.today,
+                                            check_out_date=self.today, total_cost=0)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA ignore_check_constraints = OFF')
+        with self.assertRaisesMessage(RuntimeError, f'выезд не позже заезда — {broken.id}'):
+            migration.check_existing_bookings(django_apps, mock.Mock(connection=connection))
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        category = Category.objects.create(name='Стандарт', price=Decimal('3000'))
+        self.room = Room.objects.create(category=category, floor=1, room_count=1, bed_count=2)
+        self.guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT, discount=10)
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+
+    def request(self, start, nights, room=None):
+        return reservations.ReservationRequest(self.guest.id, (room or self.room).id, self.today + timedelta(days=start),
+                                               self.today + timedelta(days=start + nights))
+
+    def test_reserve_rejects_overlaps_but_not_adjacent_stays(self):
+        booking = reservations.reserve(self.request(0, 3))
+        self.assertEqual(booking.total_cost, Decimal('8100.00'))
+        for start, nights in ((0, 3), (2, 1), (-1, 2), (-5, 10)):
+            with self.subTest(start=start, nights=nights), self.assertRaises(reservations.BookingConflict):
+                reservations.reserve(self.request(start, nights))
+        reservations.reserve(self.request(3, 2))
+        reservations.reserve(self.request(-2, 2))
+        self.assertEqual(Booking.objects.count(), 3)
+        self.assertFalse(reservations.overbooked().exists())
+
+    def test_conflict_committed_after_precheck_is_caught_under_lock(self):
+        def rival(*args, **kwargs):
+            Booking.objects.create(guest=self.guest, room=self.room, check_in_date=self.today,
+                                   check_out_date=self.today + timedelta(days=1), total_cost=3000)
+            return quote(*args, **kwargs)
+
+        quote = quotes.quote
+        with mock.patch.object(quotes, 'quote', side_effect=rival):
+            with self.assertRaises(reservations.BookingConflict):
+                reservations.reserve(self.request(0, 2))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_database_rejects_bad_rows(self):
+        Booking.objects.create(guest=self.guest, room=self.room, check_in_date=self.today,
+                               check_out_date=self.today + timedelta(days=3), total_cost=9000)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(guest=self.guest, room=self.room, check_in_date=self.today,
+                                   check_out_date=self.today, total_cost=0)
+        overlap = dict(guest=self.guest, room=self.room, check_in_date=self.today + timedelta(days=1),
+                       check_out_date=self.today + timedelta(days=2), total_cost=3000)
+        if connection.vendor == 'postgresql':
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Booking.objects.create(**overlap)
+        else:
+            # на SQLite ограничения нет, пересечение видно проверкой
+            Booking.objects.create(**overlap)
+            self.assertEqual(reservations.overbooked().count(), 2)
+
+    def test_api(self):
+        url = '/manager/api/bookings/'
+        data = {'guest_id': self.guest.id, 'room_id': self.room.id,
+                'check_in': str(self.today), 'check_out': str(self.today + timedelta(days=2)), 'paid_amount': '100'}
+        self.client.force_login(self.guest)
+        self.assertEqual(self.client.post(url, data, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.manager)
+        response = self.client.post(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_cost'], '5400.00')
+        self.assertEqual(Booking.objects.get().paid_amount, Decimal('100'))
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['room_id'], self.room.id)
+        for body in ({**data, 'check_out': data['check_in']}, {**data, 'room_id': 0}, {**data, 'room_id': 999}):
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, '[1]', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Писатели в отдельных процессах требуют базу на сервере')
+class ReservationSoakTests(TransactionTestCase):
+    def test_parallel_writers_never_overbook(self):
+        output = io.StringIO()
+        call_command('soak_bookings', writers=8, seconds=2, rooms=3, days=10, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['overbooked'], 0)
+        self.assertGreater(report['conflicts'], 0)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+
+    def run_next(self, worker='test'):
+        job = jobs.claim(worker)
+        jobs.execute(job)
+        job.refresh_from_db()
+        return job
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        with mock.patch.dict(jobs.HANDLERS, {'broken': ('Сломанная', lambda job: 1 / 0)}):
+            job = jobs.enqueue('broken')
+            for attempt in (1, 2):
+                with self.assertLogs('hotel.jobs', 'ERROR'):
+                    job = self.run_next()
+                self.assertEqual((job.status, job.attempts), (JobStatus.QUEUED, attempt))
+                self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=jobs.RETRY_DELAY * attempt - 5))
+                self.assertIsNone(jobs.claim('test'))
+                Job.objects.update(run_after=timezone.now())
+            with self.assertLogs('hotel.jobs', 'ERROR'):
+                job = self.run_next()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 3))
+        self.assertIn('ZeroDivisionError', job.error)
+        self.assertIsNone(jobs.claim('test'))
+        with self.assertRaises(ValueError):
+            jobs.enqueue('unknown')
+
+    def test_abandoned_job_is_reclaimed_and_stale_worker_is_fenced_off(self):
+        jobs.enqueue('report', {'start': str(self.today), 'end': str(self.today)})
+        first = jobs.claim('first')
+        self.assertIsNone(jobs.claim('second'))
+        jobs.extend([first])
+        self.assertIsNone(jobs.claim('second'))
+
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        second = jobs.claim('second')
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+        with self.assertLogs('hotel.jobs', 'WARNING'):
+            jobs.complete(first, {'stale': True})
+        jobs.fail(first, 'stale')
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.worker), (JobStatus.RUNNING, 'second'))
+
+        jobs.execute(second)
+        second.refresh_from_db()
+        self.assertEqual(second.status, JobStatus.DONE)
+        with default_storage.open(second.result['file']) as report:
+            self.assertTrue(report.read().startswith(b'month,category'))
+
+    def test_manager_enqueues_jobs_and_polls_status(self):
+        category = Category.objects.create(name='Стандарт', price=3000)
+        room = Room.objects.create(category=category, floor=1, room_count=1, bed_count=2)
+        guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT)
+        self.client.force_login(guest)
+        self.assertRedirects(self.client.get('/manager/jobs/'), '/services/', fetch_redirect_response=False)
+        self.assertEqual(self.client.get('/manager/api/jobs/').status_code, 403)
+
+        self.client.force_login(self.manager)
+        for data in ({'kind': 'unknown'}, {'kind': 'report', 'start': 'вчера', 'end': str(self.today)},
+                     {'kind': 'export', 'name': 'bookings', 'format': 'xml'}, {'kind': 'import'}):
+            with self.subTest(data=data):
+                self.client.post('/manager/jobs/', data)
+                self.assertFalse(Job.objects.exists())
+
+        self.client.post('/manager/jobs/', {'kind': 'export', 'name': 'clients', 'format': 'ndjson', 'role': 'client'})
+        later = (self.today + timedelta(days=2)).isoformat()
+        bookings = io.BytesIO(
+            f'guest_email,room_id,check_in_date,check_out_date,total_cost,paid_amount\n'
+            f'guest@example.com,{room.id},{self.today},{later},6000,\n'
+            f'nobody@example.com,{room.id},{self.today},{later},6000,\n'.encode()
+        )
+        bookings.name = 'bookings.csv'
+        self.client.post('/manager/jobs/', {'kind': 'import', 'bookings': bookings})
+        export, imported = Job.objects.order_by('id')
+        self.assertEqual(export.created_by, self.manager)
+        response = self.client.get(f'/manager/api/jobs/?ids={export.id},{imported.id}')
+        self.assertEqual([job['status'] for job in response.json()['results']], ['queued', 'queued'])
+        self.assertEqual(self.client.get(f'/manager/jobs/{export.id}/file/').status_code, 404)
+
+        self.assertEqual(self.run_next().pk, export.pk)
+        self.assertEqual(self.run_next().pk, imported.pk)
+        response = self.client.get(f'/manager/api/jobs/?ids={export.id},{imported.id}')
+        results = {job['id']: job for job in response.json()['results']}
+        self.assertEqual(results[export.id]['status'], 'done')
+        self.assertEqual(results[imported.id]['result']['created'], {'bookings': 1})
+        self.assertEqual(results[imported.id]['result']['errors'], 1)
+        self.assertEqual(Booking.objects.get().guest, guest)
+
+        download = self.client.get(f'/manager/jobs/{export.id}/file/')
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="clients.ndjson"')
+        self.assertEqual(json.loads(b''.join(download.streaming_content))['email'], 'guest@example.com')
+        self.assertContains(self.client.get('/manager/jobs/'), 'Выгрузка')
+
+
+    def test_manager_import_cannot_create_staff(self):
+        def upload():
+            guests = io.BytesIO(
+                'email,role,password\n'
+                'boss@example.com,admin,secret\n'
+                'clerk@example.com,manager,secret\n'
+                'client@example.com,client,secret\n'
+                'walkin@example.com,,\n'.encode()
+            )
+            guests.name = 'guests.csv'
+            return guests
+
+        self.client.force_login(self.manager)
+        self.client.post('/manager/jobs/', {'kind': 'import', 'guests': upload()})
+        job = self.run_next()
+        self.assertEqual(job.result['created'], {'guests': 2})
+        self.assertEqual(job.result['errors'], 2)
+        self.assertEqual(set(User.objects.values_list('role', flat=True)), {UserRole.MANAGER, UserRole.CLIENT})
+        self.assertFalse(User.objects.filter(email__in=['boss@example.com', 'clerk@example.com']).exists())
+
+        User.objects.filter(email__in=['client@example.com', 'walkin@example.com']).delete()
+        admin = User.objects.create_user('admin@example.com', 'pass', role=UserRole.ADMIN)
+        self.client.force_login(admin)
+        self.client.post('/manager/jobs/', {'kind': 'import', 'guests': upload()})
+        self.assertEqual(self.run_next().result['created'], {'guests': 4})
+        self.assertEqual(User.objects.get(email='boss@example.com').role, UserRole.ADMIN)
+
+@skipUnless(connection.vendor == 'postgresql', 'Воркеры в отдельных процессах требуют базу на сервере')
+class JobWorkerTests(TransactionTestCase):
+    def test_workers_share_queue_without_running_a_job_twice(self):
+        output = io.StringIO()
+        call_command('benchmark_jobs', kind='wait', wait=0.05, jobs=20, workers='1,4', processes=True,
+                     stdout=output, stderr=io.StringIO())
+        runs = json.loads(output.getvalue())['runs']
+        self.assertEqual([run['done'] for run in runs], [20, 20])
+        self.assertGreater(runs[1]['jobs_per_s'], runs[0]['jobs_per_s'])
+
+
+class StaticAssetsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(static_root.cleanup)
+        cls.enterClassContext(override_settings(STATIC_ROOT=static_root.name))
+        call_command('collectstatic', interactive=False, ignore_patterns=['*.scss'], verbosity=0)
+        cls.root = static_root.name
+
+    def asset_urls(self):
+        response = self.client.get('/services/')
+        self.assertNotContains(response, 'cdn.jsdelivr.net')
+        return re.findall(r'(?:href|src)="(/static/[^"]+)"', response.content.decode())
+
+    def test_pages_link_hashed_assets_cached_forever(self):
+        urls = self.asset_urls()
+        self.assertEqual(len(urls), 4)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertRegex(url, r'\.[0-9a-f]{12}\.(css|js)$')
+                with open(os.path.join(self.root, url.removeprefix('/static/')), 'rb') as asset:
+                    original = asset.read()
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+                self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(gzip.decompress(response.content), original)
+                plain = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+                self.assertFalse(plain.has_header('Content-Encoding'))
+                self.assertEqual(plain.content, original)
+                if storage.brotli is not None:
+                    response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+                    self.assertEqual(response['Content-Encoding'], 'br')
+                    self.assertEqual(storage.brotli.decompress(response.content), original)
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.client.get('/static/css/styles.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, must-revalidate')
+        response = self.client.get('/static/css/styles.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        seed_hotel(5)
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        self.client_user = User.objects.get(email='client3@example.com')
+
+    async def test_async_views_render_for_each_role(self):
+        pages = ['/services/', '/manager/', '/manager/rooms/?bed_count=2', '/manager/services/?search=Услуга']
+        await self.async_client.aforce_login(self.manager)
+        for path in pages:
+            with self.subTest(path=path):
+                response = await self.async_client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+        await self.async_client.aforce_login(self.client_user)
+        response = await self.async_client.get('/services/')
+        self.assertContains(response, 'У вас есть скидка')
+        response = await self.async_client.get('/manager/rooms/')
+        self.assertRedirects(response, '/services/', fetch_redirect_response=False)
+
+    @skipUnless(settings.HOTEL_PERFORMANCE_ENABLED, 'PerformanceMiddleware отключён')
+    async def test_async_queries_are_counted_by_middleware(self):
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get('/manager/rooms/')
+        # запросы async ORM идут через sync_to_async, но учитываются middleware
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    async def test_dashboard_counts_match_sync_path(self):
+        self.assertEqual(await stats.aget_dashboard_stats(), await sync_to_async(stats.live_counts)())
+        await DashboardCounter.objects.all().adelete()
+        self.assertEqual(await stats.aget_dashboard_stats(), await stats.alive_counts())
+
+
+@override_settings(HOTEL_PERFORMANCE_ENABLED=True)
+class PerformanceTests(TestCase):
+    def setUp(self):
+        seed_hotel(3)
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        middleware.histograms.samples.clear()
+        self.addCleanup(middleware.histograms.samples.clear)
+        # при HOTEL_PERFORMANCE=0 счётчик запросов не ставится на соединения при старте
+        for alias in connections:
+            wrappers = connections[alias].execute_wrappers
+            if middleware._count_query not in wrappers:
+                wrappers.append(middleware._count_query)
+                self.addCleanup(wrappers.remove, middleware._count_query)
+
+    def timings(self, response):
+        return {
+            name: (float(duration), description)
+            for name, duration, description in re.findall(
+                r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing'])
+        }
+
+    def test_server_timing_reports_db_templates_and_total(self):
+        self.client.force_login(self.manager)
+        page = self.timings(self.client.get('/manager/rooms/'))
+        self.assertEqual(list(page), ['db', 'tpl', 'app', 'total'])
+        self.assertRegex(page['db'][1], r'^[1-9]\d* queries$')
+        self.assertGreater(page['tpl'][0], 0)
+        self.assertGreaterEqual(page['total'][0], max(page['db'][0], page['tpl'][0]))
+
+        api = self.timings(self.client.get('/manager/api/folios/'))
+        self.assertEqual(api['tpl'][0], 0)
+        self.assertGreater(int(api['db'][1].split()[0]), 0)
+
+    def test_metrics_summarize_requests_by_url_name(self):
+        self.client.force_login(self.manager)
+        for _ in range(3):
+            self.client.get('/manager/rooms/')
+        metrics = self.client.get('/manager/metrics/').json()
+        self.assertEqual(metrics['window'], middleware.histograms.window)
+        rooms = metrics['views']['manager_rooms']
+        self.assertEqual(rooms['runs'], 3)
+        self.assertGreater(rooms['queries_mean'], 0)
+        self.assertLessEqual(rooms['p50_ms'], rooms['max_ms'])
+
+        histograms = middleware.UrlHistograms(2)
+        for total in (1.0, 2.0, 30.0):
+            histograms.record('page', total, 0.5, 1)
+        self.assertEqual(histograms.snapshot()['page']['runs'], 2)
+        self.assertEqual(histograms.snapshot()['page']['max_ms'], 30.0)
+
+    def test_metrics_are_for_managers_only(self):
+        self.assertRedirects(self.client.get('/manager/metrics/'), '/login/?next=/manager/metrics/',
+                             fetch_redirect_response=False)
+        self.client.force_login(User.objects.get(email='client1@example.com'))
+        response = self.client.get('/manager/metrics/')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('views', response.json())
+
+    def test_disabled_middleware_leaves_requests_and_templates_alone(self):
+        self.client.force_login(self.manager)
+        self.client.get('/manager/rooms/')
+        self.assertIs(DjangoTemplate.render, middleware._timed_render)
+        with override_settings(HOTEL_PERFORMANCE_ENABLED=False):
+            client = Client()
+            client.force_login(self.manager)
+            response = client.get('/manager/rooms/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Server-Timing', response)
+            self.assertIs(DjangoTemplate.render, middleware._template_render)
+        self.assertEqual(middleware.histograms.snapshot()['manager_rooms']['runs'], 1)
+
+
+# тесты идут в одном процессе, поэтому локальный кеш для них общий
+SHARED_CACHE = override_settings(
+    AUTHENTICATION_BACKENDS=['hotel.auth.CachedModelBackend', 'django.contrib.auth.backends.ModelBackend'],
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+)
+
+
+@SHARED_CACHE
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seed_hotel(3)
+        self.user = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT, discount=5)
+        self.client.force_login(self.user)
+
+    def test_warm_request_skips_session_and_user_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/users/client/')
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get('/users/client/')
+        # сессия, пользователь и брони кабинета: страница проживаний тоже кешируется
+        self.assertEqual(len(cold) - len(warm), 3)
+        self.assertFalse([query for query in warm if 'django_session' in query['sql'] or 'hotel_user' in query['sql']])
+
+    def test_process_local_cache_fails_deploy_check(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(DEBUG=False, CACHES=local):
+            self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['hotel.E001'])
+        with override_settings(DEBUG=True, CACHES=local):
+            self.assertEqual(checks.check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=shared):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+    def test_role_and_discount_changes_are_visible_immediately(self):
+        self.assertContains(self.client.get('/services/'), 'У вас есть скидка: 5')
+        self.user.discount = 12
+        self.user.save()
+        self.assertContains(self.client.get('/services/'), 'У вас есть скидка: 12')
+
+        self.assertRedirects(self.client.get('/manager/rooms/'), '/services/', fetch_redirect_response=False)
+        user = User.objects.get(pk=self.user.pk)
+        user.role = UserRole.MANAGER
+        user.save(update_fields=['role'])
+        self.assertEqual(self.client.get('/manager/rooms/').status_code, 200)
+
+    def test_deactivated_or_deleted_user_is_logged_out(self):
+        self.client.get('/services/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertRedirects(self.client.get('/users/client/'), '/login/?next=/users/client/',
+                             fetch_redirect_response=False)
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.user.delete()
+        self.assertRedirects(self.client.get('/users/client/'), '/login/?next=/users/client/',
+                             fetch_redirect_response=False)
+
+    def test_cached_user_saves_only_loaded_fields(self):
+        from .auth import cached_user
+
+        User.objects.filter(pk=self.user.pk).update(phone_number='+70000000000')
+        user = cached_user(self.user.pk)
+        user.first_name = 'Гость'
+        user.save()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual((user.first_name, user.phone_number), ('Гость', '+70000000000'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EquipmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kettle, self.safe, self.balcony = (Item.objects.create(name=name) for name in ('Чайник', 'Сейф', 'Балкон'))
+        self.standard = Category.objects.create(name='Стандарт', price=2000)
+        self.suite = Category.objects.create(name='Люкс', price=5000)
+        for category, items in ((self.standard, [self.kettle]), (self.suite, [self.kettle, self.safe, self.balcony])):
+            for item in items:
+                Equipment.objects.create(category=category, item=item)
+        self.rooms = [Room.objects.create(category=category, floor=1, room_count=1, bed_count=2)
+                      for category in (self.standard, self.suite, self.suite)]
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+
+    def summaries(self):
+        return dict(Category.objects.values_list('name', 'equipment_summary'))
+
+    def test_summary_follows_equipment_and_item_changes(self):
+        self.assertEqual(self.summaries(), {'Стандарт': ['Чайник'], 'Люкс': ['Чайник', 'Сейф', 'Балкон']})
+        moved = Equipment.objects.get(category=self.suite, item=self.safe)
+        moved.category = self.standard
+        moved.save()
+        self.kettle.name = 'Электрочайник'
+        self.kettle.save()
+        self.balcony.delete()
+        self.assertEqual(self.summaries(), {'Стандарт': ['Электрочайник', 'Сейф'], 'Люкс': ['Электрочайник']})
+        equipment.refresh_summaries()
+        self.assertEqual(self.summaries(), {'Стандарт': ['Электрочайник', 'Сейф'], 'Люкс': ['Электрочайник']})
+
+    def test_filter_any_and_all_items(self):
+        def room_ids(item_ids, match):
+            return sorted(equipment.filter_by_equipment(Room.objects.all(), item_ids, match).values_list('id', flat=True))
+
+        everyone = sorted(room.id for room in self.rooms)
+        suites = everyone[1:]
+        self.assertEqual(room_ids([self.kettle.id], equipment.MATCH_ANY), everyone)
+        self.assertEqual(room_ids([self.safe.id, self.balcony.id], equipment.MATCH_ANY), suites)
+        self.assertEqual(room_ids([self.kettle.id, self.safe.id], equipment.MATCH_ALL), suites)
+        self.assertEqual(room_ids([self.kettle.id, self.safe.id], equipment.MATCH_ANY), everyone)
+        self.assertEqual(room_ids([], equipment.MATCH_ALL), everyone)
+
+    def test_out_of_range_item_ids_are_ignored(self):
+        huge = '99999999999999999999999'
+        self.assertEqual(equipment.parse_items([huge, str(2 ** 63), '²', 'x', str(self.safe.id)]), [self.safe.id])
+        self.client.force_login(self.manager)
+        response = self.client.get('/manager/rooms/', {'item': [huge, '²'], 'match': 'all'})
+        self.assertContains(response, 'Комната №', count=len(self.rooms))
+
+    def test_room_list_is_one_query_whatever_the_equipment(self):
+        self.client.force_login(self.manager)
+        for name in range(20):
+            Equipment.objects.create(category=self.suite, item=Item.objects.create(name=f'Предмет {name}'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/manager/rooms/?item={self.safe.id}&item={self.kettle.id}&match=all')
+        self.assertContains(response, 'Предмет 19')
+        self.assertContains(response, 'Комната №', count=2)
+        self.assertEqual(len([query for query in queries if 'hotel_room' in query['sql']]), 1)
+        self.assertFalse([query for query in queries if 'hotel_equipment' in query['sql']
+                          and 'hotel_room' not in query['sql']])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QuoteTests(TestCase):
+    def setUp(self):
+        # понедельник, чтобы выходные попали в середину проживания
+        self.today = timezone.now().date()
+        self.check_in = self.today - timedelta(days=self.today.weekday())
+        self.check_out = self.check_in + timedelta(days=16)
+        self.standard = Category.objects.create(name='Стандарт', price=Decimal('2999.99'))
+        self.suite = Category.objects.create(name='Люкс', price=Decimal('7333.33'))
+        self.rooms = [Room.objects.create(category=category, floor=1, room_count=1, bed_count=2)
+                      for category in (self.standard, self.suite, self.suite)]
+        RateRule.objects.create(name='Выходные', weekdays='56', percent=Decimal('117.50'))
+        RateRule.objects.create(name='Сезон', start_date=self.check_in + timedelta(days=3),
+                                end_date=self.check_in + timedelta(days=9), percent=Decimal('133.33'))
+        RateRule.objects.create(name='Акция', category=self.suite, percent=Decimal('91.15'), priority=1)
+        RateRule.objects.create(name='Прошлое', end_date=self.check_in - timedelta(days=1), percent=Decimal('300'))
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+
+    def expected(self, discount):
+        rooms = [(room.id, room.category_id, room.category.price) for room in self.rooms]
+        return quotes.quote_decimal(rooms, RateRule.objects.all(), self.check_in, self.check_out, discount)
+
+    def test_engines_match_decimal_computation(self):
+        for discount in (Decimal('0'), Decimal('12.5'), Decimal('7.77')):
+            expected = self.expected(discount)
+            for engine in quotes.ENGINES:
+                with self.subTest(engine=engine, discount=discount):
+                    with self.assertNumQueries(2):
+                        result = quotes.quote(self.check_in, self.check_out, discount=discount, engine=engine)
+                    self.assertEqual(list(result.rows()), expected)
+        # правила действительно меняют цену
+        nightly = expected[1]['nightly']
+        self.assertNotEqual(nightly[0], self.suite.price)
+        self.assertNotEqual(nightly[5], nightly[0])
+
+    def test_filters_and_empty_calendar(self):
+        result = quotes.quote(self.check_in, self.check_out, category_id=self.standard.id)
+        self.assertEqual(result.room_ids, [self.rooms[0].id])
+        RateRule.objects.all().delete()
+        result = quotes.quote(self.check_in, self.check_in + timedelta(days=2), room_ids=[self.rooms[1].id])
+        self.assertEqual(list(result.rows())[0]['total'], Decimal('14666.66'))
+        self.assertEqual(quotes.quote(self.check_in, self.check_in).totals, [0, 0, 0])
+
+    def test_api(self):
+        guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT, discount=Decimal('12.5'))
+        url = (f'/manager/api/quotes/?check_in={self.check_in}&check_out={self.check_out}'
+               f'&room={self.rooms[1].id}&guest={guest.id}')
+        self.client.force_login(guest)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.manager)
+        data = self.client.get(url).json()
+        expected = self.expected(guest.discount)[1]
+        self.assertEqual(len(data['nights']), 16)
+        self.assertEqual(data['rooms'], [{
+            'room_id': self.rooms[1].id,
+            'nightly': [str(amount) for amount in expected['nightly']],
+            'total': str(expected['total']),
+            'due': str(expected['due']),
+        }])
+        self.assertEqual(data['due'], str(expected['due']))
+        response = self.client.get(f'/manager/api/quotes/?check_in={self.check_out}&check_out={self.check_in}')
+        self.assertEqual(response.status_code, 400)
+        dates = {'check_in': self.check_in, 'check_out': self.check_out}
+        for name in ('room', 'category', 'guest'):
+            for value in ('99999999999999999999999', str(2 ** 63), 'abc'):
+                with self.subTest(name=name, value=value):
+                    response = self.client.get('/manager/api/quotes/', {**dates, name: value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(value, response.json()['error'])
+        response = self.client.get('/manager/api/quotes/', {**dates, 'room': str(2 ** 63 - 1)})
+        self.assertEqual(response.json()['rooms'], [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seed_hotel(3)
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        self.guest = User.objects.create_user('guest@example.com', 'pass', role=UserRole.CLIENT, discount=5)
+
+    def test_unchanged_catalog_answers_not_modified(self):
+        self.client.force_login(self.guest)
+        response = self.client.get('/services/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries if 'hotel_service' in query['sql']])
+
+        Service.objects.create(name='Новая услуга', cost=50, is_active=True)
+        response = self.client.get('/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новая услуга')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_price_change_while_rendering_is_not_cached_as_fresh(self):
+        service = Service.objects.filter(is_active=True).first()
+
+        def racing(discount):
+            services = catalog.price_list(discount)
+            # другой процесс меняет цену, пока страница собирается
+            Service.objects.filter(pk=service.pk).update(cost=Decimal('4321'))
+            watermarks.touch(Service)
+            catalog.bump_version()
+            return services
+
+        with mock.patch('hotel.views.price_list', side_effect=racing):
+            self.assertNotContains(self.client.get('/services/'), '4321')
+        self.assertContains(self.client.get('/services/'), '4321')
+
+    def test_etag_depends_on_role_and_discount(self):
+        anonymous = self.client.get('/services/')['ETag']
+        self.client.force_login(self.guest)
+        response = self.client.get('/services/', HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.guest.discount = 15
+        self.guest.save()
+        response = self.client.get('/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'У вас есть скидка: 15')
+
+    def test_pending_messages_disable_not_modified(self):
+        self.client.force_login(self.guest)
+        etag = self.client.get('/services/')['ETag']
+        self.client.get('/manager/rooms/')
+        response = self.client.get('/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Access denied.')
+        self.assertEqual(self.client.get('/services/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_demoted_manager_is_not_served_cached_rooms(self):
+        self.client.force_login(self.manager)
+        etag = self.client.get('/manager/rooms/')['ETag']
+        self.assertEqual(self.client.get('/manager/rooms/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.manager.role = UserRole.CLIENT
+        self.manager.save()
+        response = self.client.get('/manager/rooms/', HTTP_IF_NONE_MATCH=etag)
+        self.assertRedirects(response, '/services/', fetch_redirect_response=False)
+
+    def test_room_fragments_are_cached_until_rooms_change(self):
+        self.client.force_login(self.manager)
+        self.client.get('/manager/rooms/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/manager/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'hotel_room' in query['sql']])
+
+        room = Room.objects.first()
+        room.floor = 17
+        room.save()
+        self.assertContains(self.client.get('/manager/rooms/'), '17 этаж')
+        Item.objects.filter(pk=Equipment.objects.filter(category=room.category).values('item')[:1]).get().delete()
+        html = self.client.get('/manager/rooms/').content.decode()
+        self.assertEqual(html.count('<li>Предмет'), sum(
+            Equipment.objects.filter(category_id=room.category_id).count() for room in Room.objects.all()
+        ))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        seed_hotel(3)
+        self.manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        self.client.force_login(self.manager)
+        self.router = db_router.PrimaryReplicaRouter()
+
+    def read_aliases(self, method, path, data=None):
+        """Какой алиас чтения был выбран во время запросов страницы."""
+        seen = []
+
+        def spy(execute, sql, params, many, context):
+            seen.append(db_router._read_alias.get())
+            return execute(sql, params, many, context)
+
+        # «реплика» — та же тестовая база, важно лишь, что её выбрал middleware
+        with mock.patch.object(db_router, 'replica_alias', return_value='default'), connection.execute_wrapper(spy):
+            response = getattr(self.client, method)(path, data)
+        return response, set(seen)
+
+    def test_router_reads_from_selected_alias_and_writes_to_primary(self):
+        db_router._read_alias.set('replica')
+        try:
+            # TestCase сам держит открытую транзакцию — внутри неё чтение идёт на основную базу
+            self.assertEqual(self.router.db_for_read(Booking), 'default')
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(self.router.db_for_read(Booking), 'replica')
+                self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.assertEqual(self.router.db_for_write(Booking), 'default')
+        finally:
+            db_router._read_alias.set(None)
+        self.assertEqual(self.router.db_for_read(Booking), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'hotel'))
+
+    def test_read_only_views_use_replica_and_others_primary(self):
+        response, aliases = self.read_aliases('get', '/manager/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', aliases)
+        _, aliases = self.read_aliases('get', '/manager/')
+        self.assertEqual(aliases, {None})
+        self.assertIsNone(db_router._read_alias.get())
+
+    def test_post_makes_following_reads_sticky_to_primary(self):
+        response, aliases = self.read_aliases('post', '/manager/add-service/', {})
+        self.assertEqual(aliases, {None})
+        self.assertIn(db_router.STICKY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[db_router.STICKY_COOKIE]['max-age'], settings.HOTEL_REPLICA_STICKY_SECONDS)
+        _, aliases = self.read_aliases('get', '/manager/rooms/')
+        self.assertEqual(aliases, {None})
+
+    def test_streaming_export_reads_from_replica(self):
+        with mock.patch.object(db_router, 'replica_alias', return_value='default'):
+            response = self.client.get('/manager/export/bookings/')
+        seen = []
+
+        def spy(execute, sql, params, many, context):
+            seen.append(db_router._read_alias.get())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(spy):
+            b''.join(response.streaming_content)
+        self.assertEqual(set(seen), {'default'})
+        self.assertIsNone(db_router._read_alias.get())
+
+    async def test_asgi_streaming_export_reads_from_replica(self):
+        await self.async_client.aforce_login(self.manager)
+        with mock.patch.object(db_router, 'replica_alias', return_value='default'):
+            response = await self.async_client.get('/manager/export/bookings/')
+        seen = []
+        db_for_read = db_router.PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            seen.append(db_router._read_alias.get())
+            return db_for_read(router, model, **hints)
+
+        with mock.patch.object(db_router.PrimaryReplicaRouter, 'db_for_read', spy):
+            content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.splitlines()), 4)
+        self.assertEqual(set(seen), {'default'})
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        health = db_router.ReplicaHealth()
+        with mock.patch.object(health, 'check', return_value=False) as check:
+            self.assertFalse(health.is_healthy('replica'))
+            self.assertFalse(health.is_healthy('replica'))
+        # результат проверки кешируется на HOTEL_REPLICA_CHECK_INTERVAL
+        self.assertEqual(check.call_count, 1)
+        self.assertTrue(health.check('default'))
+        with override_settings(HOTEL_REPLICA_ALIAS='missing'):
+            self.assertIsNone(db_router.replica_alias())
+
+
+@skipUnless('replica' in settings.DATABASES, 'Реплика не настроена (DJANGO_REPLICA или DJANGO_REPLICA_HOST)')
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReplicaDatabaseTests(TransactionTestCase):
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def test_reads_hit_replica_connection(self):
+        seed_hotel(3)
+        manager = User.objects.create_user('manager@example.com', 'pass', role=UserRole.MANAGER)
+        self.client.force_login(manager)
+        db_router.health.checked.clear()
+        with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+            response = self.client.get('/manager/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(replica), 0)
+        # на основной базе — только сессия и пользователь
+        self.assertTrue(all('django_session' in query['sql'] or 'hotel_user' in query['sql'] for query in primary))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GeneratorTests(TestCase):
+    SIZE = {'rooms': 4, 'categories': 2, 'items': 3, 'services': 5, 'guests': 6, 'years': 1, 'seed': 7}
+
+    def generate(self, **options):
+        call_command('generate_hotel', **{**self.SIZE, **options}, stdout=io.StringIO())
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('email').values_list('email', 'first_name', 'phone_number', 'discount',
+                                                            'document__issue_date')),
+            list(Booking.objects.order_by('room__floor', 'check_in_date', 'guest__email').values_list(
+                'guest__email', 'check_in_date', 'check_out_date', 'total_cost', 'paid_amount')),
+            sorted(ServiceProvision.objects.values_list('booking__check_in_date', 'service__name', 'service_date',
+                                                        'quantity')),
+        )
+
+    def test_generated_hotel_has_requested_size_and_repeats_by_seed(self):
+        with transaction.atomic():
+            self.generate(until='2026-01-31')
+            self.assertEqual((Category.objects.count(), Room.objects.count(), Item.objects.count(),
+                              Service.objects.count(), User.objects.count()), (2, 4, 3, 5, 6))
+            self.assertTrue(Booking.objects.exists())
+            self.assertFalse(Booking.objects.filter(check_in_date__gte=date(2026, 1, 31)).exists())
+            self.assertFalse(User.objects.filter(document__issue_date__gt=date(2025, 1, 31)).exists())
+            self.assertEqual(stats.get_dashboard_stats(), stats.live_counts())
+            first = self.snapshot()
+            transaction.set_rollback(True)
+        self.generate(until='2026-01-31')
+        self.assertEqual(self.snapshot(), first)
+        with self.assertRaisesMessage(CommandError, '--seed 7'):
+            self.generate(until='2026-01-31')
+        with self.assertRaisesMessage(CommandError, '--until'):
+            self.generate(until='2026-13-01', seed=8)
+
+    def test_benchmark_views_runs_every_page(self):
+        self.generate(until=str(timezone.now().date() + timedelta(days=30)), rooms=10, guests=20)
+        stdout = io.StringIO()
+        call_command('benchmark_views', requests=1, warmup=0, host='testserver', stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(len(report['views']), len(BENCHMARK_VIEWS))
+        for view in report['views']:
+            with self.subTest(path=view['path']):
+                self.assertEqual(view['status'], 200)
+                self.assertEqual(view['runs'], 1)
+
+
+def seed_hotel(size, today=None):
+    today = today or timezone.now().date()
+    items = [Item.objects.create(name=f'Предмет {i}') for i in range(size)]
+    categories = []
+    for i in range(3):
+        category = Category.objects.create(name=f'Категория {i}', price=2000 + 1000 * i)
+        for item in items:
+            Equipment.objects.create(category=category, item=item)
+        categories.append(category)
+
+    services = [
+        Service.objects.create(name=f'Услуга {i}', cost=100 + i, description='Описание', is_active=i % 5 != 0)
+        for i in range(size)
+    ]
+    for i in range(size):
+        room = Room.objects.create(category=categories[i % 3], floor=i % 5 + 1, room_count=1, bed_count=i % 4 + 1)
+        client = User.objects.create_user(
+            f'client{i}@example.com', 'pass', first_name=f'Клиент {i}', role=UserRole.CLIENT, discount=i % 20,
+        )
+        booking = Booking.objects.create(
+            guest=client, room=room, check_in_date=today - timedelta(days=1),
+            check_out_date=today + timedelta(days=2), total_cost=6000,
+        )
+        ServiceProvision.objects.create(booking=booking, service=services[i], quantity=1, service_date=today)
+    stats.rebuild(today)
+
+
+@SHARED_CACHE
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(TestCase):
+    SIZES = (3, 25)
+    LATENCY_CEILING_MS = float(os.environ.get('HOTEL_VIEW_LATENCY_MS', 500))
+
+    ROLES = ('anonymous', UserRole.GUEST, UserRole.CLIENT, UserRole.MANAGER, UserRole.ADMIN)
+    STAFF = (UserRole.MANAGER, UserRole.ADMIN)
+
+    # (путь, роли с доступом, максимум запросов для них)
+    # Остальные роли получают редирект не дороже REDIRECT_BUDGET запросов.
+    VIEWS = [
+        ('/', ROLES, 2),
+        ('/login/', ROLES, 2),
+        ('/register/', ROLES, 2),
+        ('/logout/', ROLES, 4),
+        ('/admin/', (), 2),
+        ('/services/', ROLES, 3),
+        ('/users/client/', (UserRole.CLIENT, UserRole.MANAGER, UserRole.ADMIN), 3),
+        ('/users/client/api/stays/', (UserRole.CLIENT, UserRole.MANAGER, UserRole.ADMIN), 3),
+        ('/users/manager/', STAFF, 2),
+        ('/manager/', STAFF, 3),
+        ('/manager/clients/', STAFF, 3),
+        ('/manager/clients/?sort=-first_name&search=Клиент', STAFF, 3),
+        ('/manager/services/', STAFF, 3),
+        ('/manager/services/?search=Услуга', STAFF, 3),
+        ('/manager/rooms/', STAFF, 5),
+        ('/manager/rooms/?item=1&item=2&match=all', STAFF, 5),
+        ('/manager/availability/?check_in={today}&check_out={later}&bed_count=2', STAFF, 4),
+        ('/manager/reports/?months=3', STAFF, 5),
+        ('/manager/folios/', STAFF, 3),
+        ('/manager/folios/?in_house=1&debtors=1', STAFF, 3),
+        ('/manager/folios/?archived=1', STAFF, 3),
+        ('/manager/folios/{booking}/', STAFF, 4),
+        ('/manager/api/folios/?in_house=1&debtors=1', STAFF, 3),
+        ('/manager/api/quotes/?check_in={today}&check_out={later}', STAFF, 4),
+        ('/manager/jobs/', STAFF, 3),
+        ('/manager/api/jobs/?ids=1,2,3', STAFF, 3),
+        ('/manager/jobs/{job}/file/', STAFF, 3),
+        ('/manager/export/bookings/?format=ndjson&start={today}&role=client', STAFF, 2),
+        ('/manager/add-service/', STAFF, 2),
+        ('/manager/api/clients/?q=Кл', STAFF, 3),
+        ('/manager/api/services/?q=Усл', STAFF, 3),
+        ('/manager/metrics/', STAFF, 2),
+    ]
+    # POST: (путь, роли с доступом, максимум запросов, метод теста, строящий запрос)
+    WRITES = [
+        ('/manager/add-service/batch/', STAFF, 12, 'batch_request'),
+        ('/manager/api/bookings/', STAFF, 14, 'booking_request'),
+    ]
+    REDIRECT_BUDGET = 2
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def batch_request(self, role, today):
+        # строка на каждого клиента: N+1 по строкам даст разное число запросов на разных размерах
+        service = Service.objects.order_by('id').first()
+        lines = [f'{client_id};{service.id};{today};1'
+                 for client_id in User.objects.filter(role=UserRole.CLIENT).values_list('id', flat=True)]
+        return {'data': {'lines': '\n'.join(lines)}}
+
+    def booking_request(self, role, today):
+        # у каждой роли свои даты, чтобы брони не пересекались
+        check_in = today + timedelta(days=30 + 10 * self.ROLES.index(role))
+        payload = {'guest_id': User.objects.filter(role=UserRole.CLIENT).order_by('id').first().id,
+                   'room_id': Room.objects.order_by('id').first().id,
+                   'check_in': str(check_in), 'check_out': str(check_in + timedelta(days=2))}
+        return {'data': json.dumps(payload), 'content_type': 'application/json'}
+
+    def done_job(self):
+        name = default_storage.save('jobs/budget.csv', io.BytesIO(b'a,b\n'))
+        return Job.objects.create(kind='export', status=JobStatus.DONE, run_after=timezone.now(),
+                                  result={'file': name})
+
+    def login_as(self, role):
+        client = Client()
+        if role != 'anonymous':
+            user = User.objects.create_user(f'{role}-{User.objects.count()}@example.com', 'pass', role=role)
+            client.force_login(user)
+        return client
+
+    def measure(self, client, method, path, **kwargs):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+        return response, len(queries), elapsed
+
+    def run_views(self):
+        today = timezone.now().date()
+        ids = {'booking': Booking.objects.order_by('id').first().id, 'job': self.done_job().id}
+        requests = [('get', path, allowed, budget, None) for path, allowed, budget in self.VIEWS]
+        requests += [('post', path, allowed, budget, build) for path, allowed, budget, build in self.WRITES]
+        results = {}
+        for method, path, allowed, budget, build in requests:
+            path = path.format(today=today, later=today + timedelta(days=3), **ids)
+            for role in self.ROLES:
+                kwargs = getattr(self, build)(role, today) if build else {}
+                response, count, elapsed = self.measure(self.login_as(role), method, path, **kwargs)
+                limit = budget if role in allowed else self.REDIRECT_BUDGET
+                with self.subTest(path=path, role=role):
+                    self.assertIn(response.status_code, (200, 201, 302, 403))
+                    if method == 'post' and role in allowed:
+                        self.assertIn(response.status_code, (201, 302), f'{path} as {role}')
+                    self.assertLessEqual(count, limit, f'{path} as {role}: {count} queries')
+                    self.assertLess(elapsed, self.LATENCY_CEILING_MS, f'{path} as {role}: {elapsed:.1f} ms')
+                results[path, role] = count
+        return results
+
+    def test_query_counts_do_not_grow_with_data(self):
+        counts = []
+        for size in self.SIZES:
+            with transaction.atomic():
+                seed_hotel(size)
+                counts.append(self.run_views())
+                # пакет услуг записан каждому клиенту, а не отклонён
+                self.assertEqual(ServiceProvision.objects.filter(service=Service.objects.order_by('id').first(),
+                                                                 quantity__gt=1).count(), size)
+                transaction.set_rollback(True)
+        small, large = counts
+        for key in small:
+            with self.subTest(path=key[0], role=key[1]):
+                self.assertEqual(small[key], large[key], f'{key[0]} as {key[1]} grows with data size')
+
+    def test_batch_provisions_use_constant_queries(self):
+        seed_hotel(30)
+        today = timezone.now().date().isoformat()
+        clients = User.objects.filter(role=UserRole.CLIENT).values_list('id', flat=True)
+        service = Service.objects.first()
+        manager = self.login_as(UserRole.MANAGER)
+
+        counts = []
+        for lines in (1, 30):
+            payload = {'lines': [
+                {'client_id': client_id, 'service_id': service.id, 'service_date': today, 'quantity': 1}
+                for client_id in clients[:lines]
+            ]}
+            response, count, _ = self.measure(
+                manager, 'post', '/manager/api/service-provisions/',
+                data=json.dumps(payload), content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['errors'], [])
+            counts.append(count)
+        self.assertEqual(counts[0], counts[1])
@@ -1,10 +1,51 @@
+import csv
+import io
+import json
+import os
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
 from django.utils import timezone
+from django.db import connection
 from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Service, User, UserRole, Booking, Category, Room, ServiceProvision, Document
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_POST
+from django.utils.dateparse import parse_date
+from .models import Service, User, UserRole, Booking, Category, Room, ServiceProvision, Document, Equipment, Item, Job, JobStatus
+from . import equipment, exports, jobs, portal, quotes
+from .autocomplete import SUGGESTIONS_TIMEOUT, client_suggestions, service_suggestions
+from .availability import find_available_rooms
+from .catalog import price_list
+from .folio import folio_lines, folios
+from .middleware import histograms
+from .pagination import keyset_paginate
+from .search import CLIENT_FIELDS, matches, search_services
+from .provisions import parse_line, provide_services
+from .reservations import BookingConflict, parse_request, reserve
+from .rollups import monthly_report, months_start, top_services
+from .stats import aget_dashboard_stats
+from .watermarks import FRAGMENT_TIMEOUT, conditional, watermark
+
+CLIENT_CARD_FIELDS = ['id', 'first_name', 'email', 'phone_number', 'date_joined', 'is_active', 'role']
+
+
+async def _auser(request):
+    # В async-view ленивый request.user нельзя трогать из шаблона и
+    # контекст-процессоров (синхронный запрос к базе), поэтому он
+    # заменяется уже загруженным пользователем
+    request.user = await request.auser()
+    return request.user
+
+
+async def _alist(queryset):
+    return [item async for item in queryset]
 
 
 def login_view(request):
@@ -48,28 +89,30 @@ def logout_view(request):
     return redirect('login')
 
 
-def services_list(request):
-    services = Service.objects.filter(is_active=True).all()
+def _catalog_etag(request):
+    # от пользователя на странице зависят только кнопки входа и цены со скидкой
+    user = request.user
+    return f'{user.role}-{user.discount}' if user.is_authenticated else 'anonymous'
+
+
+@conditional(Service, etag_func=_catalog_etag)
+async def services_list(request):
+    user = await _auser(request)
+    discount = 0
+    if user.is_authenticated and user.role == 'client':
+        discount = user.discount
+    # отметка читается до каталога: цена, сменившаяся между ними, даст новую отметку
+    # при следующем запросе, а не закеширует старые карточки под новой
+    service_watermark = await sync_to_async(watermark)(Service)
+    services = await sync_to_async(price_list)(discount)
     user_data = None
-    services_with_discount = []
-    for service in services:
-        discounted_price = service.cost
-        if request.user.is_authenticated and request.user.role == 'client':
-            discounted_price = request.user.calculate_price_with_discount(service.cost)
-
-            services_with_discount.append({
-                'service': service,
-                'original_price': service.cost,
-                'discounted_price': discounted_price,
-                'has_discount': request.user.discount > 0 if request.user.is_authenticated else False,
-            })
-    if request.user.is_authenticated:
+    if user.is_authenticated:
         # Для всех авторизованных пользователей
         user_data = {
-            'discount': float(request.user.discount),
-            'has_discount': request.user.discount > 0,
-            'discount_more_than_10': request.user.discount > 10,
-            'is_guest': request.user.role == UserRole.GUEST
+            'discount': float(user.discount),
+            'has_discount': user.discount > 0,
+            'discount_more_than_10': user.discount > 10,
+            'is_guest': user.role == UserRole.GUEST
         }
     else:
         # Для неавторизованных гостей
@@ -81,9 +124,11 @@ def services_list(request):
         }
     return render(request, 'services/list.html', {
         'services': services,
-        'user': request.user,
+        'user': user,
         'user_data': user_data,
-        'services_with_discount': services_with_discount
+        'watermark': service_watermark,
+        'discount_tier': discount,
+        'fragment_timeout': FRAGMENT_TIMEOUT,
     })
 
 @login_required
@@ -94,12 +139,41 @@ def manager(request):
     clients = User.objects.filter(role='client')
     return render(request, 'users/manager/manager.html', {'clients': clients})
 
+CLIENT_ROLES = [UserRole.ADMIN, UserRole.MANAGER, UserRole.CLIENT]
+
+
+def _stays_etag(request):
+    # версия своя у каждого гостя; дата — потому что статус проживания меняется со временем
+    return f'{request.user.role}-{portal.version(request.user)}-{timezone.now().date()}'
+
+
+def _client_stays(request):
+    return portal.stays(
+        request.user,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        archived=request.GET.get('archived') == '1',
+    )
+
+
 @login_required
+@conditional(*portal.MODELS, etag_func=_stays_etag, last_modified=False)
 def client(request):
-    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER, UserRole.CLIENT]:
+    if request.user.role not in CLIENT_ROLES:
         messages.error(request, 'Access denied.')
         return redirect('services_list')
-    return render(request, 'users/client.html')
+    return render(request, 'users/client.html', {
+        'page': _client_stays(request),
+        'archived': request.GET.get('archived') == '1',
+    })
+
+
+@login_required
+@conditional(*portal.MODELS, etag_func=_stays_etag, last_modified=False)
+def client_stays_api(request):
+    if request.user.role not in CLIENT_ROLES:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    return JsonResponse(_client_stays(request))
 
 
 def register_view(request):
@@ -140,25 +214,15 @@ def register_view(request):
     return render(request, 'auth/register.html')
 
 @login_required
-def manager_dashboard(request):
-    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+async def manager_dashboard(request):
+    user = await _auser(request)
+    if user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
         messages.error(request, 'Access denied.')
         return redirect('services_list')
 
-    total_clients = User.objects.filter(role=UserRole.CLIENT).count()
-    total_services = Service.objects.count()
-    total_rooms = Room.objects.count()
-    active_bookings = Booking.objects.filter(
-        check_in_date__lte=timezone.now().date(),
-        check_out_date__gte=timezone.now().date()
-    ).count()
-
-    return render(request, 'users/manager/manager_dashboard.html', {
-        'total_clients': total_clients,
-        'total_services': total_services,
-        'total_rooms': total_rooms,
-        'active_bookings': active_bookings
-    })
+    stats = await aget_dashboard_stats()
+
+    return render(request, 'users/manager/manager_dashboard.html', stats)
 
 
 @login_required
@@ -167,45 +231,64 @@ def manager_clients(request):
         messages.error(request, 'Доступ запрещен.')
         return redirect('services_list')
     sort_by = request.GET.get('sort', 'first_name')
-    clients = User.objects.filter(role=UserRole.CLIENT)
+    if sort_by not in ['first_name', '-first_name']:
+        sort_by = 'first_name'
+    search_query = request.GET.get('search', '').strip()
+    clients = User.objects.filter(role=UserRole.CLIENT).only(*CLIENT_CARD_FIELDS)
+    if search_query:
+        clients = clients.filter(matches(search_query, CLIENT_FIELDS))
 
-    if sort_by == 'first_name':
-        clients = clients.order_by('first_name')
-    elif sort_by == '-first_name':
-        clients = clients.order_by('-first_name')
-    else:
-        clients = clients.order_by('first_name')
+    page = keyset_paginate(
+        clients,
+        ['first_name', 'id'],
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        descending=sort_by == '-first_name',
+    )
 
     return render(request, 'users/manager/manager_clients.html', {
-        'clients': clients,
+        'clients': page,
+        'page': page,
         'sort_by': sort_by,
+        'search_query': search_query,
     })
 
 @login_required
-def manager_services(request):
-    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+async def manager_services(request):
+    user = await _auser(request)
+    if user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
         messages.error(request, 'Access denied.')
         return redirect('services_list')
     search_query = request.GET.get('search', '')
     services = Service.objects.all()
-    if search_query:
-        services = services.filter(name__icontains=search_query)
+    if search_query.strip():
+        services = search_services(search_query, limit=None)
 
     return render(request, 'users/manager/manager_services.html', {
-        'services': services,
+        'services': await _alist(services),
         'search_query': search_query
     })
 
+def _digits(value):
+    return value if value.isdigit() else ''
+
+
 @login_required
-def manager_rooms(request):
-    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+@conditional(Room, Category, Equipment, Item, etag_func=lambda request: request.user.role)
+async def manager_rooms(request):
+    user = await _auser(request)
+    if user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
         messages.error(request, 'Access denied.')
         return redirect('services_list')
 
-    rooms = Room.objects.select_related('category').prefetch_related('category__equipment__item')
-    categories = Category.objects.all()
-    bed_filter = request.GET.get('bed_count', '')
-    category_filter = request.GET.get('category', '')
+    # оборудование берётся из Category.equipment_summary: один запрос на список
+    rooms = Room.objects.select_related('category')
+    categories = Category.objects.only('id', 'name')
+    # нечисловые фильтры из адресной строки игнорируются, как пустые
+    bed_filter = _digits(request.GET.get('bed_count', ''))
+    category_filter = _digits(request.GET.get('category', ''))
+    item_filter = equipment.parse_items(request.GET.getlist('item'))
+    match = equipment.MATCH_ALL if request.GET.get('match') == equipment.MATCH_ALL else equipment.MATCH_ANY
 
     if bed_filter:
         if bed_filter == '4':
@@ -216,14 +299,369 @@ def manager_rooms(request):
     if category_filter:
         rooms = rooms.filter(category_id=category_filter)
 
-    return render(request, 'users/manager/manager_rooms.html', {
+    rooms = equipment.filter_by_equipment(rooms, item_filter, match)
+
+    # querysets ленивые: если фрагменты шаблона есть в кеше, запросов нет,
+    # поэтому шаблон рендерится в потоке, где разрешён синхронный ORM
+    return await sync_to_async(render)(request, 'users/manager/manager_rooms.html', {
         'rooms': rooms,
         'categories': categories,
         'bed_filter': bed_filter,
         'category_filter': category_filter,
+        'items': Item.objects.order_by('name'),
+        'item_filter': item_filter,
+        'match': match,
+        'watermark': await sync_to_async(watermark)(Room, Category, Equipment, Item),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+    })
+
+
+@login_required
+def manager_availability(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        messages.error(request, 'Access denied.')
+        return redirect('services_list')
+
+    check_in = request.GET.get('check_in', '')
+    check_out = request.GET.get('check_out', '')
+    bed_filter = _digits(request.GET.get('bed_count', ''))
+    category_filter = _digits(request.GET.get('category', ''))
+    rooms = None
+
+    if check_in and check_out:
+        try:
+            check_in_date = parse_date(check_in)
+            check_out_date = parse_date(check_out)
+        except ValueError:
+            check_in_date = check_out_date = None
+        if not check_in_date or not check_out_date:
+            messages.error(request, 'Некорректный формат даты')
+        elif check_in_date >= check_out_date:
+            messages.error(request, 'Дата выезда должна быть позже даты заезда')
+        else:
+            rooms = find_available_rooms(
+                check_in_date,
+                check_out_date,
+                bed_count=int(bed_filter) if bed_filter else None,
+                category_id=category_filter or None,
+            )
+
+    return render(request, 'users/manager/manager_availability.html', {
+        'rooms': rooms,
+        'categories': Category.objects.all(),
+        'check_in': check_in,
+        'check_out': check_out,
+        'bed_filter': bed_filter,
+        'category_filter': category_filter,
+    })
+
+
+@login_required
+def manager_reports(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        messages.error(request, 'Access denied.')
+        return redirect('services_list')
+
+    months = request.GET.get('months', '12')
+    months = min(int(months), 120) if months.isdigit() and int(months) > 0 else 12
+    end = timezone.now().date()
+    start = months_start(end, months)
+
+    return render(request, 'users/manager/manager_reports.html', {
+        'rows': monthly_report(start, end),
+        'top_services': top_services(start, end),
+        'months': months,
+        'start': start,
+        'end': end,
+    })
+
+
+def _folio_filters(request):
+    return {
+        'in_house_only': request.GET.get('in_house') == '1',
+        'debtors_only': request.GET.get('debtors') == '1',
+        'archived': request.GET.get('archived') == '1',
+    }
+
+
+@login_required
+def manager_folios(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        messages.error(request, 'Access denied.')
+        return redirect('services_list')
+
+    filters = _folio_filters(request)
+    page = keyset_paginate(
+        folios(**filters),
+        ['check_in_date', 'id'],
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        descending=True,
+    )
+    return render(request, 'users/manager/manager_folios.html', {
+        'bookings': page,
+        'page': page,
+        **filters,
+    })
+
+
+@login_required
+def manager_folio(request, booking_id):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        messages.error(request, 'Access denied.')
+        return redirect('services_list')
+
+    # прошедшие проживания могли уйти в архив (hotel.archive) с тем же id
+    booking = folios(booking_ids=[booking_id]).first() or get_object_or_404(folios(archived=True), id=booking_id)
+    return render(request, 'users/manager/manager_folio.html', {
+        'booking': booking,
+        'lines': folio_lines(booking),
+    })
+
+
+@login_required
+def folios_api(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    booking_ids = None
+    if request.GET.get('ids'):
+        booking_ids = [value for value in request.GET['ids'].split(',') if value.strip().isdigit()]
+    page = keyset_paginate(
+        folios(booking_ids=booking_ids, **_folio_filters(request)),
+        ['check_in_date', 'id'],
+        after=request.GET.get('after'),
+        descending=True,
+        size=200,
+    )
+    return JsonResponse({
+        'results': [
+            {
+                'booking_id': booking.id,
+                'guest_id': booking.guest_id,
+                'guest': booking.guest.first_name,
+                'room_id': booking.room_id,
+                'check_in_date': booking.check_in_date.isoformat(),
+                'check_out_date': booking.check_out_date.isoformat(),
+                'total_cost': str(booking.total_cost),
+                'services_total': str(booking.services_total),
+                'services_due': str(booking.services_due),
+                'amount_due': str(booking.amount_due),
+                'paid_amount': str(booking.paid_amount),
+                'balance': str(booking.balance),
+            }
+            for booking in page
+        ],
+        'next': page.next_cursor,
     })
 
 
+def _parse_id(value):
+    # число больше первичного ключа база не примет: OverflowError вместо пустого ответа
+    _, max_id = connection.ops.integer_field_range('BigAutoField')
+    if not value.isdecimal() or int(value) > max_id:
+        raise ValueError(f'Некорректный id: {value}')
+    return int(value)
+
+
+@login_required
+def quotes_api(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    try:
+        check_in = parse_date(request.GET.get('check_in', ''))
+        check_out = parse_date(request.GET.get('check_out', ''))
+    except ValueError:
+        check_in = check_out = None
+    if not check_in or not check_out or check_out <= check_in:
+        return JsonResponse({'error': 'Укажите даты заезда и выезда (выезд позже заезда).'}, status=400)
+    if (check_out - check_in).days > quotes.MAX_NIGHTS:
+        return JsonResponse({'error': f'Не больше {quotes.MAX_NIGHTS} ночей.'}, status=400)
+
+    try:
+        room_ids = [_parse_id(value) for value in request.GET.getlist('room') if value] or None
+        category_id = _parse_id(request.GET['category']) if request.GET.get('category') else None
+        guest_id = _parse_id(request.GET['guest']) if request.GET.get('guest') else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    discount = 0
+    if guest_id is not None:
+        discount = User.objects.filter(pk=guest_id).values_list('discount', flat=True).first() or 0
+
+    quote = quotes.quote(check_in, check_out, room_ids=room_ids, category_id=category_id, discount=discount)
+    rows = list(quote.rows())
+    return JsonResponse({
+        'check_in': check_in.isoformat(),
+        'check_out': check_out.isoformat(),
+        'nights': [night.isoformat() for night in quote.nights],
+        'discount': str(discount),
+        'rooms': [
+            {
+                'room_id': row['room_id'],
+                'nightly': [str(amount) for amount in row['nightly']],
+                'total': str(row['total']),
+                'due': str(row['due']),
+            }
+            for row in rows
+        ],
+        'total': str(sum((row['total'] for row in rows), Decimal('0.00'))),
+        'due': str(sum((row['due'] for row in rows), Decimal('0.00'))),
+    })
+
+
+@login_required
+@require_POST
+def bookings_api(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    data = request.POST
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Ожидается JSON-объект'}, status=400)
+    try:
+        booking = reserve(parse_request(data))
+    except BookingConflict as e:
+        return JsonResponse({'error': str(e), 'room_id': e.room_id}, status=409)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'booking_id': booking.id,
+        'guest_id': booking.guest_id,
+        'room_id': booking.room_id,
+        'check_in_date': booking.check_in_date.isoformat(),
+        'check_out_date': booking.check_out_date.isoformat(),
+        'total_cost': str(booking.total_cost),
+        'paid_amount': str(booking.paid_amount),
+    }, status=201)
+
+
+@login_required
+def export_data(request, name):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    export_format = request.GET.get('format', 'csv')
+    if name not in exports.EXPORTS or export_format not in exports.FORMATS:
+        return JsonResponse({'error': 'Неизвестная выгрузка или формат'}, status=404)
+    try:
+        filters = exports.parse_filters(request.GET.get('start'), request.GET.get('end'), request.GET.get('role'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # под ASGI нужен асинхронный итератор, иначе ответ соберётся в памяти целиком
+    stream = exports.astream if isinstance(request, ASGIRequest) else exports.stream
+    response = StreamingHttpResponse(stream(name, export_format, **filters),
+                                     content_type=exports.FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{export_format}"'
+    return response
+
+
+IMPORT_ROLES = [UserRole.CLIENT, UserRole.GUEST]
+
+
+def _job_params(request, kind):
+    data = request.POST
+    if kind == 'export':
+        params = {'name': data.get('name', ''), 'format': data.get('format', 'csv')}
+        if params['name'] not in exports.EXPORTS or params['format'] not in exports.FORMATS:
+            raise ValueError('Неизвестная выгрузка или формат')
+        exports.parse_filters(data.get('start'), data.get('end'), data.get('role'))
+        return {**params, 'start': data.get('start', ''), 'end': data.get('end', ''), 'role': data.get('role', '')}
+    if kind in ('backfill_rollups', 'report'):
+        params = {'start': data.get('start', ''), 'end': data.get('end', '')}
+        jobs.parse_period(params)
+        return params
+    if kind == 'import':
+        if not request.FILES.get('guests') and not request.FILES.get('bookings'):
+            raise ValueError('Загрузите файл гостей и/или броней')
+        params = {'delimiter': data.get('delimiter') or ','}
+        # менеджер заводит только клиентов и гостей, сотрудников — администратор
+        if request.user.role != UserRole.ADMIN:
+            params['roles'] = IMPORT_ROLES
+        for name in ('guests', 'bookings'):
+            if request.FILES.get(name):
+                params[name] = jobs.save_upload(request.FILES[name])
+        return params
+    raise ValueError(f'Неизвестная задача: {kind}')
+
+
+def _job_error(job):
+    # из traceback менеджеру нужна последняя строка: тип и текст исключения
+    return job.error.strip().splitlines()[-1] if job.error.strip() else ''
+
+
+def _job_json(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': _job_error(job),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@login_required
+def manager_jobs(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        messages.error(request, 'Access denied.')
+        return redirect('services_list')
+
+    if request.method == 'POST':
+        kind = request.POST.get('kind', '')
+        try:
+            job = jobs.enqueue(kind, _job_params(request, kind), user=request.user)
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f'Задача №{job.id} поставлена в очередь')
+        return redirect('manager_jobs')
+
+    recent = list(Job.objects.select_related('created_by').order_by('-id')[:50])
+    for job in recent:
+        job.title = jobs.HANDLERS[job.kind][0] if job.kind in jobs.HANDLERS else job.kind
+        job.error_line = _job_error(job)
+    today = timezone.now().date()
+    return render(request, 'users/manager/manager_jobs.html', {
+        'jobs': recent,
+        'exports': exports.EXPORTS,
+        'formats': exports.FORMATS,
+        'start': today.replace(day=1),
+        'end': today,
+    })
+
+
+@login_required
+def jobs_api(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    job_ids = [value for value in request.GET.get('ids', '').split(',') if value.strip().isdigit()][:100]
+    return JsonResponse({'results': [_job_json(job) for job in Job.objects.filter(id__in=job_ids).order_by('-id')]})
+
+
+@login_required
+def job_file(request, job_id):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    job = get_object_or_404(Job, id=job_id, status=JobStatus.DONE)
+    name = (job.result or {}).get('file')
+    if not name or not default_storage.exists(name):
+        raise Http404('Файл задачи не найден')
+    return FileResponse(default_storage.open(name, 'rb'), as_attachment=True, filename=os.path.basename(name))
+
+
 @login_required
 def add_service(request):
     if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
@@ -232,58 +670,110 @@ def add_service(request):
 
     if request.method == 'POST':
         try:
-            client_id = request.POST.get('client_id')
-            service_id = request.POST.get('service_id')
-            service_date = request.POST.get('service_date')
-            quantity = int(request.POST.get('quantity', 1))
-
-            if not client_id or not service_id or not service_date:
-                messages.error(request, 'Все поля обязательны для заполнения')
-                return redirect('add_service')
-
-            client = get_object_or_404(User, id=client_id, role=UserRole.CLIENT)
-            service = get_object_or_404(Service, id=service_id)
-
-            today = timezone.now().date()
-            booking = Booking.objects.filter(
-                guest=client,
-                check_in_date__lte=today,
-                check_out_date__gte=today
-            ).first()
-
-            if not booking:
-                messages.error(request, 'У клиента нет активного бронирования на текущую дату')
-                return redirect('add_service')
-
-            existing_provision = ServiceProvision.objects.filter(
-                booking=booking,
-                service=service,
-                service_date=service_date
-            ).first()
-
-            if existing_provision:
-                existing_provision.quantity += quantity
-                existing_provision.save()
+            line = parse_line(request.POST)
+            saved, errors = provide_services([line])
+            for _, error in errors:
+                messages.error(request, error)
+            for _, booking, service in saved:
                 messages.success(request,
-                                 f'Количество услуги "{service.name}" обновлено для клиента {client.first_name}')
-            else:
-                service_provision = ServiceProvision.objects.create(
-                    booking=booking,
-                    service=service,
-                    quantity=quantity,
-                    service_date=service_date
-                )
-                messages.success(request, f'Клиент {client.first_name} успешно записан на услугу "{service.name}"')
-
+                                 f'Клиент {booking.guest.first_name} успешно записан на услугу "{service.name}"')
             return redirect('add_service')
 
         except Exception as e:
             messages.error(request, f'Ошибка при записи на услугу: {str(e)}')
 
-    clients = User.objects.filter(role=UserRole.CLIENT)
-    services = Service.objects.filter(is_active=True)
+    return render(request, 'users/manager/add_service.html')
+
+
+@login_required
+def clients_autocomplete(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    response = JsonResponse({'results': client_suggestions(request.GET.get('q', ''))})
+    patch_cache_control(response, private=True, max_age=SUGGESTIONS_TIMEOUT)
+    return response
+
+
+@login_required
+def services_autocomplete(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    response = JsonResponse({'results': service_suggestions(request.GET.get('q', ''))})
+    patch_cache_control(response, private=True, max_age=SUGGESTIONS_TIMEOUT)
+    return response
+
+@login_required
+@require_POST
+def add_service_batch(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        messages.error(request, 'Доступ запрещен.')
+        return redirect('services_list')
+
+    lines = []
+    rows = csv.reader(io.StringIO(request.POST.get('lines', '')), delimiter=';')
+    for number, row in enumerate(rows, start=1):
+        if not any(cell.strip() for cell in row):
+            continue
+        fields = dict(zip(['client_id', 'service_id', 'service_date', 'quantity'], row))
+        try:
+            lines.append(parse_line(fields, number))
+        except ValueError as e:
+            messages.error(request, f'Строка {number}: {e}')
+
+    if lines:
+        saved, errors = provide_services(lines)
+        for number, error in errors:
+            messages.error(request, f'Строка {number}: {error}')
+        if saved:
+            messages.success(request, f'Записано услуг: {len(saved)}')
+
+    return redirect('add_service')
+
 
-    return render(request, 'users/manager/add_service.html', {
-        'clients': clients,
-        'services': services
-    })
\ No newline at end of file
+@login_required
+@require_POST
+def service_provisions_api(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+        rows = payload['lines']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Ожидается JSON вида {"lines": [...]}'}, status=400)
+    if not isinstance(rows, list):
+        return JsonResponse({'error': 'Поле lines должно быть списком'}, status=400)
+
+    lines = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            lines.append(parse_line(row if isinstance(row, dict) else {}, number))
+        except ValueError as e:
+            errors.append({'line': number, 'error': str(e)})
+
+    saved = []
+    if lines:
+        saved, line_errors = provide_services(lines)
+        errors += [{'line': number, 'error': error} for number, error in line_errors]
+
+    return JsonResponse({
+        'saved': [
+            {
+                'client_id': line.client_id,
+                'booking_id': booking.id,
+                'service_id': service.id,
+                'service_date': line.service_date.isoformat(),
+                'quantity': line.quantity,
+            }
+            for line, booking, service in saved
+        ],
+        'errors': sorted(errors, key=lambda error: error['line']),
+    })
+
+
+@login_required
+def performance_metrics(request):
+    if request.user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    return JsonResponse({'window': histograms.window, 'views': histograms.snapshot()})
@@ -0,0 +1,98 @@
+"""Отметки последнего изменения моделей для условных GET и кеша фрагментов.
+
+Отметка — время последнего сохранения или удаления строки модели в
+наносекундах, хранится в кеше. Если ключ вытеснен, отметкой становится
+текущее время: ответ и фрагменты просто пересоберутся.
+"""
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+def _key(model):
+    return f'watermark:{model._meta.label_lower}'
+
+
+def watermark(*models):
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key, time.time_ns())
+    return max(found.values())
+
+
+def _bump(model):
+    key = _key(model)
+    # не меньше прежней: часы разных процессов могут расходиться
+    cache.set(key, max(time.time_ns(), cache.get(key, 0) + 1), None)
+
+
+def touch(*models):
+    """Отметить изменение; повторяется после коммита, чтобы запрос, прочитавший
+    незакоммиченную старую версию, не закешировал её под новой отметкой."""
+    for model in models:
+        _bump(model)
+        transaction.on_commit(lambda model=model: _bump(model))
+
+
+def _validators(request, etag_func, models):
+    # страница с непоказанными сообщениями должна отрисоваться заново
+    if len(get_messages(request)):
+        return None, None
+    value = watermark(*models)
+    return quote_etag(f'{value}-{etag_func(request)}'), int(value // 1_000_000_000)
+
+
+def _finish(request, response, etag, modified):
+    if request.method in ('GET', 'HEAD') and etag:
+        response.headers.setdefault('ETag', etag)
+        if modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(modified))
+        # страница своя у каждого пользователя и всегда перепроверяется
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional(*models, etag_func, last_modified=True):
+    """Как django.views.decorators.http.condition, но ETag и Last-Modified
+    строятся из отметок models, а etag_func(request) добавляет к ним то, что
+    зависит от пользователя (роль, скидку). Для async-view валидаторы
+    считаются в потоке: им нужны request.user и сессия.
+
+    last_modified=False — без Last-Modified: когда etag_func зависит от
+    данных вне models, одна дата изменения моделей не годится для проверки.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                etag, modified = await sync_to_async(_validators)(request, etag_func, models)
+                modified = modified if last_modified else None
+                response = get_conditional_response(request, etag=etag, last_modified=modified) if etag else None
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, modified)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                etag, modified = _validators(request, etag_func, models)
+                modified = modified if last_modified else None
+                response = get_conditional_response(request, etag=etag, last_modified=modified) if etag else None
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return _finish(request, response, etag, modified)
+        return inner
+
+    return decorator
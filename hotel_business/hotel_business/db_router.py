@@ -0,0 +1,169 @@
+"""Чтение с реплики для страниц только на чтение, запись — на основную базу.
+
+Какие страницы читают с реплики, задаёт HOTEL_REPLICA_VIEWS (имена URL).
+После POST (и любого небезопасного запроса) браузер на
+HOTEL_REPLICA_STICKY_SECONDS получает cookie, и все его чтения идут на
+основную базу — пользователь сразу видит то, что сам записал. Если реплика
+недоступна или отстаёт больше HOTEL_REPLICA_MAX_LAG секунд, чтение тоже
+уходит на основную базу; состояние реплики проверяется не чаще раза в
+HOTEL_REPLICA_CHECK_INTERVAL секунд.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('hotel.db')
+
+STICKY_COOKIE = 'hotel_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# сессия только что вошедшего пользователя может ещё не доехать до реплики
+PRIMARY_APPS = {'sessions'}
+
+_read_alias = ContextVar('hotel_read_alias', default=None)
+
+
+class ReplicaHealth:
+    def __init__(self):
+        self.lock = Lock()
+        self.checked = {}
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'HOTEL_REPLICA_CHECK_INTERVAL', 10)
+        now = time.monotonic()
+        with self.lock:
+            state = self.checked.get(alias)
+            if state and now - state[0] < interval:
+                return state[1]
+            # пока идёт проверка, остальные запросы читают с основной базы
+            self.checked[alias] = (now, state[1] if state else False)
+        healthy = self.check(alias)
+        self.mark(alias, healthy)
+        return healthy
+
+    def mark(self, alias, healthy):
+        with self.lock:
+            previous = self.checked.get(alias)
+            self.checked[alias] = (time.monotonic(), healthy)
+        if previous is None or previous[1] != healthy:
+            logger.log(logging.INFO if healthy else logging.WARNING,
+                       'Реплика %s %s', alias, 'доступна' if healthy else 'недоступна, чтение с основной базы')
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+                    )
+                    lag = cursor.fetchone()[0]
+                    return lag <= getattr(settings, 'HOTEL_REPLICA_MAX_LAG', 30)
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+                return True
+        except Exception:
+            # любая ошибка проверки — читаем с основной базы
+            try:
+                connection.close()
+            except Exception:
+                pass
+            return False
+
+
+health = ReplicaHealth()
+
+
+def replica_alias():
+    """Алиас реплики, если она настроена и жива, иначе None."""
+    alias = getattr(settings, 'HOTEL_REPLICA_ALIAS', 'replica')
+    if alias not in connections.settings or alias == DEFAULT_DB_ALIAS:
+        return None
+    return alias if health.is_healthy(alias) else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # внутри транзакции читаем то, что в ней же записано
+        if alias is None or model._meta.app_label in PRIMARY_APPS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # реплика получает схему репликацией (локально — копией файла SQLite)
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pinned(content, alias):
+    # потоковый ответ читается из базы уже после выхода из middleware
+    _read_alias.set(alias)
+    try:
+        yield from content
+    finally:
+        _read_alias.set(None)
+
+
+async def _apinned(content, alias):
+    _read_alias.set(alias)
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        _read_alias.set(None)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            alias = _read_alias.get()
+            _read_alias.set(None)
+        return self.finish(request, response, alias)
+
+    async def __acall__(self, request):
+        _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            alias = _read_alias.get()
+            _read_alias.set(None)
+        return self.finish(request, response, alias)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES:
+            return None
+        if request.resolver_match.url_name in getattr(settings, 'HOTEL_REPLICA_VIEWS', ()):
+            _read_alias.set(replica_alias())
+        return None
+
+    def finish(self, request, response, alias):
+        if request.method not in SAFE_METHODS and response.status_code < 500:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=getattr(settings, 'HOTEL_REPLICA_STICKY_SECONDS', 10),
+                                httponly=True, samesite='Lax')
+        if alias and response.streaming:
+            pinned = _apinned if response.is_async else _pinned
+            response.streaming_content = pinned(response.streaming_content, alias)
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -23,9 +24,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-4oqnfr98d9po-eyn-l&#7@m5i@7j#)p4(p=(^fxa_xpjkqwcx6'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# С DEBUG ссылки на статику без хеша: DJANGO_DEBUG=0 и DJANGO_ALLOWED_HOSTS=host1,host2
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -41,15 +43,22 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hotel.middleware.StaticAssetsMiddleware',
+    'hotel.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hotel_business.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Server-Timing, лог hotel.performance и гистограммы для /manager/metrics/
+HOTEL_PERFORMANCE_ENABLED = os.environ.get('HOTEL_PERFORMANCE', '1') == '1'
+HOTEL_PERFORMANCE_WINDOW = 1000
+
 ROOT_URLCONF = 'hotel_business.urls'
 
 TEMPLATES = [
@@ -85,6 +94,45 @@ DATABASES = {
     }
 }
 
+# Для локальной разработки и тестов без PostgreSQL: DJANGO_DB=sqlite
+if os.environ.get('DJANGO_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # WAL: чтение не ждёт писателей; писатели ждут очереди до 20 с
+            'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL', 'timeout': 20},
+        }
+    }
+
+# Реплика только для чтения: DJANGO_REPLICA_HOST для PostgreSQL (логин и база
+# те же, что у основной) или DJANGO_REPLICA=путь к копии файла для SQLite
+if os.environ.get('DJANGO_REPLICA_HOST'):
+    DATABASES['replica'] = {**DATABASES['default'], 'HOST': os.environ['DJANGO_REPLICA_HOST'],
+                            'PORT': os.environ.get('DJANGO_REPLICA_PORT', DATABASES['default'].get('PORT', ''))}
+elif os.environ.get('DJANGO_REPLICA') and DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.environ['DJANGO_REPLICA']}
+
+for alias, database in DATABASES.items():
+    # постоянные соединения с проверкой перед переиспользованием
+    database['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', '60'))
+    database['CONN_HEALTH_CHECKS'] = True
+    if alias != 'default':
+        database['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['hotel_business.db_router.PrimaryReplicaRouter']
+
+# Страницы, которые читают с реплики (имена URL), и параметры hotel_business.db_router
+HOTEL_REPLICA_ALIAS = 'replica'
+HOTEL_REPLICA_VIEWS = {
+    'services_list', 'manager_clients', 'manager_services', 'manager_rooms', 'manager_availability',
+    'manager_reports', 'manager_folios', 'manager_folio', 'folios_api', 'export_data', 'clients_autocomplete',
+    'services_autocomplete', 'quotes_api',
+}
+HOTEL_REPLICA_STICKY_SECONDS = 10
+HOTEL_REPLICA_CHECK_INTERVAL = 10
+HOTEL_REPLICA_MAX_LAG = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -95,9 +143,30 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/services/'
 LOGOUT_REDIRECT_URL = '/login/'
 
-AUTHENTICATION_BACKENDS = [
+# Кеш общий для процессов (gunicorn, run_jobs, manage.py) только во внешнем
+# хранилище: DJANGO_REDIS_URL. Локальный кеш у каждого процесса свой.
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+HOTEL_SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('.LocMemCache')
+
+# Сессии и пользователи читаются из кеша только при общем кеше: иначе выход,
+# смена роли или блокировка в одном процессе не видны другим. ModelBackend
+# остаётся для сессий, созданных без кеша.
+AUTHENTICATION_BACKENDS = (['hotel.auth.CachedModelBackend'] if HOTEL_SHARED_CACHE else []) + [
     'django.contrib.auth.backends.ModelBackend',
 ]
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if HOTEL_SHARED_CACHE else 'django.contrib.sessions.backends.db'
+)
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -127,10 +196,53 @@ USE_I18N = True
 USE_TZ = True
 
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # строка JSON на каждый запрос пишется на уровне INFO: HOTEL_PERFORMANCE_LOG_LEVEL=INFO
+        'hotel.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('HOTEL_PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# python manage.py build_assets: styles.scss, UIkit из node_modules, collectstatic
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # имена с хешем содержимого и рядом .gz/.br
+    'staticfiles': {'BACKEND': 'hotel.storage.HotelStaticFilesStorage'},
+}
+# Собранную статику отдаёт hotel.middleware.StaticAssetsMiddleware; если её
+# отдаёт nginx, можно выключить: HOTEL_SERVE_STATIC=0
+HOTEL_SERVE_STATIC = os.environ.get('HOTEL_SERVE_STATIC', '1') == '1'
+
+# Файлы фоновых задач: загруженные CSV и готовые выгрузки (hotel/jobs.py)
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Очередь задач: python manage.py run_jobs --workers 4
+# задача без продления дольше этого срока считается брошенной и выдаётся снова
+HOTEL_JOB_VISIBILITY_TIMEOUT = 300
+# пауза перед повтором упавшей задачи, удваивается с каждой попыткой
+HOTEL_JOB_RETRY_DELAY = 30
+HOTEL_JOB_POLL_INTERVAL = 1.0
+
+# python manage.py archive_stays переносит в архивные таблицы брони, выехавшие
+# больше стольких дней назад (hotel/archive.py)
+HOTEL_ARCHIVE_AFTER_DAYS = 365
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
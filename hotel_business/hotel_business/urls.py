@@ -12,9 +12,26 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/manager/', views.manager, name='manager'),
     path('users/client/', views.client, name='client'),
+    path('users/client/api/stays/', views.client_stays_api, name='client_stays_api'),
     path('manager/', views.manager_dashboard, name='manager'),
     path('manager/clients/', views.manager_clients, name='manager_clients'),
     path('manager/services/', views.manager_services, name='manager_services'),
     path('manager/rooms/', views.manager_rooms, name='manager_rooms'),
+    path('manager/availability/', views.manager_availability, name='manager_availability'),
+    path('manager/reports/', views.manager_reports, name='manager_reports'),
+    path('manager/folios/', views.manager_folios, name='manager_folios'),
+    path('manager/folios/<int:booking_id>/', views.manager_folio, name='manager_folio'),
+    path('manager/jobs/', views.manager_jobs, name='manager_jobs'),
+    path('manager/jobs/<int:job_id>/file/', views.job_file, name='job_file'),
 path('manager/add-service/', views.add_service, name='add_service'),
+    path('manager/add-service/batch/', views.add_service_batch, name='add_service_batch'),
+    path('manager/api/service-provisions/', views.service_provisions_api, name='service_provisions_api'),
+    path('manager/api/clients/', views.clients_autocomplete, name='clients_autocomplete'),
+    path('manager/api/services/', views.services_autocomplete, name='services_autocomplete'),
+    path('manager/api/folios/', views.folios_api, name='folios_api'),
+    path('manager/api/quotes/', views.quotes_api, name='quotes_api'),
+    path('manager/api/bookings/', views.bookings_api, name='bookings_api'),
+    path('manager/api/jobs/', views.jobs_api, name='jobs_api'),
+    path('manager/export/<str:name>/', views.export_data, name='export_data'),
+    path('manager/metrics/', views.performance_metrics, name='performance_metrics'),
 ]
\ No newline at end of file